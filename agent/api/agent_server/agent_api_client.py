@@ -11,6 +11,7 @@ from typing import List, Optional, Tuple
 from log import get_logger
 from api.agent_server.agent_client import AgentApiClient
 from api.agent_server.models import AgentSseEvent, FileEntry
+from core.template_manifest import template_manifests
 from datetime import datetime
 from patch_ng import PatchSet
 import contextlib
@@ -111,48 +112,32 @@ def apply_patch(diff: str, target_dir: str, template_path: str) -> Tuple[bool, s
                 if os.path.isdir(template_root):
                     print(f"Creating symlinks from template ({template_root})")
 
-                    # Copy all template files except specific excluded directories and hidden files
-                    excluded_dirs = ["node_modules", "dist"]
-
                     def copy_template_files(base_dir, target_base, dirs_only=False):
                         """
-                        Copy all template files recursively, except those in excluded directories
-                        and hidden files (starting with a dot).
+                        Copy all template files listed in the template manifest (which leaves out
+                        node_modules and dist), except hidden and markdown files.
                         """
-                        for root, dirs, files in os.walk(base_dir):
-                            # Remove excluded directories and hidden directories from dirs to prevent recursion into them
-                            dirs[:] = [
-                                d
-                                for d in dirs
-                                if d not in excluded_dirs and not d.startswith(".")
-                            ]
-
-                            # Get relative path from template root
-                            rel_path = os.path.relpath(root, base_dir)
-                            if rel_path == ".":
-                                rel_path = ""
-
-                            for file in files:
-                                # Skip hidden files
-                                if file.startswith(".") or file.endswith(".md"):
-                                    continue
+                        for rel_file_path in template_manifests.get(base_dir).entries:
+                            # Skip hidden files and directories
+                            if any(part.startswith(".") for part in rel_file_path.split("/")):
+                                continue
+                            if rel_file_path.endswith(".md"):
+                                continue
 
-                                src_file = os.path.join(root, file)
-                                # Create relative path within target directory
-                                rel_file_path = os.path.join(rel_path, file)
-                                dest_file = os.path.join(target_base, rel_file_path)
-                                dest_dir = os.path.dirname(dest_file)
-
-                                os.makedirs(dest_dir, exist_ok=True)
-                                if not dirs_only and not os.path.lexists(dest_file):
-                                    try:
-                                        # Directly copy the file (no symlink)
-                                        shutil.copy2(src_file, dest_file)
-                                        print(f"  ↳ copied file {rel_file_path}")
-                                    except Exception as cp_err:
-                                        print(
-                                            f"Warning: could not copy file {rel_file_path}: {cp_err}"
-                                        )
+                            src_file = os.path.join(base_dir, rel_file_path)
+                            dest_file = os.path.join(target_base, rel_file_path)
+                            dest_dir = os.path.dirname(dest_file)
+
+                            os.makedirs(dest_dir, exist_ok=True)
+                            if not dirs_only and not os.path.lexists(dest_file):
+                                try:
+                                    # Directly copy the file (no symlink)
+                                    shutil.copy2(src_file, dest_file)
+                                    print(f"  ↳ copied file {rel_file_path}")
+                                except Exception as cp_err:
+                                    print(
+                                        f"Warning: could not copy file {rel_file_path}: {cp_err}"
+                                    )
 
                     # Copy all template files recursively (except excluded dirs)
                     copy_template_files(template_root, target_dir, dirs_only=True)
@@ -5,6 +5,7 @@ from httpx import AsyncClient, ASGITransport
 
 from api.agent_server.models import AgentSseEvent, AgentRequest, UserMessage, ConversationMessage, FileEntry, MessageKind
 from api.agent_server.async_server import app, CONFIG
+from api import state_delta
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -99,7 +100,7 @@ class AgentApiClient:
                 except (json.JSONDecodeError, ValueError):
                     error_detail = response.text or "No response content"
                 raise ValueError(f"Request failed with status code {response.status_code}: {error_detail}")
-            events = await self.parse_sse_events(response, stream_cb)
+            events = await self.parse_sse_events(response, stream_cb, base_state=request.agent_state)
         return events, request
 
     async def continue_conversation(self,
@@ -175,8 +176,15 @@ class AgentApiClient:
         )
 
     @staticmethod
-    async def parse_sse_events(response, stream_cb: Optional[Callable[[AgentSseEvent], None]] = None) -> List[AgentSseEvent]:
-        """Parse the SSE events from a response stream"""
+    async def parse_sse_events(response,
+                               stream_cb: Optional[Callable[[AgentSseEvent], None]] = None,
+                               base_state: Optional[Dict[str, Any]] = None) -> List[AgentSseEvent]:
+        """Parse the SSE events from a response stream
+
+        Incremental agentState payloads are reassembled against base_state (the state
+        sent with the request) and the states received since, so events always carry
+        the full state.
+        """
         event_objects = []
         buffer = ""
 
@@ -189,6 +197,11 @@ class AgentApiClient:
                         data_str = data_parts[1].strip()
                         try:
                             event_obj = AgentSseEvent.from_json(data_str)
+                            if event_obj.message and event_obj.message.agent_state is not None:
+                                event_obj.message.agent_state = state_delta.decode(
+                                    base_state, event_obj.message.agent_state
+                                )
+                                base_state = event_obj.message.agent_state
                             event_objects.append(event_obj)
                             if stream_cb:
                                 try:
@@ -197,6 +210,9 @@ class AgentApiClient:
                                     logger.exception("Callback failed")
                         except json.JSONDecodeError as e:
                             logger.warning(f"JSON decode error: {e}, data: {data_str[:100]}...")
+                        except state_delta.StateDeltaError:
+                            # dropping the event would leave the client with a stale state
+                            raise
                         except Exception as e:
                             logger.warning(f"Error parsing SSE event: {e}, data: {data_str[:100]}...")
                 buffer = ""
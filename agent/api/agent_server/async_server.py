@@ -11,12 +11,13 @@ Refer to `architecture.puml` for a visual overview.
 """
 
 from typing import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 
 import anyio
+import anyio.to_thread
 from api.fsm_tools import FSMInterface
 from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from laravel_agent.agent_session import LaravelAgentSession
 import uvicorn
@@ -46,6 +47,7 @@ from api.agent_server.models import (
 )
 from api.agent_server.interface import AgentInterface
 from api.base_agent_session import AgentSession
+from api.diff_history import diff_history
 from trpc_agent.agent_session import TrpcAgentSession
 from nicegui_agent.agent_session import NiceguiAgentSession
 from api.base_agent_session import AgentSession
@@ -54,6 +56,10 @@ from api.config import CONFIG
 
 from log import get_logger, configure_uvicorn_logging, set_trace_id, clear_trace_id
 from llm.telemetry import save_cumulative_stats
+from core.validation_cache import get_validation_cache
+from core.workspace_pool import workspace_pool
+from core.template_manifest import template_manifests
+from core.dagger_pool import dagger_pool, default_connection
 
 logger = get_logger(__name__)
 
@@ -75,11 +81,26 @@ async def lifespan(app: FastAPI):
         f"GEMINI_API_KEY: {'SET' if os.getenv('GEMINI_API_KEY') else 'NOT_SET'}"
     )
 
-    yield
+    # walk the templates once, workspaces and diffs read them from their manifests
+    for template_dir in workspace_pool.template_dirs:
+        await anyio.to_thread.run_sync(template_manifests.get, template_dir)
+
+    async with AsyncExitStack() as stack:
+        await stack.enter_async_context(
+            dagger_pool.run(CONFIG.dagger_pool_size, max_wait=CONFIG.dagger_pool_max_wait)
+        )
+        if warm_templates := CONFIG.warm_templates:
+            logger.info(f"Warming workspace pool for templates: {warm_templates}")
+            pool_client = await stack.enter_async_context(default_connection())
+            await stack.enter_async_context(workspace_pool.run(pool_client, warm_templates))
+        yield
     logger.info("Shutting down Async Agent Server API")
 
     # save cumulative telemetry stats on shutdown
     save_cumulative_stats()
+    logger.info(f"Dagger pool stats: {dagger_pool.stats()}")
+    if (validation_cache := get_validation_cache()).is_available:
+        logger.info(f"Validation cache stats: {validation_cache.stats()}")
 
 
 app = FastAPI(
@@ -176,10 +197,8 @@ async def run_agent[T: AgentInterface](
         f"Running agent for session {request.application_id}:{request.trace_id}"
     )
 
-    async with dagger.Connection(
-        dagger.Config(log_output=open(os.devnull, "w"))
-    ) as client:
-        # Establish Dagger connection for the agent's execution context
+    async with dagger_pool.borrow() as client:
+        # Borrow a Dagger session for the agent's execution context
         agent = session_manager.get_or_create_session(
             client, request, agent_class, *args, **kwargs
         )
@@ -374,6 +393,17 @@ async def message(
         raise HTTPException(status_code=500, detail=error_response.to_json())
 
 
+@app.get("/diff/{complete_diff_hash}")
+async def complete_diff(
+    complete_diff_hash: str, token: str = Depends(verify_token)
+) -> PlainTextResponse:
+    """Complete unified diff of a message by its completeDiffHash, for clients receiving diff deltas"""
+    diff = diff_history.get(complete_diff_hash)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired diff hash")
+    return PlainTextResponse(diff, media_type="text/x-diff")
+
+
 @app.get("/templates")
 async def list_templates():
     """List available templates"""
@@ -386,9 +416,7 @@ async def list_templates():
 @app.get("/health")
 async def dagger_healthcheck():
     """Dagger connection health check endpoint"""
-    async with dagger.Connection(
-        dagger.Config(log_output=open(os.devnull, "w"))
-    ) as client:
+    async with dagger_pool.borrow() as client:
         # Try a simple Dagger operation to verify connectivity
         container = client.container().from_("alpine:latest")
         version = await container.with_exec(["cat", "/etc/alpine-release"]).stdout()
@@ -396,6 +424,7 @@ async def dagger_healthcheck():
             "status": "healthy",
             "dagger_connection": "successful",
             "alpine_version": version.strip(),
+            "dagger_pool": dagger_pool.stats(),
         }
 
 
@@ -31,6 +31,8 @@ class MessageKind(str, Enum):
     REVIEW_RESULT = "ReviewResult"  # generation completed successfully
     KEEP_ALIVE = "KeepAlive"  # empty event to keep the connection alive
     WIP_UPDATE = "WipUpdate"  # work in progress update, used to send intermediate results
+    STREAM_DELTA = "StreamDelta"  # piece of the agent's reply while it is being generated
+    METADATA_UPDATE = "MetadataUpdate"  # app name or commit message that wasn't ready for an earlier event
 
 
 class UserMessage(BaseModel):
@@ -55,6 +57,13 @@ class DiffStatEntry(BaseModel):
     insertions: int = Field(..., description="Number of lines inserted in this file during the current step.")
     deletions: int = Field(..., description="Number of lines deleted in this file during the current step.")
 
+class StreamDelta(BaseModel):
+    """Position of a StreamDelta message's content within the reply being generated."""
+
+    block_type: Literal["text", "thinking", "tool_use"] = Field(..., alias="blockType", description="Type of the content block the piece belongs to; tool_use pieces are fragments of the tool input JSON.")
+    index: int = Field(..., description="Index of the content block; pieces with the same index extend the same block.")
+    tool_name: Optional[str] = Field(None, alias="toolName", description="Name of the tool, on the first piece of a tool_use block.")
+
 class ExternalContentBlock(BaseModel):
     """Represents a single content block in an external message."""
     role: Literal["assistant"] = Field("assistant", description="Deprecated. The role of the block. Will be removed in the future.")
@@ -76,12 +85,12 @@ class AgentMessage(BaseModel):
     unified_diff: Optional[str] = Field(
         None,
         alias="unifiedDiff",
-        description="A unified diff format string representing code changes made by the agent."
+        description="A unified diff format string representing code changes made by the agent. With the `diff_delta` setting it holds only the changes since the previous diff of the request, the first one is relative to allFiles."
     )
     complete_diff_hash: Optional[str] = Field(
         None,
         alias="completeDiffHash",
-        description="Hash (e.g., SHA-256) of the complete unified diff for the current application state."
+        description="Hash (MD5) of the complete unified diff against allFiles for the current application state. The complete diff is served by GET /diff/{completeDiffHash}."
     )
     diff_stat: Optional[List[DiffStatEntry]] = Field(
         None,
@@ -96,6 +105,10 @@ class AgentMessage(BaseModel):
         None,
         description="Generated commit message suitable for use in Git commits."
     )
+    delta: Optional[StreamDelta] = Field(
+        None,
+        description="Where the content of a StreamDelta message goes in the reply being generated."
+    )
 
     def to_json(self) -> str:
         """Serialize the model to JSON string."""
@@ -202,6 +215,8 @@ def format_internal_message_for_display(message) -> str:
         "create_file": "📄 Creating file",
         "edit_file": "✏️  Editing file",
         "read_file": "📖 Reading file",
+        "read_files": "📖 Reading files",
+        "read_file_lines": "📖 Reading file",
         "run_command": "⚡ Running command",
         "install_dependencies": "📦 Installing dependencies",
         "build_project": "🔨 Building project",
@@ -1,17 +1,22 @@
+import asyncio
 import logging
 from abc import ABC
 from typing import Dict, Any, Optional, TypedDict, List, Union, Type
 from datetime import datetime
 from uuid import uuid4
-from hashlib import md5
 import dagger
 
+import anyio.to_thread
 from anyio.streams.memory import MemoryObjectSendStream
 
-from llm.common import ContentBlock, InternalMessage, TextRaw
+from llm.common import CompletionDelta, ContentBlock, InternalMessage, TextRaw
 from llm.utils import get_ultra_fast_llm_client, get_universal_llm_client
 from api.fsm_tools import FSMToolProcessor, FSMStatus, FSMInterface
 from api.snapshot_utils import snapshot_saver
+from api import state_delta
+from api.diff_history import diff_history
+from diff.diff_utils import compute_diff_stat
+from diff.git_diff import diff_between
 from core.statemachine import MachineCheckpoint
 
 from api.agent_server.models import (
@@ -23,10 +28,11 @@ from api.agent_server.models import (
     AgentStatus,
     ExternalContentBlock,
     MessageKind,
+    StreamDelta,
     format_internal_message_for_display,
 )
 from api.agent_server.interface import AgentInterface
-from llm.llm_generators import generate_app_name, generate_commit_message
+from llm.llm_generators import precompute_app_name, precompute_commit_message
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +72,15 @@ class BaseAgentSession(AgentInterface, ABC):
         self.client = client
         self._sse_counter = 0
         self._snapshot_key = self.trace_id + "_" + datetime.now().strftime("%m%d%H%M%S")
+        # last agentState the client is known to hold, deltas are computed against it
+        self._state_delta = bool(self.settings.get("state_delta", False))
+        self._client_state: state_delta.VersionedState | None = None
+        # forward the top-level agent's reply as it is generated
+        self._stream_deltas = bool(self.settings.get("stream_deltas", False))
+        # send diffs relative to the last one sent instead of the request's files
+        self._diff_delta = bool(self.settings.get("diff_delta", False))
+        self._diff_base: Dict[str, str] = {}
+        self._sent_diff = ""
 
     @property
     def template_path(self) -> str:
@@ -113,6 +128,40 @@ class BaseAgentSession(AgentInterface, ABC):
             request: Incoming agent request
             event_tx: Event transmission stream
         """
+        metadata: StateMetadata = {
+            "app_name": None,
+            "template_diff_sent": False,
+        }
+        # helpers still generating a field of an event that was already sent
+        pending_metadata: Dict[str, asyncio.Task[str]] = {}
+        agent_state: AgentState | None = None
+
+        # defined before the try, the finally block flushes pending fields even if setup fails
+        async def send_metadata_update(status: AgentStatus, wait: bool = False) -> None:
+            ready = {
+                field: task
+                for field, task in pending_metadata.items()
+                if wait or task.done()
+            }
+            if not ready:
+                return
+            values = {}
+            for field, task in ready.items():
+                del pending_metadata[field]
+                values[field] = await task
+            if "app_name" in values:
+                metadata["app_name"] = values["app_name"]
+            await self.send_event(
+                event_tx=event_tx,
+                status=status,
+                kind=MessageKind.METADATA_UPDATE,
+                content=[],
+                # the final state was sent without the app name
+                agent_state=agent_state if wait and "app_name" in values else None,
+                app_name=metadata["app_name"],
+                commit_message=values.get("commit_message"),
+            )
+
         try:
             logger.info(f"Processing request for {self.application_id}:{self.trace_id}")
 
@@ -122,11 +171,9 @@ class BaseAgentSession(AgentInterface, ABC):
             fsm_message_history = self.convert_agent_messages_to_llm_messages(
                 request.all_messages[-1:]
             )
-            metadata: StateMetadata = {
-                "app_name": None,
-                "template_diff_sent": False,
-            }
             snapshot_files = {}
+            # the client holds the files of the request, the first diff is relative to them
+            self._diff_base, self._sent_diff = snapshot_files, ""
 
             async def emit_intermediate_message(message: str) -> None:
                 logger.info(f"Emitting intermediate message: {message}")
@@ -140,6 +187,15 @@ class BaseAgentSession(AgentInterface, ABC):
                     app_name=metadata["app_name"],
                 )
 
+            async def emit_delta(delta: CompletionDelta) -> None:
+                await self.send_event(
+                    event_tx=event_tx,
+                    status=AgentStatus.RUNNING,
+                    kind=MessageKind.STREAM_DELTA,
+                    content=delta.text,
+                    delta=StreamDelta(blockType=delta.kind, index=delta.index, toolName=delta.name),
+                )
+
             fsm_settings = {
                 **self.settings,
                 "event_callback": emit_intermediate_message,
@@ -147,6 +203,8 @@ class BaseAgentSession(AgentInterface, ABC):
 
             if request.agent_state:
                 logger.info(f"Continuing with existing state for trace {self.trace_id}")
+                if self._state_delta:
+                    self._client_state = state_delta.versioned(request.agent_state)
                 if fsm_messages := request.agent_state.get("fsm_messages", []):
                     fsm_message_history = [
                         InternalMessage.from_dict(m) for m in fsm_messages
@@ -163,7 +221,7 @@ class BaseAgentSession(AgentInterface, ABC):
                     fsm_app = await self.fsm_application_class.load(
                         self.client, req_fsm_state, fsm_settings
                     )
-                    snapshot_saver.save_snapshot(
+                    snapshot_saver.save_checkpoint(
                         trace_id=self._snapshot_key, key="fsm_enter", data=req_fsm_state
                     )
                 if req_metadata := request.agent_state.get("metadata"):
@@ -179,7 +237,7 @@ class BaseAgentSession(AgentInterface, ABC):
                 settings=fsm_settings,
                 event_callback=emit_intermediate_message,
             )
-            agent_state: AgentState = {
+            agent_state = {
                 "fsm_messages": fsm_message_history,
                 "fsm_state": fsm_state,
                 "metadata": metadata,
@@ -191,203 +249,227 @@ class BaseAgentSession(AgentInterface, ABC):
             lite_client = get_ultra_fast_llm_client()
             top_level_agent_llm = get_universal_llm_client()
 
-            while True:
-                logger.info("Looping into next step")
-                thread, fsm_status, full_thread = await self.processor_instance.step(
-                    agent_state["fsm_messages"], top_level_agent_llm, self.model_params
+            # the commit message only depends on the user's message, generate it while the agent works
+            if isinstance(request.all_messages[-1], UserMessage):
+                commit_message_task = precompute_commit_message(
+                    request.all_messages[-1].content, lite_client
                 )
-
-                # Add messages for agentic loop
-                agent_state["fsm_messages"] = full_thread
-
-                if self.processor_instance.fsm_app is not None:
-                    logger.info("Saving FSM state")
-                    agent_state[
-                        "fsm_state"
-                    ] = await self.processor_instance.fsm_app.fsm.dump()
-
-                if (
-                    not agent_state["metadata"]["template_diff_sent"]
-                    and self.processor_instance.fsm_app is not None
-                ):
-                    prompt = self.processor_instance.fsm_app.fsm.context.user_prompt
-                    app_name = await generate_app_name(prompt, lite_client)
-                    await self.send_event(
-                        event_tx=event_tx,
-                        status=AgentStatus.RUNNING,
-                        kind=MessageKind.STAGE_RESULT,
-                        content="Initializing application...",
-                        agent_state=None,
-                        unified_diff=None,
-                        app_name=app_name,
-                    )
-
-                    logger.info("Getting initial template diff")
-
-                    # Communicate the app name and commit message and template diff to the client
-                    initial_template_diff = (
-                        await self.processor_instance.fsm_app.get_diff_with(
-                            snapshot_files
-                        )
-                    )
-
-                    logger.info("Sending initial template diff")
-                    agent_state["metadata"].update(
-                        {"app_name": app_name, "template_diff_sent": True}
-                    )
-                    await self.send_event(
-                        event_tx=event_tx,
-                        status=AgentStatus.RUNNING,
-                        kind=MessageKind.REVIEW_RESULT,
-                        content="Application initialized",
-                        agent_state=None,
-                        unified_diff=initial_template_diff,
-                        app_name=app_name,
-                        commit_message="Initial commit",
+            else:
+                commit_message_task = None
+
+            # summaries of aged-out turns are cancelled once the session stops stepping
+            async with self.processor_instance.compactor.running():
+                while True:
+                    logger.info("Looping into next step")
+                    thread, fsm_status, full_thread = await self.processor_instance.step(
+                        agent_state["fsm_messages"],
+                        top_level_agent_llm,
+                        self.model_params,
+                        on_delta=emit_delta if self._stream_deltas else None,
                     )
 
-                # Send event based on FSM status
-                match fsm_status:
-                    case FSMStatus.WIP:
-                        logger.info(
-                            "Got WIP status, skipping sending event due to callback messages were already sent"
-                        )
-                        continue
-                    case FSMStatus.REFINEMENT_REQUEST:
-                        logger.info(
-                            "Got REFINEMENT_REQUEST status, sending refinement request message"
-                        )
-                        # Use the actual LLM response from thread if available
-                        messages_to_send = (
-                            thread
-                            if thread
-                            else [
-                                InternalMessage(
-                                    role="assistant",
-                                    content=[
-                                        TextRaw("Agent is waiting for user input...")
-                                    ],
-                                )
-                            ]
-                        )
+                    # Add messages for agentic loop
+                    agent_state["fsm_messages"] = full_thread
+
+                    if self.processor_instance.fsm_app is not None:
+                        logger.info("Saving FSM state")
+                        agent_state[
+                            "fsm_state"
+                        ] = await self.processor_instance.fsm_app.fsm.dump()
+
+                    if (
+                        not agent_state["metadata"]["template_diff_sent"]
+                        and self.processor_instance.fsm_app is not None
+                    ):
+                        prompt = self.processor_instance.fsm_app.fsm.context.user_prompt
+                        app_name_task = precompute_app_name(prompt, lite_client)
+                        app_name = app_name_task.result() if app_name_task.done() else None
                         await self.send_event(
                             event_tx=event_tx,
-                            status=AgentStatus.IDLE,
-                            kind=MessageKind.REFINEMENT_REQUEST,
-                            content=messages_to_send,
-                            agent_state=agent_state,
-                            app_name=agent_state["metadata"]["app_name"],
+                            status=AgentStatus.RUNNING,
+                            kind=MessageKind.STAGE_RESULT,
+                            content="Initializing application...",
+                            agent_state=None,
+                            unified_diff=None,
+                            app_name=app_name,
                         )
-                    case FSMStatus.FAILED:
-                        logger.info("Got FAILED status, sending runtime error message")
-                        # Get the actual error from the FSM if available
-                        error_details = "Unknown error"
-                        is_agent_search_failed = False
-
-                        if self.processor_instance.fsm_app:
-                            error_details = (
-                                self.processor_instance.fsm_app.maybe_error()
-                                or "Unknown error"
-                            )
-                            if hasattr(
-                                self.processor_instance.fsm_app,
-                                "is_agent_search_failed_error",
-                            ):
-                                is_agent_search_failed = self.processor_instance.fsm_app.is_agent_search_failed_error()
 
-                        logger.error(f"FSM failed with error: {error_details}")
+                        logger.info("Getting initial template diff")
 
-                        if is_agent_search_failed:
-                            # User-friendly message from AgentSearchFailedException
-                            error_message = error_details
-                        else:
-                            # Other errors - show with context
-                            error_message = (
-                                f"An error occurred during processing: {error_details}"
+                        # Communicate the app name and commit message and template diff to the client
+                        initial_template_diff = (
+                            await self.processor_instance.fsm_app.get_diff_with(
+                                snapshot_files
                             )
+                        )
 
-                        runtime_error_message = InternalMessage(
-                            role="assistant", content=[TextRaw(error_message)]
+                        logger.info("Sending initial template diff")
+                        if app_name_task.done():
+                            app_name = app_name_task.result()
+                        else:
+                            pending_metadata["app_name"] = app_name_task
+                        agent_state["metadata"].update(
+                            {"app_name": app_name, "template_diff_sent": True}
                         )
                         await self.send_event(
                             event_tx=event_tx,
-                            status=AgentStatus.IDLE,
-                            kind=MessageKind.RUNTIME_ERROR,
-                            content=[runtime_error_message],
+                            status=AgentStatus.RUNNING,
+                            kind=MessageKind.REVIEW_RESULT,
+                            content="Application initialized",
+                            agent_state=None,
+                            unified_diff=initial_template_diff,
+                            app_name=app_name,
+                            commit_message="Initial commit",
                         )
-                    case FSMStatus.COMPLETED:
-                        try:
-                            assert self.processor_instance.fsm_app is not None
-                            logger.info("FSM is completed")
-
-                            final_diff = (
-                                await self.processor_instance.fsm_app.get_diff_with(
-                                    snapshot_files
-                                )
-                            )
 
+                    await send_metadata_update(AgentStatus.RUNNING)
+
+                    # Send event based on FSM status
+                    match fsm_status:
+                        case FSMStatus.WIP:
                             logger.info(
-                                "Sending completion event with diff (length: %d) for state %s",
-                                len(final_diff) if final_diff else 0,
-                                self.processor_instance.fsm_app.current_state,
+                                "Got WIP status, skipping sending event due to callback messages were already sent"
                             )
-
-                            is_diff_meaningful = final_diff and final_diff.strip()
-
-                            # Check if diff is ready
-                            if not is_diff_meaningful:
-                                logger.info(
-                                    "No meaningful changes detected, sending work successful without diff"
+                            continue
+                        case FSMStatus.REFINEMENT_REQUEST:
+                            logger.info(
+                                "Got REFINEMENT_REQUEST status, sending refinement request message"
+                            )
+                            # Use the actual LLM response from thread if available
+                            messages_to_send = (
+                                thread
+                                if thread
+                                else [
+                                    InternalMessage(
+                                        role="assistant",
+                                        content=[
+                                            TextRaw("Agent is waiting for user input...")
+                                        ],
+                                    )
+                                ]
+                            )
+                            await self.send_event(
+                                event_tx=event_tx,
+                                status=AgentStatus.IDLE,
+                                kind=MessageKind.REFINEMENT_REQUEST,
+                                content=messages_to_send,
+                                agent_state=agent_state,
+                                app_name=agent_state["metadata"]["app_name"],
+                            )
+                        case FSMStatus.FAILED:
+                            logger.info("Got FAILED status, sending runtime error message")
+                            # Get the actual error from the FSM if available
+                            error_details = "Unknown error"
+                            is_agent_search_failed = False
+
+                            if self.processor_instance.fsm_app:
+                                error_details = (
+                                    self.processor_instance.fsm_app.maybe_error()
+                                    or "Unknown error"
                                 )
+                                if hasattr(
+                                    self.processor_instance.fsm_app,
+                                    "is_agent_search_failed_error",
+                                ):
+                                    is_agent_search_failed = self.processor_instance.fsm_app.is_agent_search_failed_error()
 
-                                no_changes_message = InternalMessage(
-                                    role="assistant",
-                                    content=[
-                                        TextRaw(
-                                            "No changes were generated by the agent. Please refine your request."
-                                        )
-                                    ],
-                                )
+                            logger.error(f"FSM failed with error: {error_details}")
 
-                                await self.send_event(
-                                    event_tx=event_tx,
-                                    status=AgentStatus.IDLE,
-                                    kind=MessageKind.STAGE_RESULT,
-                                    content=[no_changes_message],
-                                    agent_state=agent_state,
-                                    app_name=agent_state["metadata"]["app_name"],
-                                )
+                            if is_agent_search_failed:
+                                # User-friendly message from AgentSearchFailedException
+                                error_message = error_details
                             else:
-                                logger.info("Got COMPLETED status, sending final diff")
-                                # The message with the messages already sent in the callback,
-                                # so we don't need to send it again
-
-                                if isinstance(request.all_messages[-1], UserMessage):
-                                    user_request = request.all_messages[-1].content
-                                else:
-                                    user_request = self.processor_instance.fsm_app.fsm.context.user_prompt
+                                # Other errors - show with context
+                                error_message = (
+                                    f"An error occurred during processing: {error_details}"
+                                )
 
-                                commit_message = await generate_commit_message(
-                                    user_request, lite_client
+                            runtime_error_message = InternalMessage(
+                                role="assistant", content=[TextRaw(error_message)]
+                            )
+                            await self.send_event(
+                                event_tx=event_tx,
+                                status=AgentStatus.IDLE,
+                                kind=MessageKind.RUNTIME_ERROR,
+                                content=[runtime_error_message],
+                            )
+                        case FSMStatus.COMPLETED:
+                            try:
+                                assert self.processor_instance.fsm_app is not None
+                                logger.info("FSM is completed")
+
+                                final_diff = (
+                                    await self.processor_instance.fsm_app.get_diff_with(
+                                        snapshot_files
+                                    )
                                 )
 
-                                # Send actual diff in a separate event
-                                await self.send_event(
-                                    event_tx=event_tx,
-                                    status=AgentStatus.IDLE,
-                                    kind=MessageKind.REVIEW_RESULT,
-                                    content=f"Changes generated: \n{commit_message}",
-                                    agent_state=agent_state,
-                                    unified_diff=final_diff,
-                                    app_name=agent_state["metadata"]["app_name"],
-                                    commit_message=commit_message,
+                                logger.info(
+                                    "Sending completion event with diff (length: %d) for state %s",
+                                    len(final_diff) if final_diff else 0,
+                                    self.processor_instance.fsm_app.current_state,
                                 )
-                        except Exception as e:
-                            logger.exception(f"Error sending final diff: {e}")
 
-                # Exit if we are not working on a FSM or if the FSM is completed or failed
-                if fsm_status != FSMStatus.WIP:
-                    break
+                                is_diff_meaningful = final_diff and final_diff.strip()
+
+                                # Check if diff is ready
+                                if not is_diff_meaningful:
+                                    logger.info(
+                                        "No meaningful changes detected, sending work successful without diff"
+                                    )
+
+                                    no_changes_message = InternalMessage(
+                                        role="assistant",
+                                        content=[
+                                            TextRaw(
+                                                "No changes were generated by the agent. Please refine your request."
+                                            )
+                                        ],
+                                    )
+
+                                    await self.send_event(
+                                        event_tx=event_tx,
+                                        status=AgentStatus.IDLE,
+                                        kind=MessageKind.STAGE_RESULT,
+                                        content=[no_changes_message],
+                                        agent_state=agent_state,
+                                        app_name=agent_state["metadata"]["app_name"],
+                                    )
+                                else:
+                                    logger.info("Got COMPLETED status, sending final diff")
+                                    # The message with the messages already sent in the callback,
+                                    # so we don't need to send it again
+
+                                    if commit_message_task is None:
+                                        commit_message_task = precompute_commit_message(
+                                            self.processor_instance.fsm_app.fsm.context.user_prompt,
+                                            lite_client,
+                                        )
+                                    if commit_message_task.done():
+                                        commit_message = commit_message_task.result()
+                                        content = f"Changes generated: \n{commit_message}"
+                                    else:
+                                        commit_message = None
+                                        content = "Changes generated"
+                                        pending_metadata["commit_message"] = commit_message_task
+
+                                    # Send actual diff in a separate event
+                                    await self.send_event(
+                                        event_tx=event_tx,
+                                        status=AgentStatus.IDLE,
+                                        kind=MessageKind.REVIEW_RESULT,
+                                        content=content,
+                                        agent_state=agent_state,
+                                        unified_diff=final_diff,
+                                        app_name=agent_state["metadata"]["app_name"],
+                                        commit_message=commit_message,
+                                    )
+                            except Exception as e:
+                                logger.exception(f"Error sending final diff: {e}")
+
+                    # Exit if we are not working on a FSM or if the FSM is completed or failed
+                    if fsm_status != FSMStatus.WIP:
+                        break
 
         except Exception as e:
             logger.exception(f"Error in process: {str(e)}")
@@ -398,8 +480,12 @@ class BaseAgentSession(AgentInterface, ABC):
                 content=f"Error processing request: {str(e)}",
             )
         finally:
+            try:
+                await send_metadata_update(AgentStatus.IDLE, wait=True)
+            except Exception:
+                logger.exception("Error sending metadata update")
             if self.processor_instance.fsm_app is not None:
-                snapshot_saver.save_snapshot(
+                snapshot_saver.save_checkpoint(
                     trace_id=self._snapshot_key,
                     key="fsm_exit",
                     data=await self.processor_instance.fsm_app.fsm.dump(),
@@ -419,8 +505,13 @@ class BaseAgentSession(AgentInterface, ABC):
         unified_diff: Optional[str] = None,
         app_name: Optional[str] = None,
         commit_message: Optional[str] = None,
+        delta: Optional[StreamDelta] = None,
     ) -> None:
-        """Send event with specified parameters."""
+        """Send event with specified parameters.
+
+        unified_diff is the complete diff against the request's files, with the
+        `diff_delta` setting only the changes since the last diff sent are included.
+        """
         structured_blocks: List[ExternalContentBlock]
         if isinstance(content, list):
             structured_blocks = [
@@ -438,6 +529,32 @@ class BaseAgentSession(AgentInterface, ABC):
                 )
             ]
 
+        state_payload = None
+        if agent_state:
+            full_state = {
+                "fsm_state": agent_state["fsm_state"],
+                "fsm_messages": [x.to_dict() for x in agent_state["fsm_messages"]],
+                "metadata": agent_state["metadata"],
+            }
+            state_payload = full_state
+            if self._state_delta:
+                sent_state = state_delta.versioned(full_state)
+                state_payload = state_delta.encode(self._client_state, sent_state)
+                self._client_state = sent_state
+
+        complete_diff_hash = None
+        diff_stat = None
+        diff_payload = unified_diff
+        if unified_diff:
+            complete_diff_hash = diff_history.put(unified_diff)
+            diff_payload = unified_diff
+            if self._diff_delta:
+                # re-applies both diffs and runs difflib per changed file, off the event loop
+                diff_payload = await anyio.to_thread.run_sync(
+                    diff_between, self._diff_base, self._sent_diff, unified_diff
+                )
+            diff_stat = compute_diff_stat(diff_payload)
+
         event = AgentSseEvent(
             status=status,
             traceId=self.trace_id,
@@ -445,25 +562,20 @@ class BaseAgentSession(AgentInterface, ABC):
                 role="assistant",
                 kind=kind,
                 messages=structured_blocks,
-                agentState={
-                    "fsm_state": agent_state["fsm_state"],
-                    "fsm_messages": [x.to_dict() for x in agent_state["fsm_messages"]],
-                    "metadata": agent_state["metadata"],
-                }
-                if agent_state
-                else None,
-                unifiedDiff=unified_diff,
-                complete_diff_hash=md5(
-                    (unified_diff.encode() if unified_diff else b"")
-                ).hexdigest()
-                if unified_diff
-                else None,
-                diff_stat=None,
+                agentState=state_payload,
+                unifiedDiff=diff_payload,
+                completeDiffHash=complete_diff_hash,
+                diffStat=diff_stat,
                 app_name=app_name,
                 commit_message=commit_message,
+                delta=delta,
             ),
         )
         await event_tx.send(event)
+        if unified_diff:
+            self._sent_diff = unified_diff
+        if kind == MessageKind.STREAM_DELTA:
+            return  # the complete reply is saved with the next regular event
         snapshot_saver.save_snapshot(
             trace_id=self._snapshot_key,
             key=f"sse_events/{self._sse_counter}",
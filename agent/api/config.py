@@ -21,5 +21,19 @@ class Config:
     def snapshot_bucket(self):
         return os.getenv("SNAPSHOT_BUCKET", None)
 
+    @property
+    def warm_templates(self) -> list[str]:
+        """Templates to keep prebuilt in the workspace pool, e.g. "trpc,nicegui"."""
+        return [t.strip() for t in os.getenv("WARM_TEMPLATES", "").split(",") if t.strip()]
+
+    @property
+    def dagger_pool_size(self) -> int:
+        """Number of Dagger sessions shared across requests, 0 opens one per request."""
+        return int(os.getenv("DAGGER_POOL_SIZE", "0"))
+
+    @property
+    def dagger_pool_max_wait(self) -> float:
+        return float(os.getenv("DAGGER_POOL_MAX_WAIT", "10"))
+
 
 CONFIG = Config()
@@ -0,0 +1,43 @@
+"""
+Complete unified diffs sent to clients, by their completeDiffHash.
+
+With the `diff_delta` setting, messages carry only the changes since the
+previous diff of the session; clients that lost track of them fetch the
+complete diff by hash instead of replaying the session.
+"""
+
+from collections import OrderedDict
+from hashlib import md5
+
+MAX_HISTORY_BYTES = 64 * 1024 * 1024
+
+
+def diff_hash(diff: str) -> str:
+    return md5(diff.encode()).hexdigest()
+
+
+class DiffHistory:
+    """Most recently sent complete diffs, evicted once their total size exceeds max_bytes."""
+
+    def __init__(self, max_bytes: int = MAX_HISTORY_BYTES):
+        self.max_bytes = max_bytes
+        self._diffs: OrderedDict[str, str] = OrderedDict()
+        self._size = 0
+
+    def put(self, diff: str) -> str:
+        key = diff_hash(diff)
+        if key in self._diffs:
+            self._diffs.move_to_end(key)
+            return key
+        self._diffs[key] = diff
+        self._size += len(diff)
+        while self._size > self.max_bytes and len(self._diffs) > 1:
+            _, evicted = self._diffs.popitem(last=False)
+            self._size -= len(evicted)
+        return key
+
+    def get(self, key: str) -> str | None:
+        return self._diffs.get(key)
+
+
+diff_history = DiffHistory()
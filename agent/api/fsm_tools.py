@@ -5,12 +5,13 @@ from fire import Fire
 
 import enum
 from core.application import ApplicationBase
-from llm.utils import AsyncLLM, extract_tag
-from llm.common import InternalMessage, ToolUse, ToolResult as CommonToolResult, ToolUseResult, TextRaw, Tool
+from llm.utils import AsyncLLM, streamed_completion
+from llm.common import DeltaCallback, InternalMessage, ToolUse, ToolResult as CommonToolResult, ToolUseResult, TextRaw, Tool
 from log import get_logger
 import ujson as json
 import os
 from integrations.analyze_spreadsheet import SpreadsheetAnalyzer
+from api.thread_compaction import ThreadCompactor
 
 logger = get_logger(__name__)
 
@@ -68,7 +69,7 @@ class FSMToolProcessor:
         fsm_app: FSMInterface | None = None,
         settings: Dict[str, Any] | None = None,
         event_callback: Callable[[str], Awaitable[None]] | None = None,
-        max_messages_tokens: int = 512 * 1024,
+        max_messages_tokens: int = 128 * 1024,
     ):
         """
         Initialize the FSM Tool Processor
@@ -78,6 +79,7 @@ class FSMToolProcessor:
             fsm_app: Optional existing FSM application instance
             settings: Optional dictionary of settings for the FSM/LLM
             event_callback: Optional callback to emit intermediate SSE events with diffs
+            max_messages_tokens: Budget for the estimated size of the thread sent to the LLM
         """
         self.fsm_class = fsm_class
         self.fsm_app = fsm_app
@@ -85,6 +87,7 @@ class FSMToolProcessor:
         self.client = client
         self.event_callback = event_callback
         self.max_messages_tokens = max_messages_tokens
+        self.compactor = ThreadCompactor(max_messages_tokens)
 
         # Define tool definitions for the AI agent using the common Tool structure
         self.tool_definitions: list[Tool] = [
@@ -306,71 +309,12 @@ class FSMToolProcessor:
             logger.exception(f"Error analyzing spreadsheet: {str(e)}")
             return CommonToolResult(content=f"Failed to analyze spreadsheet: {str(e)}", is_error=True)
 
-    async def compact_thread(self, messages: list[InternalMessage], llm: AsyncLLM) -> list[InternalMessage]:
-        last_message = messages[-1]
-        match last_message.role:
-            case "assistant":
-                thread = messages  # we can keep the whole thread for compacting
-                residual_messages = []
-            case "user":
-                thread = messages[:-1]  # remove the last user message
-                residual_messages = [last_message]  # keep the last user message for context
-
-        formatted_thread = json.dumps([msg.to_dict() for msg in thread], indent=2, ensure_ascii=False)
-
-        prompt = f"""You need to compact a conversation thread to fit within a token limit.
-        Make sure to keep the context and important information, but remove any parts that are not essential for understanding the conversation or outdated.
-        Code snippets are not crucial for understanding the conversation, so they can be dropped or replaced with a summary.
-        Keep all the details about the user intent, and current status of generation.
-        Final output is expected to be ~10 times smaller than the original thread.
-
-        The final output should be structured as two parts: user message and assistant message. Wrap each part in <user> and <assistant> tags respectively.
-
-        Example:
-        <user>
-        I want to build a web application that allows users to share photos. It should have user authentication, photo upload, and a feed where users can see photos from others.
-        </user>
-
-        <assistant>
-        After some work, the application is ready and verified to be working correctly. It includes user authentication, photo upload functionality, and a feed where users can see photos from others.
-        I used tools to verify the application and ensure it meets the requirements.
-        Feel free to ask for any additional features or improvements!
-        </assistant>
-
-        The conversation thread is as follows:
-        {formatted_thread}
-        """
-
-        user_message = None
-        assistant_message = None
-
-        result = await llm.completion(
-            messages=[InternalMessage.from_dict({"role": "user", "content": [{"type": "text", "text": prompt}]})],
-            max_tokens=64 * 1024,
-        )
-        (content,) = result.content
-
-        match content:
-            case TextRaw(text):
-                user_message = extract_tag(text, "user")
-                assistant_message = extract_tag(text, "assistant")
-            case _:
-                raise ValueError(f"Unexpected content type in LLM response: {type(content)}")
-
-        if not user_message or not assistant_message:
-            raise ValueError("Compacted thread does not contain both user and assistant messages.")
-
-        thread = [
-            InternalMessage.from_dict({"role": "user", "content": [{"type": "text", "text": user_message}]}),
-            InternalMessage.from_dict({"role": "assistant", "content": [{"type": "text", "text": assistant_message}]}),
-        ]
-        logger.info(f"New compacted user message: {user_message}")
-        logger.info(f"New compacted assistant message: {assistant_message}")
-        thread += residual_messages  # add back the last user message if it was removed
-        return thread
-
     async def step(
-        self, messages: list[InternalMessage], llm: AsyncLLM, model_params: dict
+        self,
+        messages: list[InternalMessage],
+        llm: AsyncLLM,
+        model_params: dict,
+        on_delta: DeltaCallback | None = None,
     ) -> Tuple[list[InternalMessage], FSMStatus, list[InternalMessage]]:
         model_args = {
             "system_prompt": self.system_prompt,
@@ -378,8 +322,9 @@ class FSMToolProcessor:
             **model_params,
         }
 
+        messages = self.compactor.fit(messages, llm)
         try:
-            response = await llm.completion(messages, **model_args)
+            response = await streamed_completion(llm, on_delta, messages=messages, **model_args)
         except Exception as e:
             msg_sizes = [len(json.dumps(msg.to_dict())) for msg in messages]
             last_message = messages[-1] if messages else None
@@ -390,8 +335,6 @@ class FSMToolProcessor:
             logger.error(f"LLM completion failed with messages of sizes: {msg_sizes}, last message side: {last_side}")
             # FixMe: this is a workaround for debugging, remove it later
             raise e
-        input_tokens = response.input_tokens
-        output_tokens = response.output_tokens
 
         tool_results = []
         for block in response.content:
@@ -432,10 +375,6 @@ class FSMToolProcessor:
                 fsm_status = FSMStatus.WIP  # continue processing
 
         full_thread = messages + thread
-        if input_tokens + output_tokens > self.max_messages_tokens:
-            logger.info(f"Message size exceeds max tokens ({self.max_messages_tokens}), compacting thread")
-            full_thread = await self.compact_thread(full_thread, llm)
-
         return thread, fsm_status, full_thread
 
     def fsm_as_result(self) -> dict:
@@ -4,6 +4,7 @@ from log import get_logger
 from api.config import CONFIG
 import os
 import logging
+from collections import OrderedDict
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type, before_sleep_log
 from botocore.exceptions import ClientError, BotoCoreError
 
@@ -21,8 +22,12 @@ retry_s3_errors = retry(
 
 
 class FSMSnapshotSaver:
+    MAX_TRACKED_TRACES = 64
+
     def __init__(self):
         self.bucket_name = CONFIG.snapshot_bucket or ""
+        # blob keys already stored per trace, so repeated checkpoints only add new blobs
+        self._saved_blobs: OrderedDict[str, set[str]] = OrderedDict()
 
         if os.path.exists(self.bucket_name) and os.path.isdir(self.bucket_name):
             self.is_local = True
@@ -61,6 +66,26 @@ class FSMSnapshotSaver:
             case False:
                 self.save_s3(trace_id, key, data)
 
+    def save_checkpoint(self, trace_id: str, key: str, data: dict):
+        """Save an FSM checkpoint, writing each content-addressed blob once per trace.
+
+        Blobs not stored yet for this trace go to a single blobs/<key> object; the
+        checkpoint itself lists the blob keys it references instead of the values.
+        """
+        if not self.is_available:
+            return
+
+        blobs: dict = data.get("blobs") or {}
+        saved = self._saved_blobs.setdefault(trace_id, set())
+        self._saved_blobs.move_to_end(trace_id)
+        while len(self._saved_blobs) > self.MAX_TRACKED_TRACES:
+            self._saved_blobs.popitem(last=False)
+
+        if new_blobs := {k: v for k, v in blobs.items() if k not in saved}:
+            self.save_snapshot(trace_id=trace_id, key=f"blobs/{key}", data=new_blobs)
+            saved.update(new_blobs)
+        self.save_snapshot(trace_id=trace_id, key=key, data={**data, "blobs": sorted(blobs)})
+
     def save_s3(self, trace_id: str, key: str, data: object):
         logger.info(f"Storing snapshot for trace: {trace_id}/{key}")
         file_key = f"{trace_id}/{key}.json"
@@ -0,0 +1,183 @@
+"""
+Incremental encoding of agentState for SSE events.
+
+Clients opt in with the `state_delta` setting. The server then sends, instead of
+the full state, an envelope describing how to get from the state the client
+already holds (the one it sent in the request, or the last one it received) to
+the new one:
+
+    {"stateDelta": {"base": <version>, "version": <version>, "ops": [...]}}
+
+Versions are content digests, so the client can verify the reassembled state.
+Full states are still sent when there is no base or the delta isn't smaller.
+
+Ops address values by path. A path element is a dict key, a list index, or
+{"id": ...} for lists of objects keyed by id (search tree dumps), where
+positions shift as nodes are added:
+
+    {"op": "set", "path": [...], "value": ...}
+    {"op": "del", "path": [...]}
+    {"op": "append", "path": [...], "values": [...]}
+    {"op": "order", "path": [...], "ids": [...]}   # reorder/drop items of an id-keyed list
+"""
+
+import copy
+import hashlib
+import ujson as json
+from dataclasses import dataclass
+from typing import Any
+
+DELTA_KEY = "stateDelta"
+
+Path = list[Any]
+Op = dict[str, Any]
+
+
+class StateDeltaError(Exception):
+    """Raised when a delta can't be applied to the given base state."""
+
+
+def state_version(state: Any) -> str:
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class VersionedState:
+    """Detached, JSON-normalized copy of a state as the client will see it, with its version."""
+
+    state: Any
+    version: str
+    # length of the serialized state, what sending it in full costs
+    size: int
+
+
+def versioned(state: Any) -> VersionedState:
+    """Serialize state once for its copy, version and size."""
+    data = json.dumps(state, sort_keys=True)
+    return VersionedState(json.loads(data), hashlib.sha256(data.encode()).hexdigest(), len(data))
+
+
+def _id_keyed(items: list) -> bool:
+    if not items or not all(isinstance(x, dict) and "id" in x for x in items):
+        return False
+    ids = [x["id"] for x in items]
+    return len(set(ids)) == len(ids)
+
+
+def diff(old: Any, new: Any, path: Path | None = None) -> list[Op]:
+    """Ops turning old into new."""
+    path = path or []
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: list[Op] = []
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "set", "path": path + [key], "value": value})
+            else:
+                ops.extend(diff(old[key], value, path + [key]))
+        ops.extend({"op": "del", "path": path + [key]} for key in old if key not in new)
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        if _id_keyed(old) and _id_keyed(new):
+            by_id = {x["id"]: x for x in old}
+            ops = []
+            for item in new:
+                if item["id"] not in by_id:
+                    ops.append({"op": "set", "path": path + [{"id": item["id"]}], "value": item})
+                else:
+                    ops.extend(diff(by_id[item["id"]], item, path + [{"id": item["id"]}]))
+            ids = [x["id"] for x in new]
+            if ids != [x["id"] for x in old]:
+                ops.append({"op": "order", "path": path, "ids": ids})
+            return ops
+        if len(old) < len(new) and new[: len(old)] == old:
+            return [{"op": "append", "path": path, "values": new[len(old):]}]
+        if len(old) == len(new):
+            ops = []
+            for i, (a, b) in enumerate(zip(old, new)):
+                ops.extend(diff(a, b, path + [i]))
+            return ops
+    return [{"op": "set", "path": path, "value": new}]
+
+
+def _child(container: Any, key: Any) -> Any:
+    if isinstance(key, dict):
+        return next(x for x in container if x["id"] == key["id"])
+    return container[key]
+
+
+def _set(container: Any, key: Any, value: Any):
+    if isinstance(key, dict):
+        for i, item in enumerate(container):
+            if item["id"] == key["id"]:
+                container[i] = value
+                return
+        container.append(value)
+    elif isinstance(container, list) and key == len(container):
+        container.append(value)
+    else:
+        container[key] = value
+
+
+def apply(state: Any, ops: list[Op]) -> Any:
+    """Apply ops to a copy of state."""
+    root = {"": copy.deepcopy(state)}
+    op = None  # ops itself may be malformed
+    try:
+        for op in ops:
+            path = [""] + op["path"]
+            parent = root
+            for key in path[:-1]:
+                parent = _child(parent, key)
+            key = path[-1]
+            match op["op"]:
+                case "set":
+                    _set(parent, key, op["value"])
+                case "del":
+                    del parent[key]
+                case "append":
+                    _child(parent, key).extend(op["values"])
+                case "order":
+                    items = _child(parent, key)
+                    by_id = {x["id"]: x for x in items}
+                    items[:] = [by_id[i] for i in op["ids"]]
+                case other:
+                    raise StateDeltaError(f"Unknown op: {other}")
+    except (KeyError, IndexError, TypeError, StopIteration) as e:
+        raise StateDeltaError(f"Can't apply {op} to base state") from e
+    return root[""]
+
+
+# everything of a delta envelope but its ops
+_ENVELOPE_SIZE = len(json.dumps({DELTA_KEY: {"base": "0" * 64, "version": "0" * 64, "ops": []}}))
+
+
+def encode(base: VersionedState | None, state: VersionedState) -> dict[str, Any]:
+    """agentState payload for an event: a delta against base when that is smaller.
+
+    Pass the state sent with one event as the base of the next, its version is reused.
+    """
+    if base is None:
+        return state.state
+    ops = diff(base.state, state.state)
+    if _ENVELOPE_SIZE + len(json.dumps(ops)) >= state.size:
+        return state.state
+    return {DELTA_KEY: {"base": base.version, "version": state.version, "ops": ops}}
+
+
+def is_delta(payload: dict[str, Any] | None) -> bool:
+    return payload is not None and DELTA_KEY in payload
+
+
+def decode(base: dict[str, Any] | None, payload: dict[str, Any]) -> dict[str, Any]:
+    """Full state from an agentState payload, given the state the client holds."""
+    if not is_delta(payload):
+        return payload
+    delta = payload[DELTA_KEY]
+    if base is None or state_version(base) != delta["base"]:
+        raise StateDeltaError("Delta doesn't match the base state held by the client")
+    state = apply(base, delta["ops"])
+    if state_version(state) != delta["version"]:
+        raise StateDeltaError("Reassembled state doesn't match the delta version")
+    return state
@@ -0,0 +1,180 @@
+"""
+Keeps the top-level agent's thread within its token budget.
+
+The thread is fitted before every request instead of being summarized in a
+single call once a response reports it overflowed:
+
+- turns older than the recent window are summarized in the background, and the
+  summary replaces them once it is ready; the next summary covers the previous
+  one plus the turns aged out since. Summaries run in the task group of
+  `ThreadCompactor.running`, they are cancelled when the session leaves it;
+- large tool results outside the window are replaced by a reference to their
+  content hash, the FSM state they carry is repeated by later results anyway;
+- if the estimate still exceeds the budget, the oldest turns are dropped.
+
+Token counts are estimated locally, see llm.rate_limit.estimate_tokens.
+"""
+
+import hashlib
+import ujson as json
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import anyio
+from anyio.abc import TaskGroup
+
+from llm.common import AsyncLLM, InternalMessage, TextRaw, ToolResult, ToolUseResult
+from llm.rate_limit import estimate_tokens
+from llm.utils import extract_tag
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# tool results above this size are elided once they leave the window
+ELIDE_RESULT_CHARS = 4096
+SUMMARY_MAX_TOKENS = 8192
+
+
+def _tokens(message: InternalMessage) -> int:
+    return estimate_tokens([message])
+
+
+def elide_result(block: ToolUseResult) -> ToolUseResult:
+    content = block.tool_result.content
+    if len(content) <= ELIDE_RESULT_CHARS:
+        return block
+    digest = hashlib.sha256(content.encode()).hexdigest()[:16]
+    reference = f"[{block.tool_use.name} result omitted from context: {len(content)} chars, sha256 {digest}]"
+    result = ToolResult(reference, block.tool_result.tool_use_id, block.tool_result.name, block.tool_result.is_error)
+    return ToolUseResult(block.tool_use, result)
+
+
+def elide_results(message: InternalMessage) -> InternalMessage:
+    """The message with its large tool results replaced, or the message itself if there are none."""
+    content = [elide_result(b) if isinstance(b, ToolUseResult) else b for b in message.content]
+    if all(new is old for new, old in zip(content, message.content)):
+        return message
+    return InternalMessage(role=message.role, content=content)
+
+
+@dataclass
+class _Summary:
+    messages: list[InternalMessage]
+    done: anyio.Event = field(default_factory=anyio.Event)
+    result: InternalMessage | None = None
+
+
+class ThreadCompactor:
+    def __init__(self, max_tokens: int, window_tokens: int | None = None):
+        """
+        Args:
+            max_tokens: Budget for the estimated size of the thread
+            window_tokens: Size of the recent turns kept verbatim, a quarter of the budget by default
+        """
+        self.max_tokens = max_tokens
+        self.window_tokens = window_tokens or max_tokens // 4
+        self._tg: TaskGroup | None = None
+        self._summary: _Summary | None = None
+        self._summary_message: InternalMessage | None = None
+
+    @asynccontextmanager
+    async def running(self):
+        """Scope in which aged-out turns are summarized; a summary still running is cancelled on exit."""
+        async with anyio.create_task_group() as tg:
+            self._tg = tg
+            try:
+                yield self
+            finally:
+                self._tg = None
+                tg.cancel_scope.cancel()
+
+    def fit(self, messages: list[InternalMessage], llm: AsyncLLM) -> list[InternalMessage]:
+        """The thread to send, within the budget; summarization of aged-out turns is started with llm."""
+        messages = self._apply_summary(messages)
+        total = sum(_tokens(m) for m in messages)
+        if total <= self.window_tokens:
+            return messages
+
+        boundary = self._boundary(messages, self.window_tokens)
+        aged = [elide_results(m) for m in messages[:boundary]]
+        messages = aged + messages[boundary:]
+        # summarize once enough turns aged out since the last summary
+        aged_out = sum(_tokens(m) for m in aged if m is not self._summary_message)
+        if self._tg is not None and self._summary is None and aged_out >= self.window_tokens // 4:
+            self._summary = _Summary(aged)
+            self._tg.start_soon(self._run_summary, self._summary, llm)
+
+        total = sum(_tokens(m) for m in messages)
+        if total > self.max_tokens and (boundary := self._boundary(messages, self.max_tokens - 100)):
+            logger.warning(
+                f"Thread of ~{total} tokens exceeds {self.max_tokens}, dropping {boundary} oldest messages"
+            )
+            note = f"[{boundary} earlier messages were dropped to fit the context window]"
+            messages = [InternalMessage(role="user", content=[TextRaw(note)])] + messages[boundary:]
+        return messages
+
+    @staticmethod
+    def _boundary(messages: list[InternalMessage], budget: int) -> int:
+        """Index of the oldest assistant message from which the thread fits budget.
+
+        Cutting before an assistant message keeps tool uses with their results,
+        the cut part is replaced by a single user message.
+        """
+        size = 0
+        boundary = len(messages)
+        for i in range(len(messages) - 1, 0, -1):
+            size += _tokens(messages[i])
+            if size > budget:
+                break
+            if messages[i].role == "assistant":
+                boundary = i
+        if boundary == len(messages):
+            # even the last turn is over budget, keep it from its first assistant message
+            boundary = next(
+                (i for i in range(len(messages) - 1, 0, -1) if messages[i].role == "assistant"), 0
+            )
+        return boundary
+
+    def _apply_summary(self, messages: list[InternalMessage]) -> list[InternalMessage]:
+        if self._summary is None or not self._summary.done.is_set():
+            return messages
+        summary, self._summary = self._summary, None
+        if summary.result is None:
+            return messages  # failed or cancelled, logged by _run_summary
+        n = len(summary.messages)
+        if len(messages) <= n or any(a is not b for a, b in zip(messages, summary.messages)):
+            return messages  # the summarized turns were dropped meanwhile
+        logger.info(f"Replacing {n} messages with their summary")
+        self._summary_message = summary.result
+        return [self._summary_message] + messages[n:]
+
+    async def _run_summary(self, summary: _Summary, llm: AsyncLLM):
+        try:
+            summary.result = await self._summarize(summary.messages, llm)
+        except Exception as e:
+            logger.warning(f"Summarizing the thread failed: {e}")
+        finally:
+            summary.done.set()
+
+    @staticmethod
+    async def _summarize(messages: list[InternalMessage], llm: AsyncLLM) -> InternalMessage:
+        thread = json.dumps([m.to_dict() for m in messages], ensure_ascii=False)
+        prompt = f"""You need to summarize the beginning of a conversation thread, the rest of the thread will follow your summary.
+Keep the context and important information, remove any parts that are not essential for understanding the conversation or outdated.
+Code snippets are not crucial for understanding the conversation, so they can be dropped or replaced with a summary.
+Keep all the details about the user intent, and current status of generation.
+Wrap the summary in <summary> tags.
+
+The conversation thread is as follows:
+{thread}
+"""
+        result = await llm.completion(
+            messages=[InternalMessage(role="user", content=[TextRaw(prompt)])],
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+        text = "".join(b.text for b in result.content if isinstance(b, TextRaw))
+        if not (summary := extract_tag(text, "summary")):
+            raise ValueError("Summary of the thread is missing <summary> tags")
+        return InternalMessage(
+            role="user", content=[TextRaw(f"Summary of the conversation so far:\n{summary}")]
+        )
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+CachedLLM cache key benchmark.
+
+Times the key computation for agent-like histories, as the whole-request
+normalize + json.dumps + md5 done before and as the per-message digests used
+now. "warm" is the common case in a search: the same history grown by one
+message, with the earlier messages' digests already memoized.
+
+Usage:
+  uv run python cache_key_benchmark.py --sizes=10,100,1000 --repeat=5
+"""
+
+import time
+import hashlib
+import ujson as json
+import fire
+from llm.cached import normalize, request_key
+from llm.common import Message, TextRaw, ToolUse, ToolUseResult
+
+FILE_CONTENT = "export const handler = async (input: Input) => {\n  return input;\n};\n" * 40
+
+
+def _tools() -> list[dict]:
+    return [
+        {"name": name, "description": f"{name} tool", "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}}}
+        for name in ("read_file", "write_file", "edit_file", "delete_file", "complete")
+    ]
+
+
+def _history(n: int) -> list[Message]:
+    messages = []
+    for i in range(n):
+        if i % 2 == 0:
+            tool_use = ToolUse("write_file", {"path": f"src/file_{i}.ts", "content": FILE_CONTENT}, f"tool-{i}")
+            messages.append(Message(role="assistant", content=[TextRaw(f"Writing file {i}"), tool_use]))
+        else:
+            tool_use = ToolUse("write_file", {"path": f"src/file_{i - 1}.ts"}, f"tool-{i - 1}")
+            messages.append(Message(role="user", content=[ToolUseResult.from_tool_use(tool_use, "success")]))
+    return messages
+
+
+def _legacy_key(**kwargs) -> str:
+    return hashlib.md5(json.dumps(normalize(kwargs), sort_keys=True).encode()).hexdigest()
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes: str | tuple[int, ...] = (10, 100, 1000), repeat: int = 5) -> None:
+    if isinstance(sizes, str):
+        sizes = tuple(int(s) for s in sizes.split(","))
+    tools = _tools()
+    params = {"max_tokens": 8192, "model": None, "temperature": 1.0, "tool_choice": None, "system_prompt": "You are a helpful assistant."}
+    print(f"{'messages':>8} {'legacy (ms)':>12} {'cold (ms)':>10} {'warm (ms)':>10} {'speedup':>8}")
+    for n in sizes:
+        messages = _history(n)
+        legacy = _best(lambda: _legacy_key(messages=messages, tools=tools, **params), repeat)
+        fresh = iter([(_history(n), _tools()) for _ in range(repeat)])
+
+        def cold_key():
+            history, fresh_tools = next(fresh)
+            request_key(messages=history, tools=fresh_tools, **params)
+
+        cold = _best(cold_key, repeat)
+        request_key(messages=messages, tools=tools, **params)
+        grown = messages + [Message(role="user", content=[TextRaw("Continue")])]
+        warm = _best(lambda: request_key(messages=grown, tools=tools, **params), repeat)
+        print(f"{n:>8} {legacy * 1000:>12.2f} {cold * 1000:>10.2f} {warm * 1000:>10.2f} {legacy / warm:>7.1f}x")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 import gc
+from typing import Any
 from llm.utils import llm_clients_cache
 
 try:
@@ -34,16 +35,12 @@ async def cleanup_httpx_clients():
     await asyncio.sleep(0)  # Let pending tasks complete
 
     # Access the Gemini client's httpx client and close it if needed
-    for client in llm_clients_cache.values():
-        if hasattr(client, 'client') and hasattr(client.client, '_async_client'):
-            # Handle CachedLLM wrapper
-            gemini_client = client.client
-            if hasattr(gemini_client, '_async_client') and hasattr(gemini_client._async_client, '_httpx_client'):
-                httpx_client = gemini_client._async_client._httpx_client
-                if httpx_client and not httpx_client.is_closed:
-                    await httpx_client.aclose()
-        elif hasattr(client, '_async_client') and hasattr(client._async_client, '_httpx_client'):
-            # Direct GeminiLLM client
+    for cached_client in llm_clients_cache.values():
+        # unwrap CachedLLM and RateLimitedLLM layers down to the backend client
+        client: Any = cached_client
+        while not hasattr(client, '_async_client') and hasattr(client, 'client'):
+            client = client.client
+        if hasattr(client, '_async_client') and hasattr(client._async_client, '_httpx_client'):
             httpx_client = client._async_client._httpx_client
             if httpx_client and not httpx_client.is_closed:
                 await httpx_client.aclose()
@@ -1,16 +1,21 @@
-from typing import Protocol
+from typing import Awaitable, Callable, Protocol
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import dataclasses
 import anyio
+from anyio.abc import TaskGroup
 from anyio.streams.memory import MemoryObjectSendStream
-from core import statemachine
+from core import statemachine, checkpoint
 from core.base_node import Node
 from llm.common import AsyncLLM, Message, InternalMessage
 from llm.utils import loop_completion, extract_tag
+from llm.telemetry import telemetry_actor
 from core.workspace import Workspace
 import hashlib
 from abc import ABC, abstractmethod
 from llm.common import Tool, ToolUse, ToolUseResult, TextRaw
 from llm.utils import get_ultra_fast_llm_client
+from core.notification_utils import muted_notifications
 from log import get_logger
 
 # ExceptionGroup support for Python 3.11+
@@ -34,13 +39,63 @@ class AgentSearchFailedException(Exception):
         super().__init__(user_message)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(init=False)
 class BaseData:
-    workspace: Workspace
     messages: list[Message]
-    files: dict[str, str | None] = dataclasses.field(default_factory=dict)
-    should_branch: bool = False
-    context: str = "default"
+    files: dict[str, str | None]
+    should_branch: bool
+    context: str
+
+    def __init__(
+        self,
+        workspace: Workspace | None,
+        messages: list[Message],
+        files: dict[str, str | None] | None = None,
+        should_branch: bool = False,
+        context: str = "default",
+        base: Callable[[], Workspace] | None = None,
+        pending: dict[str, str | None] | None = None,
+    ):
+        """Node payload; pass workspace=None with base to defer building the workspace.
+
+        A deferred workspace is built from a clone of base() with pending applied,
+        defaulting to this node's own files (i.e. base is the parent's workspace).
+        materialize() builds it with a single bulk write, and the search calls it
+        before a node's first use (run_llm, run_tools); plain attribute access
+        falls back to per-file writes.
+        """
+        self._workspace = workspace
+        self._base = base
+        self.messages = messages
+        self.files = files if files is not None else {}
+        self.should_branch = should_branch
+        self.context = context
+        self._pending = pending if pending is not None else self.files
+
+    @property
+    def workspace(self) -> Workspace:
+        if self._base is not None:
+            workspace = self._base().clone()
+            for file, content in self._pending.items():
+                if content is not None:
+                    workspace.write_file(file, content)
+                else:
+                    workspace.rm(file)
+            self.workspace = workspace
+        return self._workspace  # pyright: ignore[reportReturnType]
+
+    @workspace.setter
+    def workspace(self, workspace: Workspace):
+        self._workspace, self._base, self._pending = workspace, None, {}
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._base is None
+
+    async def materialize(self) -> Workspace:
+        if self._base is not None:
+            self.workspace = await self._base().clone().apply_files(self._pending)
+        return self._workspace  # pyright: ignore[reportReturnType]
 
     def head(self) -> Message:
         if (num_messages := len(self.messages)) != 1:
@@ -57,25 +112,48 @@ class BaseData:
         return hashlib.md5(s.encode()).hexdigest()
 
 
+@dataclasses.dataclass
+class SpeculativeCheck:
+    """Checks started for a node's file state before any child asked for them."""
+
+    ctr: object
+    done: anyio.Event = dataclasses.field(default_factory=anyio.Event)
+    scope: anyio.CancelScope = dataclasses.field(default_factory=anyio.CancelScope)
+    result: str | None = None
+    failed: bool = False
+    # children evaluated since, their complete calls no longer need the result
+    settled: set[str] = dataclasses.field(default_factory=set)
+
+
+@dataclasses.dataclass
+class SearchPipeline:
+    tg: TaskGroup
+    # bounds the check suites running in the background, like eval_concurrency does for evaluations
+    limiter: anyio.CapacityLimiter
+    checks: dict[str, SpeculativeCheck] = dataclasses.field(default_factory=dict)
+
+
+_pipeline: ContextVar[SearchPipeline | None] = ContextVar("search_pipeline", default=None)
+
+
 class BaseActor(statemachine.Actor):
     workspace: Workspace
 
     async def dump_data(self, data: BaseData) -> object:
         return {
-            "messages": [msg.to_dict() for msg in data.messages],
-            "files": data.files,
+            "messages": [checkpoint.intern_message(msg.to_dict()) for msg in data.messages],
+            "files": {file: checkpoint.intern(content) for file, content in data.files.items()},
             "should_branch": data.should_branch,
         }
 
-    async def load_data(self, data: dict, workspace: Workspace) -> BaseData:
-        for file, content in data["files"].items():
-            if content is not None:
-                workspace.write_file(file, content)
-            else:
-                workspace.rm(file)
-        messages = [Message.from_dict(msg) for msg in data["messages"]]
+    async def load_data(
+        self, data: dict, base: Callable[[], Workspace], pending: dict[str, str | None]
+    ) -> BaseData:
+        """Restore node data; the workspace is only built once the node is used."""
+        files = {file: checkpoint.resolve(content) for file, content in data["files"].items()}
+        messages = [Message.from_dict(checkpoint.resolve_message(msg)) for msg in data["messages"]]
         return BaseData(
-            workspace, messages, data["files"], data.get("should_branch", False)
+            None, messages, files, data.get("should_branch", False), base=base, pending={**pending, **files}
         )
 
     async def dump_node(self, node: Node[BaseData]) -> list[dict]:
@@ -97,8 +175,10 @@ class BaseActor(statemachine.Actor):
         id_to_node: dict[str, Node[BaseData]] = {}
         for item in data:
             parent = id_to_node[item["parent"]] if item["parent"] else None
-            workspace = parent.data.workspace if parent else self.workspace
-            node_data = await self.load_data(item["data"], workspace.clone())
+            # every node is rebuilt from the actor workspace with files folded along its trajectory,
+            # so restoring a node costs one bulk write regardless of depth
+            pending = parent.data._pending if parent else {}
+            node_data = await self.load_data(item["data"], lambda w=self.workspace: w, pending)
             node = Node(node_data, parent, item["id"])
             if parent:
                 parent.children.append(node)
@@ -126,7 +206,7 @@ class LLMActor(Protocol):
             history = [m for n in node.get_trajectory() for m in n.data.messages]
             new_node = Node[BaseData](
                 data=BaseData(
-                    workspace=node.data.workspace.clone(),
+                    workspace=(await node.data.materialize()).clone(),
                     messages=[
                         await loop_completion(
                             self.llm, history, system_prompt=system_prompt, **kwargs
@@ -144,8 +224,10 @@ class LLMActor(Protocol):
         result = []
         tx, rx = anyio.create_memory_object_stream[Node[BaseData]]()
         async with anyio.create_task_group() as tg:
-            for node in nodes:
-                tg.start_soon(node_fn, node, tx.clone())
+            # tasks copy the context on start, so their calls are reported for this actor
+            with telemetry_actor(type(self).__name__):
+                for node in nodes:
+                    tg.start_soon(node_fn, node, tx.clone())
             tx.close()
             async with rx:
                 async for new_node in rx:
@@ -164,15 +246,19 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
         beam_width: int = 3,
         max_depth: int = 30,
         fast_llm: AsyncLLM | None = None,
+        eval_concurrency: int = 1,
+        pipelined: bool = False,
     ):
         self.llm = llm
         self.fast_llm = fast_llm or get_ultra_fast_llm_client()
         self.workspace = workspace
         self.beam_width = beam_width
         self.max_depth = max_depth
+        self.eval_concurrency = max(1, eval_concurrency)
+        self.pipelined = pipelined
         self.root = None
         logger.info(
-            f"Initialized {self.__class__.__name__} with beam_width={beam_width}, max_depth={max_depth}"
+            f"Initialized {self.__class__.__name__} with beam_width={beam_width}, max_depth={max_depth}, eval_concurrency={self.eval_concurrency}, pipelined={pipelined}"
         )
 
     @property
@@ -190,6 +276,30 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
                     "required": ["path"],
                 },
             },
+            {
+                "name": "read_files",
+                "description": "Read content of several files at once, prefer it to consecutive read_file calls",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "paths": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["paths"],
+                },
+            },
+            {
+                "name": "read_file_lines",
+                "description": "Read lines start to end of a file, 1-based and inclusive",
+                "input_schema": {
+                    "type": "object",
+                    "properties": {
+                        "path": {"type": "string"},
+                        "start": {"type": "integer", "default": 1},
+                        "end": {"type": "integer", "default": 100},
+                    },
+                    "required": ["path"],
+                },
+            },
             {
                 "name": "write_file",
                 "description": "Write content to a file",
@@ -255,6 +365,16 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
             if isinstance(v, str)
         )
 
+    @staticmethod
+    def _files_repr(files: dict[str, str | None]) -> str:
+        """Contents of files read at once, with missing files reported in place."""
+        return "\n".join(
+            f'<file path="{path}">\n{content}\n</file>'
+            if content is not None
+            else f'<file path="{path}" error="File not found" />'
+            for path, content in files.items()
+        )
+
     def _unpack_exception_group(self, exc: BaseException) -> list[BaseException]:
         """Recursively unpack ExceptionGroup to get all individual exceptions."""
         if isinstance(exc, BaseExceptionGroup):
@@ -406,6 +526,7 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
     ) -> tuple[list[ToolUseResult], bool]:
         """Execute tools for a given node."""
         logger.info(f"Running tools for node {node._id}")
+        await node.data.materialize()
         result, is_completed = [], False
 
         for block in node.data.head().content:
@@ -429,6 +550,26 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
                         )
                         result.append(ToolUseResult.from_tool_use(block, tool_content))
 
+                    case "read_files":
+                        files = await node.data.workspace.read_files(
+                            block.input["paths"]  # pyright: ignore[reportIndexIssue]
+                        )
+                        result.append(
+                            ToolUseResult.from_tool_use(
+                                block,
+                                self._files_repr(files),
+                                is_error=all(c is None for c in files.values()),
+                            )
+                        )
+
+                    case "read_file_lines":
+                        tool_content = await node.data.workspace.read_file_lines(
+                            block.input["path"],  # pyright: ignore[reportIndexIssue]
+                            block.input.get("start", 1),  # pyright: ignore[reportAttributeAccessIssue]
+                            block.input.get("end", 100),  # pyright: ignore[reportAttributeAccessIssue]
+                        )
+                        result.append(ToolUseResult.from_tool_use(block, tool_content))
+
                     case "write_file":
                         path = block.input["path"]  # pyright: ignore[reportIndexIssue]
                         content = block.input["content"]  # pyright: ignore[reportIndexIssue]
@@ -551,7 +692,7 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
                                 "Can not complete without writing any changes."
                             )
                         logger.info("RUNNING CHECKS")
-                        check_err = await self.run_checks(node, user_prompt)
+                        check_err = await self._run_checks_pipelined(node, user_prompt)
                         logger.info(f"CHECKS RESULT: {check_err}")
                         if check_err:
                             logger.info(f"Failed to complete: {check_err}")
@@ -614,6 +755,139 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
             node.data.messages.append(Message(role="user", content=content))
         return is_completed
 
+    async def eval_nodes(
+        self,
+        nodes: list[Node[BaseData]],
+        user_prompt: str,
+        on_eval: Callable[[Node[BaseData]], Awaitable[None]] | None = None,
+    ) -> Node[BaseData] | None:
+        """Evaluate candidate nodes and return the first one that completes.
+
+        With eval_concurrency > 1 up to that many candidates are evaluated concurrently;
+        once a candidate passes, evaluations still in flight are cancelled. The limit is
+        per call, so parallel searches (e.g. one per handler) don't wait on each other.
+        """
+        if self.eval_concurrency == 1:
+            for i, node in enumerate(nodes):
+                logger.info(f"Evaluating node {i + 1}/{len(nodes)}")
+                if on_eval is not None:
+                    await on_eval(node)
+                completed = await self.eval_node(node, user_prompt)
+                self._settle_speculation(node)
+                if completed:
+                    return node
+                self._speculate_checks(node, user_prompt)
+            return None
+
+        solution: Node[BaseData] | None = None
+        limiter = anyio.CapacityLimiter(self.eval_concurrency)
+
+        async def eval_one(i: int, node: Node[BaseData], scope: anyio.CancelScope):
+            nonlocal solution
+            async with limiter:
+                logger.info(f"Evaluating node {i + 1}/{len(nodes)} concurrently")
+                if on_eval is not None:
+                    await on_eval(node)
+                completed = await self.eval_node(node, user_prompt)
+                self._settle_speculation(node)
+                if not completed:
+                    self._speculate_checks(node, user_prompt)
+                elif solution is None:
+                    solution = node
+                    scope.cancel()
+
+        async with anyio.create_task_group() as tg:
+            for i, node in enumerate(nodes):
+                tg.start_soon(eval_one, i, node, tg.cancel_scope)
+        if solution is not None and len(nodes) > 1:
+            logger.info(f"Node {solution._id} completed, cancelled remaining evaluations")
+        return solution
+
+    @asynccontextmanager
+    async def pipeline(self):
+        """Scope of a search loop.
+
+        In pipelined mode, once a node that changed files is evaluated without completing,
+        its checks start in the background while the LLM produces the next turn. A child
+        that then calls complete without touching the workspace reuses that result. At most
+        eval_concurrency of these run at once, and they are cancelled once every child of
+        the node has been evaluated.
+        """
+        if not self.pipelined:
+            yield
+            return
+        async with anyio.create_task_group() as tg:
+            token = _pipeline.set(SearchPipeline(tg, anyio.CapacityLimiter(self.eval_concurrency)))
+            try:
+                yield
+            finally:
+                _pipeline.reset(token)
+                tg.cancel_scope.cancel()
+
+    def _speculate_checks(self, node: Node[BaseData], user_prompt: str):
+        pipeline = _pipeline.get()
+        if pipeline is None or not node.data.files or node._id in pipeline.checks:
+            return
+        if any(
+            isinstance(block, ToolUse) and block.name == "complete"
+            for block in node.data.messages[0].content
+        ):
+            return  # checks already ran for this state
+        # stand-in for a child that calls complete straight away
+        shadow = Node[BaseData](
+            BaseData(node.data.workspace.clone(), [], {}, False, node.data.context),
+            parent=node,
+        )
+        spec = SpeculativeCheck(ctr=node.data.workspace.ctr)
+        pipeline.checks[node._id] = spec
+        pipeline.tg.start_soon(self._run_speculative_checks, spec, shadow, user_prompt)
+        logger.info(f"Started speculative checks for node {node._id}")
+
+    async def _run_speculative_checks(
+        self, spec: SpeculativeCheck, shadow: Node[BaseData], user_prompt: str
+    ):
+        pipeline = _pipeline.get()
+        assert pipeline is not None
+        with muted_notifications(), spec.scope:
+            try:
+                async with pipeline.limiter:
+                    spec.result = await self.run_checks(shadow, user_prompt)
+            except anyio.get_cancelled_exc_class():
+                spec.failed = True
+                raise
+            except Exception as e:
+                logger.warning(f"Speculative checks failed to run: {e}")
+                spec.failed = True
+            finally:
+                spec.done.set()
+
+    def _settle_speculation(self, node: Node[BaseData]):
+        """Cancel the parent's speculative checks once none of its children can use them."""
+        pipeline = _pipeline.get()
+        if pipeline is None or node.parent is None:
+            return
+        spec = pipeline.checks.get(node.parent._id)
+        if spec is None or spec.done.is_set():
+            return
+        spec.settled.add(node._id)
+        if all(child._id in spec.settled for child in node.parent.children):
+            logger.info(f"Cancelled speculative checks for node {node.parent._id}")
+            spec.scope.cancel()
+
+    async def _run_checks_pipelined(
+        self, node: Node[BaseData], user_prompt: str
+    ) -> str | None:
+        pipeline = _pipeline.get()
+        if pipeline is not None and node.parent is not None:
+            spec = pipeline.checks.get(node.parent._id)
+            # any workspace mutation since the parent replaces the container
+            if spec is not None and spec.ctr is node.data.workspace.ctr:
+                await spec.done.wait()
+                if not spec.failed:
+                    logger.info(f"Using speculative check result for node {node._id}")
+                    return spec.result
+        return await self.run_checks(node, user_prompt)
+
     def has_modifications(self, node: Node[BaseData]) -> bool:
         """Check if the node or any of its ancestors have file modifications."""
         cur_node = node
@@ -0,0 +1,78 @@
+import hashlib
+import ujson as json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+BLOB_REF = "$blob"
+# values serializing shorter than this are kept inline, a reference wouldn't be smaller
+MIN_BLOB_SIZE = 128
+
+
+class BlobTable:
+    """Content-addressed store for values repeated across a checkpoint.
+
+    File contents and message blocks recur across siblings and ancestors in a
+    search tree; the table keeps each distinct value once and nodes reference it
+    by digest.
+    """
+
+    def __init__(self, blobs: dict[str, Any] | None = None):
+        self.blobs: dict[str, Any] = blobs if blobs is not None else {}
+
+    def put(self, value: Any) -> Any:
+        serialized = json.dumps(value, sort_keys=True)
+        if len(serialized) < MIN_BLOB_SIZE:
+            return value
+        key = hashlib.sha256(serialized.encode()).hexdigest()[:32]
+        self.blobs.setdefault(key, value)
+        return {BLOB_REF: key}
+
+    def get(self, value: Any) -> Any:
+        if not is_ref(value):
+            return value
+        try:
+            return self.blobs[value[BLOB_REF]]
+        except KeyError:
+            raise ValueError(f"Checkpoint references missing blob {value[BLOB_REF]}")
+
+
+_blob_table: ContextVar[BlobTable | None] = ContextVar("checkpoint_blob_table", default=None)
+
+
+@contextmanager
+def use_blobs(table: BlobTable) -> Iterator[BlobTable]:
+    """Intern values into (on dump) or resolve them from (on load) the given table."""
+    token = _blob_table.set(table)
+    try:
+        yield table
+    finally:
+        _blob_table.reset(token)
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_REF in value
+
+
+def intern(value: Any) -> Any:
+    """Blob reference for value when dumping under use_blobs, value itself otherwise."""
+    if value is None or (table := _blob_table.get()) is None:
+        return value
+    return table.put(value)
+
+
+def resolve(value: Any) -> Any:
+    """Inverse of intern; inline values from older checkpoints pass through."""
+    if not is_ref(value):
+        return value
+    if (table := _blob_table.get()) is None:
+        raise ValueError("Blob reference outside of use_blobs")
+    return table.get(value)
+
+
+def intern_message(message: dict) -> dict:
+    return {**message, "content": [intern(block) for block in message["content"]]}
+
+
+def resolve_message(message: dict) -> dict:
+    return {**message, "content": [resolve(block) for block in message["content"]]}
@@ -0,0 +1,189 @@
+import os
+import time
+import anyio
+import dagger
+from dataclasses import dataclass, field
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ConnectFn = Callable[[], dagger.Connection]
+
+
+def default_connection() -> dagger.Connection:
+    return dagger.Connection(dagger.Config(log_output=open(os.devnull, "w")))
+
+
+@dataclass(eq=False)
+class _Slot:
+    index: int
+    client: dagger.Client | None = None
+    uses: int = 0
+    checked_at: float = 0.0
+    broken: bool = False
+    release: anyio.Event = field(default_factory=anyio.Event)
+
+
+class DaggerClientPool:
+    """Long-lived Dagger sessions that requests borrow one at a time.
+
+    Each session is owned by its own task, so connections are opened and closed
+    in the same task even when a borrower asks for a reconnect. A borrowed
+    session is exclusive to that request, and sessions are recycled after
+    max_uses borrows so per-session state doesn't build up. Objects built on
+    a pooled client can't leak between tenants because each borrower only sees
+    what it builds.
+
+    With size 0, or when no session frees up within max_wait, borrow falls back
+    to a dedicated connection as before.
+    """
+
+    def __init__(self, connect: ConnectFn = default_connection):
+        self.connect = connect
+        self.size = 0
+        self.max_wait = 0.0
+        self.max_uses = 0
+        self.health_interval = 0.0
+        self._idle_tx, self._idle_rx = anyio.create_memory_object_stream[_Slot](0)
+        self._running = False
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.borrows = 0
+        self.overflow = 0
+        self.reconnects = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._in_use = 0
+
+    @asynccontextmanager
+    async def run(
+        self,
+        size: int,
+        max_wait: float = 10.0,
+        max_uses: int = 50,
+        health_interval: float = 30.0,
+    ) -> AsyncIterator["DaggerClientPool"]:
+        self.size, self.max_wait, self.max_uses, self.health_interval = size, max_wait, max_uses, health_interval
+        self._idle_tx, self._idle_rx = anyio.create_memory_object_stream[_Slot](max(size, 1))
+        self._reset_stats()
+        async with anyio.create_task_group() as tg:
+            for i in range(size):
+                tg.start_soon(self._own_slot, _Slot(i))
+            self._running = True
+            try:
+                yield self
+            finally:
+                self._running = False
+                tg.cancel_scope.cancel()
+        self._idle_tx.close()
+
+    async def _own_slot(self, slot: _Slot):
+        backoff = 1.0
+        while True:
+            failed = False
+            try:
+                async with self.connect() as client:
+                    slot.client, slot.uses, slot.checked_at = client, 0, time.monotonic()
+                    slot.broken = False
+                    slot.release = anyio.Event()
+                    backoff = 1.0
+                    await self._idle_tx.send(slot)
+                    await slot.release.wait()
+            except anyio.get_cancelled_exc_class():
+                raise
+            except Exception:
+                failed = True
+                logger.exception(f"Dagger session {slot.index} failed, reconnecting in {backoff:.0f}s")
+                await anyio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                slot.client = None
+            # sessions recycled after max_uses are not reconnects
+            if failed or slot.broken:
+                self.reconnects += 1
+
+    async def _is_healthy(self, slot: _Slot) -> bool:
+        if time.monotonic() - slot.checked_at < self.health_interval:
+            return True
+        assert slot.client is not None
+        try:
+            with anyio.fail_after(10):
+                await slot.client.version()
+        except (dagger.TransportError, dagger.QueryError, TimeoutError):
+            logger.warning(f"Dagger session {slot.index} failed health check")
+            return False
+        slot.checked_at = time.monotonic()
+        return True
+
+    async def _take(self) -> _Slot | None:
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        while True:
+            slot = None
+            with anyio.move_on_after(max(deadline - time.monotonic(), 0)):
+                slot = await self._idle_rx.receive()
+            if slot is None:
+                return None
+            # outside the deadline so a cancelled check can't lose the slot
+            if await self._is_healthy(slot):
+                waited = time.monotonic() - start
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                return slot
+            slot.broken = True
+            slot.release.set()
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator[dagger.Client]:
+        """Exclusive use of a pooled client for the duration of the block.
+
+        A dagger.TransportError escaping the block, on its own or inside an
+        exception group from a task group, reconnects the session before anyone
+        else can borrow it.
+        """
+        self.borrows += 1
+        slot = await self._take() if self._running and self.size else None
+        if slot is None:
+            if self._running and self.size:
+                self.overflow += 1
+                logger.warning(f"Dagger pool exhausted after {self.max_wait}s, opening a dedicated session")
+            async with self.connect() as client:
+                yield client
+            return
+
+        assert slot.client is not None
+        self._in_use += 1
+        try:
+            yield slot.client
+        except dagger.TransportError:
+            slot.broken = True
+            raise
+        except BaseExceptionGroup as group:
+            # not except*, which would re-raise a bare TransportError as a group
+            slot.broken = group.subgroup(dagger.TransportError) is not None
+            raise
+        finally:
+            self._in_use -= 1
+            slot.uses += 1
+            if slot.broken or slot.uses >= self.max_uses or not self._running:
+                slot.release.set()
+            else:
+                self._idle_tx.send_nowait(slot)
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "idle": self._idle_rx.statistics().current_buffer_used,
+            "borrows": self.borrows,
+            "overflow": self.overflow,
+            "reconnects": self.reconnects,
+            "wait_seconds_total": round(self.wait_seconds, 3),
+            "wait_seconds_max": round(self.max_wait_seconds, 3),
+        }
+
+
+dagger_pool = DaggerClientPool()
@@ -1,4 +1,6 @@
 import os
+import posixpath
+import tarfile
 import tempfile
 import dagger
 from pathlib import Path
@@ -25,11 +27,45 @@ class ExecResult:
 
 
 async def write_files_bulk(ctr: dagger.Container, files: dict[str, str], client: dagger.Client) -> dagger.Container:
+    """Write files below the workdir as one uploaded directory layer.
+
+    Absolute paths and paths leaving the workdir are written in the container
+    with with_new_file, the same as single writes, never on the host.
+    """
+    layer: dict[str, str] = {}
+    for file_path, content in files.items():
+        normalized = posixpath.normpath(file_path)
+        if posixpath.isabs(normalized) or normalized == "." or normalized.split("/")[0] == "..":
+            ctr = ctr.with_new_file(file_path, content)
+        else:
+            layer[normalized] = content
+    if not layer:
+        return ctr
     with tempfile.TemporaryDirectory() as temp_dir:
-        for file_path, content in files.items():
-            file = Path(os.path.join(temp_dir, file_path))
+        for file_path, content in layer.items():
+            file = Path(temp_dir, *file_path.split("/"))
             file.parent.mkdir(parents=True, exist_ok=True)
             file.write_text(content)
-        directory = client.host().directory(temp_dir)
-        ctr = ctr.with_directory(".", directory)
-        return await ctr.sync()
+        # the upload is lazy, it has to happen before the temporary directory goes away
+        directory = await client.host().directory(temp_dir).sync()
+    return ctr.with_directory(".", directory)
+
+
+async def read_files_bulk(ctr: dagger.Container, paths: list[str]) -> dict[str, str | None]:
+    """Read regular files by absolute path with one exec and one export; None for missing ones."""
+    # tar refuses an empty file list, two zero blocks are an empty archive
+    script = (
+        'for p; do if [ -f "$p" ]; then printf "%s\\n" "$p"; fi; done > /tmp/read_files.list; '
+        "if [ -s /tmp/read_files.list ]; then tar -chf /tmp/read_files.tar -T /tmp/read_files.list; "
+        "else head -c 1024 /dev/zero > /tmp/read_files.tar; fi"
+    )
+    archive = ctr.with_exec(["sh", "-c", script, "sh", *paths]).file("/tmp/read_files.tar")
+    files: dict[str, str | None] = dict.fromkeys(paths)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local = os.path.join(temp_dir, "read_files.tar")
+        await archive.export(local)
+        with tarfile.open(local) as tar:
+            for member in tar:
+                if (member.isfile() or member.islnk()) and (f := tar.extractfile(member)) is not None:
+                    files["/" + member.name.lstrip("/")] = f.read().decode(errors="replace")
+    return files
@@ -0,0 +1,66 @@
+import re
+import posixpath
+from typing import Iterable
+
+TS_SUFFIXES = (".ts", ".tsx", ".js", ".jsx")
+
+_TS_IMPORT = re.compile(
+    r"""(?:^|[;\s])(?:import|export)\s[^'"`;]*?\bfrom\s*['"]([^'"]+)['"]"""
+    r"""|(?:^|[;\s])import\s*['"]([^'"]+)['"]"""
+    r"""|\bimport\s*\(\s*['"]([^'"]+)['"]\s*\)"""
+    r"""|\brequire\s*\(\s*['"]([^'"]+)['"]\s*\)""",
+    re.MULTILINE,
+)
+
+
+class ImportGraph:
+    """Static import graph over a set of TypeScript sources.
+
+    Only imports resolving to files in the set become edges; packages are ignored.
+    """
+
+    def __init__(self, files: dict[str, str], aliases: dict[str, str] | None = None):
+        self.paths = set(files)
+        self.aliases = aliases or {}
+        self.importers: dict[str, set[str]] = {path: set() for path in files}
+        for path, content in files.items():
+            if path.endswith(TS_SUFFIXES):
+                for dep in self._ts_imports(path, content):
+                    self.importers[dep].add(path)
+
+    def _resolve(self, base: str) -> str | None:
+        base = posixpath.normpath(base)
+        if base in self.paths:
+            return base
+        stem, ext = posixpath.splitext(base)
+        candidates = [base + suffix for suffix in TS_SUFFIXES]
+        candidates += [posixpath.join(base, "index" + suffix) for suffix in TS_SUFFIXES]
+        if ext in (".js", ".jsx"):  # ESM style specifiers pointing at TS sources
+            candidates += [stem + ".ts", stem + ".tsx"]
+        return next((c for c in candidates if c in self.paths), None)
+
+    def _ts_imports(self, path: str, content: str) -> set[str]:
+        deps = set()
+        for match in _TS_IMPORT.finditer(content):
+            spec = next(group for group in match.groups() if group)
+            if spec.startswith("."):
+                base = posixpath.join(posixpath.dirname(path), spec)
+            elif prefix := next((a for a in self.aliases if spec.startswith(a)), None):
+                base = self.aliases[prefix] + spec[len(prefix):]
+            else:
+                continue
+            if (resolved := self._resolve(base)) is not None:
+                deps.add(resolved)
+        return deps
+
+    def dependents(self, paths: Iterable[str]) -> set[str]:
+        """Transitive importers of the given paths, including the paths themselves."""
+        result: set[str] = set()
+        stack = [p for p in paths if p in self.paths]
+        while stack:
+            path = stack.pop()
+            if path in result:
+                continue
+            result.add(path)
+            stack.extend(self.importers.get(path, ()))
+        return result
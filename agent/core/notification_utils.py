@@ -1,8 +1,22 @@
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Callable, Awaitable
 
 logger = logging.getLogger(__name__)
 
+_muted: ContextVar[bool] = ContextVar("notifications_muted", default=False)
+
+
+@contextmanager
+def muted_notifications():
+    """Suppress notifications sent from the current task, e.g. for speculative work."""
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
 
 def maybe_pluralize(count: int, singular: str, plural: str) -> str:
     return singular if count == 1 else plural
@@ -21,7 +35,7 @@ async def notify_if_callback(
         message: The message to send to the callback
         error_context: Context description for error logging (default: "notification")
     """
-    if event_callback:
+    if event_callback and not _muted.get():
         try:
             await event_callback(message)
         except Exception as e:
@@ -41,7 +55,7 @@ async def notify_stage(
         stage: The stage name (e.g., "building handlers", "running tests")
         status: Stage status - "in_progress", "completed", "failed"
     """
-    if not event_callback:
+    if not event_callback or _muted.get():
         return
 
     # Create simple, consolidated messages without excessive emojis
@@ -1,5 +1,6 @@
 from typing import Any, Awaitable, Callable, NotRequired, Protocol, Self, TypedDict
 from log import get_logger
+from core.checkpoint import BlobTable, use_blobs
 from dataclasses import dataclass
 
 logger = get_logger(__name__)
@@ -37,6 +38,7 @@ class MachineCheckpoint(TypedDict):
     stack_path: list[str]
     context: object
     actors: list[ActorCheckpoint]
+    blobs: NotRequired[dict[str, object]] # content-addressed values referenced from actor data
 
 
 class InvokeCallback[T](TypedDict):
@@ -160,37 +162,40 @@ class StateMachine[T: Context, E_t: EventType]:
 
     async def dump(self) -> MachineCheckpoint:
         stack, actors = [(self.root, [])], []
-        while stack:
-            current, path = stack.pop()
-            if current.invoke:
-                actors.append({
-                    "path": path,
-                    "data": await current.invoke["src"].dump(),
-                })
-            if not current.states:
-                continue
-            for key, value in current.states.items():
-                stack.append((value, path + [key]))
+        with use_blobs(BlobTable()) as blobs:
+            while stack:
+                current, path = stack.pop()
+                if current.invoke:
+                    actors.append({
+                        "path": path,
+                        "data": await current.invoke["src"].dump(),
+                    })
+                if not current.states:
+                    continue
+                for key, value in current.states.items():
+                    stack.append((value, path + [key]))
         checkpoint: MachineCheckpoint = {
             "stack_path": self.stack_path,
             "context": self.context.dump(),
             "actors": actors,
+            "blobs": blobs.blobs,
         }
         return checkpoint
 
     @classmethod
     async def load(cls, root: State[T, E_t], data: MachineCheckpoint, context_type: type[T]) -> Self:
         stack = [(root, [])]
-        while stack:
-            current, path = stack.pop()
-            if current.invoke:
-                for actor in data["actors"]:
-                    if actor["path"] == path:
-                        await current.invoke["src"].load(actor["data"])
-            if not current.states:
-                continue
-            for key, value in current.states.items():
-                stack.append((value, path + [key]))
+        with use_blobs(BlobTable(data.get("blobs", {}))):
+            while stack:
+                current, path = stack.pop()
+                if current.invoke:
+                    for actor in data["actors"]:
+                        if actor["path"] == path:
+                            await current.invoke["src"].load(actor["data"])
+                if not current.states:
+                    continue
+                for key, value in current.states.items():
+                    stack.append((value, path + [key]))
         context = context_type.load(data["context"])
         machine = cls(root, context)
         for state_name in data["stack_path"]:
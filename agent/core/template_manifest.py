@@ -0,0 +1,144 @@
+"""
+Manifests of the template directories.
+
+A template is walked once, node_modules and dist excluded: path, size, mode
+and content hash of every file are kept together with the contents in an
+immutable view, and the directory is uploaded to the Dagger engine once, its
+ID is reused by later sessions. Diffs, workspaces and the workspace pool read
+templates from here instead of the filesystem.
+
+Templates edited while the server runs are picked up by `refresh`, which runs
+whenever a session takes a `snapshot` of a template and periodically in the
+workspace pool; it re-reads the files only if their stats changed.
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
+import anyio.to_thread
+import dagger
+
+from diff.git_diff import EXECUTABLE, REGULAR, Content, blob_id, is_binary
+from log import get_logger
+
+logger = get_logger(__name__)
+
+EXCLUDED_DIRS = ("node_modules", "dist", ".git")
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    path: str
+    size: int
+    mode: int
+    sha256: str
+
+    @property
+    def git_mode(self) -> int:
+        return EXECUTABLE if self.mode & 0o111 else REGULAR
+
+
+@dataclass(frozen=True)
+class TemplateManifest:
+    """Files of a template keyed by relative path; text files are str, binary or non-UTF-8 files bytes."""
+
+    root: str
+    entries: Mapping[str, ManifestEntry]
+    files: Mapping[str, Content]
+    # git modes and blob ids of the files, for diffs
+    modes: Mapping[str, int]
+    ids: Mapping[str, str]
+    digest: str
+    _signature: tuple = field(repr=False, compare=False)
+
+
+def _stat_signature(root: str) -> tuple:
+    entries = []
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDED_DIRS)
+        for name in sorted(files):
+            full = os.path.join(dirpath, name)
+            stat = os.stat(full)
+            entries.append((os.path.relpath(full, root), stat.st_size, stat.st_mtime_ns, stat.st_mode))
+    return tuple(entries)
+
+
+def _load(root: str, signature: tuple) -> TemplateManifest:
+    entries: dict[str, ManifestEntry] = {}
+    files: dict[str, Content] = {}
+    hasher = hashlib.sha256()
+    for rel_path, size, _, mode in signature:
+        with open(os.path.join(root, rel_path), "rb") as f:
+            data = f.read()
+        sha256 = hashlib.sha256(data).hexdigest()
+        # the digest keys workspace lineages, it only depends on paths, modes and contents
+        hasher.update(f"{rel_path}\0{mode:o}\0{sha256}\n".encode())
+        path = rel_path.replace(os.sep, "/")
+        entries[path] = ManifestEntry(path, size, mode, sha256)
+        try:
+            files[path] = data if is_binary(data) else data.decode()
+        except UnicodeDecodeError:
+            files[path] = data
+    logger.info(f"Loaded template manifest of {root} with {len(entries)} files")
+    return TemplateManifest(
+        root=root,
+        entries=MappingProxyType(entries),
+        files=MappingProxyType(files),
+        modes=MappingProxyType({p: e.git_mode for p, e in entries.items()}),
+        ids=MappingProxyType({p: blob_id(c) for p, c in files.items()}),
+        digest=hasher.hexdigest(),
+        _signature=signature,
+    )
+
+
+class TemplateManifests:
+    def __init__(self):
+        self._manifests: dict[str, TemplateManifest] = {}
+        # root -> (digest, ID of the uploaded directory)
+        self._directories: dict[str, tuple[str, dagger.DirectoryID]] = {}
+
+    def get(self, path: str) -> TemplateManifest:
+        """Manifest of the template at path, walked on first use."""
+        root = os.path.abspath(path)
+        if (manifest := self._manifests.get(root)) is None:
+            manifest = self._manifests[root] = _load(root, _stat_signature(root))
+        return manifest
+
+    def refresh(self, path: str) -> TemplateManifest:
+        """Manifest of the template at path, re-read if its files changed."""
+        root = os.path.abspath(path)
+        signature = _stat_signature(root)
+        manifest = self._manifests.get(root)
+        if manifest is None or manifest._signature != signature:
+            manifest = self._manifests[root] = _load(root, signature)
+        return manifest
+
+    async def snapshot(self, client: dagger.Client, path: str) -> tuple[TemplateManifest, dagger.Directory]:
+        """Current manifest of the template at path and a Dagger directory with the same files.
+
+        The stats are checked on every call, so edits are picked up even without the
+        workspace pool, and a directory is uploaded once per manifest digest. Seed read
+        caches from the returned manifest, `get` may already see a newer one.
+        """
+        while True:
+            manifest = await anyio.to_thread.run_sync(self.refresh, path)
+            cached = self._directories.get(manifest.root)
+            if cached is not None and cached[0] == manifest.digest:
+                try:
+                    return manifest, await client.load_directory_from_id(cached[1]).sync()
+                except (dagger.QueryError, dagger.TransportError):
+                    logger.info(f"Uploaded template {manifest.root} is gone, uploading again")
+            directory = client.host().directory(manifest.root, exclude=[f"**/{d}" for d in EXCLUDED_DIRS])
+            directory = await directory.sync()
+            # files edited since the refresh would be uploaded but not in the manifest
+            if await anyio.to_thread.run_sync(_stat_signature, manifest.root) == manifest._signature:
+                break
+            logger.info(f"Template {manifest.root} changed during the upload, uploading again")
+        self._directories[manifest.root] = (manifest.digest, dagger.DirectoryID(await directory.id()))
+        return manifest, directory
+
+
+template_manifests = TemplateManifests()
@@ -0,0 +1,156 @@
+import os
+import time
+import hashlib
+import functools
+import threading
+import anyio.to_thread
+import ujson as json
+from pathlib import Path
+from typing import Awaitable, Callable
+from log import get_logger
+
+logger = get_logger(__name__)
+
+CheckFn = Callable[..., Awaitable[str | None]]
+
+
+class ValidationCache:
+    """Disk-backed LRU cache of check results keyed on workspace content.
+
+    Entries are small JSON files named after the key; recency is tracked with the
+    file mtime, which is bumped on every hit.
+    """
+
+    def __init__(self, cache_dir: str | None, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._size: int | None = None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Validation cache enabled at {self.cache_dir}")
+
+    @property
+    def is_available(self) -> bool:
+        return self.cache_dir is not None
+
+    @staticmethod
+    def make_key(check: str, state_key: str, *args: object) -> str:
+        payload = json.dumps([check, state_key, *[str(a) for a in args]])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        assert self.cache_dir is not None
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> tuple[bool, str | None]:
+        """Return (found, result) for the given key."""
+        if self.cache_dir is None:
+            return False, None
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.saved_seconds += entry.get("duration", 0.0)
+        return True, entry["result"]
+
+    def put(self, key: str, check: str, result: str | None, duration: float = 0.0):
+        if self.cache_dir is None:
+            return
+        data = json.dumps({"check": check, "result": result, "duration": duration})
+        path = self._path(key)
+        # puts run in worker threads, the same key may be written by two at once
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._size = self._current_size() + len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            assert self.cache_dir is not None
+            self._size = sum(p.stat().st_size for p in self.cache_dir.glob("*.json"))
+        return self._size
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its budget."""
+        assert self.cache_dir is not None
+        entries = []
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                stat = p.stat()
+            except FileNotFoundError:
+                continue  # evicted concurrently
+            entries.append((stat.st_mtime, stat.st_size, p))
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, entry_size, p in entries:
+            if size <= target:
+                break
+            p.unlink(missing_ok=True)
+            size -= entry_size
+            evicted += 1
+        self._size = size
+        logger.info(f"Validation cache evicted {evicted} entries, size now {size} bytes")
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_seconds": round(self.saved_seconds, 1),
+        }
+
+
+def cached_check(name: str) -> Callable[[CheckFn], CheckFn]:
+    """Serve a deterministic check from the validation cache.
+
+    The wrapped method must take the node as its first argument; remaining arguments
+    become part of the key. Workspaces whose state can't be tracked bypass the cache.
+    Only passing results are stored: a failure may come from a flaky exec or the
+    network, and a retry has to run the check again.
+    """
+
+    def decorator(fn: CheckFn) -> CheckFn:
+        @functools.wraps(fn)
+        async def wrapper(self, node, *args, **kwargs) -> str | None:
+            state_key = node.data.workspace.state_key
+            validation_cache = get_validation_cache()
+            if not validation_cache.is_available or state_key is None:
+                return await fn(self, node, *args, **kwargs)
+            check = f"{type(self).__name__}.{name}"
+            key = validation_cache.make_key(check, state_key, *args, *sorted(kwargs.items()))
+            found, result = await anyio.to_thread.run_sync(validation_cache.get, key)
+            if found:
+                logger.info(f"Validation cache hit for {check} ({validation_cache.stats()})")
+                return result
+            start = time.monotonic()
+            result = await fn(self, node, *args, **kwargs)
+            if result is None:
+                await anyio.to_thread.run_sync(
+                    validation_cache.put, key, check, result, time.monotonic() - start
+                )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@functools.cache
+def get_validation_cache() -> ValidationCache:
+    # resolved lazily so settings from .env loaded at server startup apply
+    return ValidationCache(
+        os.getenv("VALIDATION_CACHE_DIR"),
+        max_bytes=int(os.getenv("VALIDATION_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    )
@@ -1,11 +1,13 @@
 from os import name
-from typing import Self
+import posixpath
+from types import MappingProxyType
+from typing import Mapping, Self
 import dagger
 from dagger import function, object_type, Container, Directory, ReturnType
 from log import get_logger
 import hashlib
 from core.postgres_utils import create_postgres_service
-from core.dagger_utils import ExecResult
+from core.dagger_utils import ExecResult, read_files_bulk, write_files_bulk
 import uuid
 import logging
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type, before_sleep_log
@@ -23,6 +25,14 @@ def _sorted_set(s: set[str]) -> list[str]:
     return sorted(list(s))
 
 
+# package managers run by setup commands may rewrite these, seeded contents would be stale
+SETUP_WRITTEN_FILES = frozenset({"package-lock.json", "bun.lock", "uv.lock", "composer.lock"})
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
 @object_type
 class Workspace:
     ctr: Container
@@ -34,7 +44,55 @@ class Workspace:
         # dagger.Client can't be serialized by cattrs in newer versions
         # so we store it as a private attribute outside the dataclass
         self._client: dagger.Client | None = None
-    
+        # content-addressed view of the container state, used to key validation results:
+        # the lineage digests the base and every opaque mutation (exec, env, workdir),
+        # the overlay holds file writes since then. None lineage means untracked.
+        self._lineage: str | None = None
+        self._overlay: dict[str, str | None] = {}
+        # contents of files known without asking the engine, keyed by absolute path:
+        # written through the workspace, read before, or seeded from the template
+        # manifest; None marks removed files. Clones share the dict until either changes it.
+        self._workdir = "/app"
+        self._files: dict[str, str | None] = {}
+        self._files_shared = False
+        self._start_files: Mapping[str, str] = MappingProxyType({})
+        self._start_paths: frozenset[str] = frozenset()
+        self._start_dir: str | None = None  # where start was seeded for, None if it wasn't
+
+    @property
+    def state_key(self) -> str | None:
+        """Digest of everything applied to the container, or None if it can't be tracked."""
+        if self._lineage is None:
+            return None
+        return _digest(self._lineage, *(f"{p}:{h}" for p, h in sorted(self._overlay.items())))
+
+    def _fold(self, *parts: str):
+        if self._lineage is not None:
+            self._lineage = _digest(self.state_key or "", *parts)
+        self._overlay = {}
+
+    def _file_key(self, path: str) -> str:
+        return posixpath.normpath(posixpath.join(self._workdir, path))
+
+    def _own_files(self) -> dict[str, str | None]:
+        if self._files_shared:
+            self._files = dict(self._files)
+            self._files_shared = False
+        return self._files
+
+    def seed_files(self, files: Mapping[str, str | bytes]) -> Self:
+        """Cache the contents of files of the start directory, e.g. from the template manifest."""
+        self._start_dir = self._workdir
+        self._start_paths = frozenset(self._file_key(p) for p in files)
+        self._start_files = MappingProxyType({
+            self._file_key(p): c
+            for p, c in files.items()
+            if isinstance(c, str) and posixpath.basename(p) not in SETUP_WRITTEN_FILES
+        })
+        self._files = dict(self._start_files)
+        self._files_shared = False
+        return self
+
     @property
     def client(self) -> dagger.Client:
         if self._client is None:
@@ -50,22 +108,44 @@ class Workspace:
         setup_cmd: list[list[str]] = [],
         protected: list[str] = [],
         allowed: list[str] = [],
+        context_key: str | None = None,
+        base: Container | None = None,
+        context_files: Mapping[str, str | bytes] | None = None,
     ) -> Self:
+        """Create a workspace; pass context_key (e.g. a template digest) to make its state trackable.
+
+        base is a prebuilt result of base_container for the same arguments, e.g. from the workspace pool.
+        context_files are the contents of context, reads of them are then served without the engine.
+        """
         my_context = context or client.directory()
+        ctr = base or cls.base_container(client, base_image, my_context, setup_cmd)
+        ctr = ctr.with_env_variable("INSTANCE_ID", uuid.uuid4().hex)
+        workspace = cls(ctr=ctr, start=my_context, protected=set(protected), allowed=set(allowed))
+        workspace._client = client
+        if context is None or context_key is not None:
+            # INSTANCE_ID is left out on purpose, it only busts the engine cache
+            workspace._lineage = _digest(base_image, context_key or "", repr(setup_cmd))
+        if context_files is not None:
+            workspace.seed_files(context_files)
+        return workspace
+
+    @staticmethod
+    def base_container(
+        client: dagger.Client,
+        base_image: str,
+        context: Directory,
+        setup_cmd: list[list[str]] = [],
+    ) -> Container:
         ctr = (
             client
             .container()
             .from_(base_image)
             .with_workdir("/app")
-            .with_directory("/app", my_context)
+            .with_directory("/app", context)
         )
         for cmd in setup_cmd:
             ctr = ctr.with_exec(cmd)
-
-        ctr = ctr.with_env_variable("INSTANCE_ID", uuid.uuid4().hex)
-        workspace = cls(ctr=ctr, start=my_context, protected=set(protected), allowed=set(allowed))
-        workspace._client = client
-        return workspace
+        return ctr
 
     @function
     def permissions(self, protected: list[str] = [], allowed: list[str] = []) -> Self:
@@ -76,16 +156,23 @@ class Workspace:
     @function
     def cwd(self, path: str) -> Self:
         self.ctr = self.ctr.with_workdir(path)
+        self._workdir = self._file_key(path)
+        self._fold("cwd", path)
         return self
 
-    @function
-    def rm(self, path: str) -> Self:
+    def _check_permissions(self, path: str, action: str):
         protected = self.protected - self.allowed # allowed take precedence
         if self.allowed and not any(path.startswith(p) for p in self.allowed):
-            raise PermissionError(f"Attempted to remove {path} which is not in allowed paths: {_sorted_set(self.allowed)}")
+            raise PermissionError(f"Attempted to {action} {path} which is not in allowed paths: {_sorted_set(self.allowed)}")
         if any(path.startswith(p) for p in protected):
-            raise PermissionError(f"Attempted to remove {path} which is in protected paths: {_sorted_set(protected)}")
+            raise PermissionError(f"Attempted to {action} {path} which is in protected paths: {_sorted_set(protected)}")
+
+    @function
+    def rm(self, path: str) -> Self:
+        self._check_permissions(path, "remove")
         self.ctr = self.ctr.without_file(path)
+        self._overlay[path] = None
+        self._own_files()[self._file_key(path)] = None
         return self
 
     @function
@@ -99,30 +186,93 @@ class Workspace:
     @function
     @retry_transport_errors
     async def read_file(self, path: str) -> str:
+        key = self._file_key(path)
+        if key in self._files:
+            if (contents := self._files[key]) is None:
+                raise FileNotFoundError(f"File not found: {path}")
+            return contents
         try:
-            return await self.ctr.file(path).contents()
+            contents = await self.ctr.file(path).contents()
         except dagger.QueryError:
             raise FileNotFoundError(f"File not found: {path}")
+        # no copy needed: while the dict is shared, none of the clones holding it changed files
+        self._files[key] = contents
+        return contents
+
+    @retry_transport_errors
+    async def read_files(self, paths: list[str]) -> dict[str, str | None]:
+        """Read many files at once, None for missing ones; files not cached are fetched in one exec."""
+        keys = {path: self._file_key(path) for path in paths}
+        missing = sorted({key for key in keys.values() if key not in self._files})
+        if len(missing) == 1:
+            try:
+                fetched = {missing[0]: await self.ctr.file(missing[0]).contents()}
+            except dagger.QueryError:
+                fetched = {missing[0]: None}
+        elif missing:
+            fetched = await read_files_bulk(self.ctr, missing)
+        else:
+            fetched = {}
+        # no copy needed, see read_file
+        self._files.update(fetched)
+        return {path: self._files[key] for path, key in keys.items()}
 
     @function
     def write_file(self, path: str, contents: str, force: bool = False) -> Self:
         if not force:
-            protected = self.protected - self.allowed # allowed take precedence
-            if self.allowed and not any(path.startswith(p) for p in self.allowed):
-                raise PermissionError(f"Attempted to write {path} which is not in allowed paths: {_sorted_set(self.allowed)}")
-            if any(path.startswith(p) for p in protected):
-                raise PermissionError(f"Attempted to write {path} which is in protected paths: {_sorted_set(protected)}")
+            self._check_permissions(path, "write")
         self.ctr = self.ctr.with_new_file(path, contents)
+        self._overlay[path] = hashlib.sha256(contents.encode()).hexdigest()
+        self._own_files()[self._file_key(path)] = contents
         return self
 
+    @retry_transport_errors
+    async def write_files(self, files: dict[str, str], force: bool = False) -> Self:
+        """Write many files as one directory layer instead of a with_new_file chain.
+
+        Same permission checks as write_file; nothing is written if any path is rejected.
+        """
+        if not force:
+            for path in files:
+                self._check_permissions(path, "write")
+        if not files:
+            return self
+        self.ctr = await write_files_bulk(self.ctr, files, self.client)
+        cached = self._own_files()
+        for path, contents in files.items():
+            self._overlay[path] = hashlib.sha256(contents.encode()).hexdigest()
+            cached[self._file_key(path)] = contents
+        return self
+
+    async def apply_files(self, files: dict[str, str | None]) -> Self:
+        """Apply writes and removals (None) as one directory layer instead of a chain of file ops."""
+        for path, contents in files.items():
+            self._check_permissions(path, "write" if contents is not None else "remove")
+        for path in (p for p, c in files.items() if c is None):
+            self.ctr = self.ctr.without_file(path)
+            self._overlay[path] = None
+            self._own_files()[self._file_key(path)] = None
+        return await self.write_files({p: c for p, c in files.items() if c is not None}, force=True)
+
     @function
     @retry_transport_errors
     async def read_file_lines(self, path: str, start: int = 1, end: int = 100) -> str:
-        return (
-            await self.ctr
-            .with_exec(["sed", "-n", f"{start},{end}p", path])
-            .stdout()
-        )
+        key = self._file_key(path)
+        if key in self._files and self._files[key] is None:
+            raise FileNotFoundError(f"File not found: {path}")
+        if start >= 1 and isinstance(contents := self._files.get(key), str):
+            # same as sed -n, only \n ends a line
+            lines = [line + "\n" for line in contents.split("\n")]
+            lines[-1] = lines[-1][:-1]
+            return "".join(lines[start - 1 : end])
+        try:
+            return (
+                await self.ctr
+                .with_exec(["sed", "-n", f"{start},{end}p", path])
+                .stdout()
+            )
+        except dagger.QueryError:
+            raise FileNotFoundError(f"File not found: {path}")
 
     @function
     @retry_transport_errors
@@ -184,11 +334,22 @@ class Workspace:
     @retry_transport_errors
     async def exec_mut(self, command: list[str]) -> ExecResult:
         self.ctr = self.ctr.with_exec(command, expect=ReturnType.ANY)
+        self._fold("exec", repr(command))
+        # the command may have changed any file
+        self._files, self._files_shared = {}, False
         return await ExecResult.from_ctr(self.ctr)
 
     @function
     def reset(self) -> Self:
         self.ctr = self.ctr.with_directory(".", self.start)
+        self._fold("reset")
+        # files of start are restored, others are kept by with_directory
+        if self._start_dir != self._workdir:
+            self._files = {}
+        else:
+            self._files = {k: v for k, v in self._files.items() if k not in self._start_paths}
+            self._files.update(self._start_files)
+        self._files_shared = False
         return self
 
     @function
@@ -204,6 +365,14 @@ class Workspace:
             allowed=self.allowed
         )
         cloned._client = self._client
+        cloned._lineage = self._lineage
+        cloned._overlay = dict(self._overlay)
+        cloned._workdir = self._workdir
+        cloned._files = self._files
+        cloned._files_shared = self._files_shared = True
+        cloned._start_files = self._start_files
+        cloned._start_paths = self._start_paths
+        cloned._start_dir = self._start_dir
         return cloned
 
     @function
@@ -241,4 +410,5 @@ class Workspace:
     @function
     def add_env_variable(self, name: str, value: str) -> Self:
         self.ctr = self.ctr.with_env_variable(name, value)
+        self._fold("env", name, value)
         return self
@@ -0,0 +1,136 @@
+import anyio
+import anyio.to_thread
+import dagger
+from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from typing import Callable
+from core.template_manifest import template_manifests
+from log import get_logger
+
+logger = get_logger(__name__)
+
+BuildFn = Callable[[dagger.Client, dagger.Directory], dagger.Container]
+
+
+@dataclass
+class _Template:
+    template_dir: str
+    build: BuildFn
+
+
+@dataclass
+class _WarmBase:
+    digest: str
+    ctr_id: dagger.ContainerID
+
+
+class WorkspacePool:
+    """Pre-built base containers per template, shared across request sessions.
+
+    A long-lived client builds and syncs each template's base container (everything
+    before per-workspace state such as INSTANCE_ID) and keeps its container ID.
+    Requests load that ID in their own session, so setup commands are cache hits
+    and the first LLM call is not stuck behind apk/uv/bun installs.
+
+    One warm build per template is enough: the ID is immutable and identical
+    definitions collapse to the same engine cache entry, so any number of
+    concurrent requests can share it.
+    """
+
+    def __init__(self):
+        self._templates: dict[str, _Template] = {}
+        self._warm: dict[str, _WarmBase] = {}
+        self._building: set[str] = set()
+        self._client: dagger.Client | None = None
+        self._tg = None
+
+    def register(self, name: str, template_dir: str, build: BuildFn):
+        self._templates[name] = _Template(template_dir, build)
+
+    @property
+    def template_dirs(self) -> list[str]:
+        return [t.template_dir for t in self._templates.values()]
+
+    @property
+    def is_running(self) -> bool:
+        return self._client is not None
+
+    @asynccontextmanager
+    async def run(self, client: dagger.Client, names: list[str], refresh_interval: float = 60.0):
+        """Warm the given templates and keep them fresh until the context exits."""
+        if unknown := set(names) - set(self._templates):
+            logger.warning(f"Unknown templates for workspace pool: {sorted(unknown)}")
+        names = [n for n in names if n in self._templates]
+        async with anyio.create_task_group() as tg:
+            self._client, self._tg = client, tg
+            for name in names:
+                self._schedule(name)
+            tg.start_soon(self._watch, names, refresh_interval)
+            try:
+                yield self
+            finally:
+                self._client, self._tg = None, None
+                self._warm.clear()
+                tg.cancel_scope.cancel()
+
+    async def _watch(self, names: list[str], refresh_interval: float):
+        while True:
+            await anyio.sleep(refresh_interval)
+            for name in names:
+                # walks the template and re-reads edited files, keep it off the event loop
+                manifest = await anyio.to_thread.run_sync(
+                    template_manifests.refresh, self._templates[name].template_dir
+                )
+                warm = self._warm.get(name)
+                if warm is None or warm.digest != manifest.digest:
+                    self._schedule(name)
+
+    def _digest(self, name: str) -> str:
+        return template_manifests.get(self._templates[name].template_dir).digest
+
+    def _schedule(self, name: str):
+        if self._tg is not None and name not in self._building:
+            self._building.add(name)
+            self._tg.start_soon(self._build, name)
+
+    async def _build(self, name: str):
+        assert self._client is not None
+        template = self._templates[name]
+        try:
+            manifest, context = await template_manifests.snapshot(self._client, template.template_dir)
+            logger.info(f"Warming workspace base for {name} ({manifest.digest[:12]})")
+            ctr = template.build(self._client, context)
+            ctr = await ctr.sync()
+            self._warm[name] = _WarmBase(manifest.digest, dagger.ContainerID(await ctr.id()))
+            logger.info(f"Workspace base for {name} is warm")
+        except (dagger.QueryError, dagger.TransportError):
+            logger.exception(f"Failed to warm workspace base for {name}")
+        finally:
+            self._building.discard(name)
+
+    async def acquire(self, client: dagger.Client, name: str) -> dagger.Container | None:
+        """Warm base container for the template loaded into the caller's session, or None.
+
+        None means the caller should build cold: the pool is not running, the template
+        is still building, or its manifest changed since it was warmed (a rebuild is
+        scheduled in that case). Manifests are refreshed by the pool every refresh_interval
+        and by every session taking a template snapshot.
+        """
+        if not self.is_running or name not in self._templates:
+            return None
+        warm = self._warm.get(name)
+        if warm is None:
+            return None
+        if warm.digest != self._digest(name):
+            logger.info(f"Template {name} changed, rebuilding warm base")
+            del self._warm[name]
+            self._schedule(name)
+            return None
+        try:
+            return await client.load_container_from_id(warm.ctr_id).sync()
+        except (dagger.QueryError, dagger.TransportError):
+            logger.exception(f"Failed to load warm workspace base for {name}, building cold")
+            return None
+
+
+workspace_pool = WorkspacePool()
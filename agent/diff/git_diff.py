@@ -0,0 +1,413 @@
+"""In-process equivalent of `git add . && git diff HEAD` over file dicts.
+
+get_diff_with used to build a git container for every diff: commit the
+snapshot, overlay the template directory and the generated files, stage and
+diff. diff.template_files.diff_with_template computes the same unified diff
+from the three layers in memory, with git's blob ids, mode headers, new/deleted file headers, binary
+file markers, .gitignore handling and hunk headers with function context.
+
+Hunks are computed with difflib rather than git's Myers implementation, and
+git's indent heuristic is not applied, so ambiguous changes may be placed a
+few lines apart from git's output, but the patch applies the same.
+"""
+
+import difflib
+import hashlib
+import posixpath
+import re
+from typing import Iterable, Mapping
+
+REGULAR = 0o100644
+EXECUTABLE = 0o100755
+NULL_ID = "0000000"
+CONTEXT_LINES = 3
+# git looks for NUL bytes in the first 8000 bytes to detect binary files
+BINARY_PROBE = 8000
+
+Content = str | bytes
+
+
+def _as_bytes(content: Content) -> bytes:
+    return content if isinstance(content, bytes) else content.encode()
+
+
+def blob_id(content: Content) -> str:
+    """git hash-object of the content."""
+    data = _as_bytes(content)
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def is_binary(content: Content) -> bool:
+    if isinstance(content, bytes):
+        return b"\0" in content[:BINARY_PROBE]
+    return "\0" in content[:BINARY_PROBE]
+
+
+# --- .gitignore ---------------------------------------------------------------
+
+
+def _glob_regex(glob: str) -> str:
+    out = []
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and (end := glob.find("]", i + 2)) != -1:
+            body = glob[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end
+        elif c == "\\" and i + 1 < len(glob):
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class GitIgnore:
+    """Patterns of the .gitignore files in a tree, matched the way `git add` does."""
+
+    def __init__(self, files: Mapping[str, Content]):
+        # base directory -> [(regex, negated, directory only, matches basename only)]
+        self.rules: dict[str, list[tuple[re.Pattern, bool, bool, bool]]] = {}
+        for path, content in files.items():
+            if posixpath.basename(path) != ".gitignore":
+                continue
+            text = content.decode(errors="replace") if isinstance(content, bytes) else content
+            rules = [rule for line in text.splitlines() if (rule := self._parse(line))]
+            if rules:
+                self.rules[posixpath.dirname(path)] = rules
+
+    @staticmethod
+    def _parse(line: str) -> tuple[re.Pattern, bool, bool, bool] | None:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        basename_only = "/" not in line
+        pattern = re.compile(_glob_regex(line.lstrip("/")) + r"\Z")
+        return pattern, negated, dir_only, basename_only
+
+    def _matches(self, path: str, is_dir: bool) -> bool | None:
+        """Whether the last matching pattern ignores path, None if none matches."""
+        result = None
+        parent = posixpath.dirname(path)
+        name = posixpath.basename(path)
+        # deeper .gitignore files take precedence
+        for base in sorted(self.rules, key=lambda b: b.count("/") + bool(b)):
+            if base and not (parent == base or parent.startswith(base + "/")):
+                continue
+            relative = path[len(base) + 1 :] if base else path
+            for pattern, negated, dir_only, basename_only in self.rules[base]:
+                if dir_only and not is_dir:
+                    continue
+                if pattern.match(name if basename_only else relative):
+                    result = not negated
+        return result
+
+    def ignored(self, path: str) -> bool:
+        if not self.rules:
+            return False
+        parts = path.split("/")
+        for depth in range(1, len(parts)):
+            # files in an ignored directory can't be re-included
+            if self._matches("/".join(parts[:depth]), is_dir=True):
+                return True
+        return bool(self._matches(path, is_dir=False))
+
+
+def tracked(files: Mapping[str, Content], already_tracked: Iterable[str] = ()) -> dict[str, Content]:
+    """Files `git add .` stages: not ignored, or tracked already."""
+    ignore = GitIgnore(files)
+    keep = set(already_tracked)
+    return {path: content for path, content in files.items() if path in keep or not ignore.ignored(path)}
+
+
+# --- unified diff ---------------------------------------------------------------
+
+
+def _lines(content: str) -> list[str]:
+    # only \n ends a line for git, unlike str.splitlines
+    lines = [line + "\n" for line in content.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def _range(start: int, length: int) -> str:
+    # same as git and difflib: a single line omits the length, an empty range points before it
+    if length == 1:
+        return f"{start + 1}"
+    if length == 0:
+        return f"{start},0"
+    return f"{start + 1},{length}"
+
+
+def _function_context(lines: list[str], before: int) -> str:
+    """git's default hunk header context: the last line before the hunk starting with a letter, _ or $."""
+    for line in reversed(lines[:before]):
+        if line[:1].isalpha() or line[:1] in ("_", "$"):
+            return " " + line.rstrip()[:80].rstrip()
+    return ""
+
+
+def _emit(out: list[str], prefix: str, line: str):
+    if line.endswith("\n"):
+        out.append(prefix + line)
+    else:
+        out.append(prefix + line + "\n")
+        out.append("\\ No newline at end of file\n")
+
+
+def _opcodes(a: list[str], b: list[str]) -> list[tuple[str, int, int, int, int]]:
+    """difflib opcodes, with pure insertions and deletions moved down past equal lines as git does."""
+    codes: list[list] = [["equal", 0, 0, 0, 0]]
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        tag = "equal" if tag == "equal" else "change"
+        if codes[-1][0] == tag:
+            codes[-1][2], codes[-1][4] = i2, j2
+        else:
+            codes.append([tag, i1, i2, j1, j2])
+    for before, change, after in zip(codes, codes[1:], codes[2:]):
+        if change[0] != "change" or (change[1] != change[2] and change[3] != change[4]):
+            continue
+        lines, start, end = (a, change[1], change[2]) if change[3] == change[4] else (b, change[3], change[4])
+        while after[1] < after[2] and lines[start] == lines[end]:
+            before[2], before[4] = before[2] + 1, before[4] + 1
+            change[1:] = [change[1] + 1, change[2] + 1, change[3] + 1, change[4] + 1]
+            after[1], after[3] = after[1] + 1, after[3] + 1
+            start, end = start + 1, end + 1
+    return [tuple(code) for code in codes if code[0] == "change" or code[1] < code[2]]
+
+
+def _grouped(codes: list[tuple[str, int, int, int, int]]) -> list[list[tuple[str, int, int, int, int]]]:
+    """Changes with CONTEXT_LINES of equal lines around them, nearby changes share a hunk."""
+    n = CONTEXT_LINES
+    groups: list[list[tuple[str, int, int, int, int]]] = []
+    group: list[tuple[str, int, int, int, int]] = []
+    for k, (tag, i1, i2, j1, j2) in enumerate(codes):
+        if tag == "change":
+            group.append((tag, i1, i2, j1, j2))
+            continue
+        last = k == len(codes) - 1
+        if not group:
+            if not last:  # leading context of the next hunk
+                group.append((tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2))
+            continue
+        if last or i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            if not last:
+                group.append((tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2))
+        else:
+            group.append((tag, i1, i2, j1, j2))
+    if group and any(code[0] == "change" for code in group):
+        groups.append(group)
+    return groups
+
+
+def _hunks(old: str, new: str) -> list[str]:
+    a, b = _lines(old), _lines(new)
+    out: list[str] = []
+    for group in _grouped(_opcodes(a, b)):
+        first, last = group[0], group[-1]
+        old_range = _range(first[1], last[2] - first[1])
+        new_range = _range(first[3], last[4] - first[3])
+        out.append(f"@@ -{old_range} +{new_range} @@{_function_context(a, first[1])}\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    _emit(out, " ", line)
+                continue
+            for line in a[i1:i2]:
+                _emit(out, "-", line)
+            for line in b[j1:j2]:
+                _emit(out, "+", line)
+    return out
+
+
+def file_diff(
+    path: str,
+    old: Content | None,
+    new: Content | None,
+    old_mode: int = REGULAR,
+    new_mode: int = REGULAR,
+    new_id: str | None = None,
+) -> str:
+    """git diff output for one file, old or new is None when it is created or deleted.
+
+    new_id is the blob id of new, if it is known already.
+    """
+    out = [f"diff --git a/{path} b/{path}\n"]
+    old_id = blob_id(old)[:7] if old is not None else NULL_ID
+    new_id = (new_id or blob_id(new))[:7] if new is not None else NULL_ID
+    if old is None:
+        out.append(f"new file mode {new_mode:o}\n")
+        out.append(f"index {old_id}..{new_id}\n")
+    elif new is None:
+        out.append(f"deleted file mode {old_mode:o}\n")
+        out.append(f"index {old_id}..{new_id}\n")
+    else:
+        if old_mode != new_mode:
+            out.append(f"old mode {old_mode:o}\n")
+            out.append(f"new mode {new_mode:o}\n")
+        if old_id == new_id:
+            return "".join(out)  # mode change only
+        out.append(f"index {old_id}..{new_id}" + (f" {new_mode:o}\n" if old_mode == new_mode else "\n"))
+
+    old_name = f"a/{path}" if old is not None else "/dev/null"
+    new_name = f"b/{path}" if new is not None else "/dev/null"
+    if (old is not None and is_binary(old)) or (new is not None and is_binary(new)):
+        out.append(f"Binary files {old_name} and {new_name} differ\n")
+        return "".join(out)
+    old_text, new_text = _text(old), _text(new)
+    if not old_text and not new_text:
+        return "".join(out)  # empty file created or deleted
+    out.append(f"--- {old_name}\n")
+    out.append(f"+++ {new_name}\n")
+    out.extend(_hunks(old_text, new_text))
+    return "".join(out)
+
+
+def _text(content: Content | None) -> str:
+    if content is None:
+        return ""
+    return content.decode(errors="replace") if isinstance(content, bytes) else content
+
+
+def unified_diff(
+    old: Mapping[str, Content],
+    new: Mapping[str, Content],
+    old_modes: Mapping[str, int] | None = None,
+    new_modes: Mapping[str, int] | None = None,
+    new_ids: Mapping[str, str] | None = None,
+) -> str:
+    """`git diff` from the tree of old to the tree of new, files absent from modes are regular.
+
+    new_ids holds blob ids already known for files of new.
+    """
+    old_modes = old_modes or {}
+    new_modes = new_modes or {}
+    new_ids = new_ids or {}
+    out = []
+    for path in sorted(old.keys() | new.keys(), key=lambda p: p.encode()):
+        old_content, new_content = old.get(path), new.get(path)
+        old_mode, new_mode = old_modes.get(path, REGULAR), new_modes.get(path, REGULAR)
+        if old_mode == new_mode and _same_content(old_content, new_content):
+            continue
+        out.append(file_diff(path, old_content, new_content, old_mode, new_mode, new_ids.get(path)))
+    return "".join(out)
+
+
+def _same_content(a: Content | None, b: Content | None) -> bool:
+    if a is None or b is None:
+        return a is b
+    if type(a) is type(b):
+        return a == b
+    return _as_bytes(a) == _as_bytes(b)
+
+
+# --- incremental diffs ------------------------------------------------------------
+
+_HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+_SECTION = re.compile(r"^(?=diff --git )", re.MULTILINE)
+
+
+def split_diff(diff: str) -> dict[str, str]:
+    """Sections of a git diff by the path of their file."""
+    sections = {}
+    for section in _SECTION.split(diff):
+        if not section:
+            continue
+        # "diff --git a/<path> b/<path>", both paths are the same without rename detection
+        header = section[len("diff --git a/") : section.index("\n")]
+        sections[header[: (len(header) - 3) // 2]] = section
+    return sections
+
+
+def _is_binary_section(section: str | None) -> bool:
+    return section is not None and "\nBinary files " in section
+
+
+def apply_file_diff(old: str | None, section: str) -> tuple[str | None, int]:
+    """Content and mode of a file after applying its section of a git diff, None if it is deleted."""
+    mode = REGULAR
+    out: list[str] = []
+    old_lines = _lines(old or "")
+    pos = 0
+    previous = ""
+    in_hunks = False
+    for line in _lines(section):
+        if hunk := _HUNK_HEADER.match(line):
+            in_hunks = True
+            start = int(hunk[1]) - (hunk[2] != "0")
+            out.extend(old_lines[pos:start])
+            pos = start
+        elif not in_hunks:
+            if line.startswith("deleted file mode "):
+                return None, int(line.split()[-1], 8)
+            if line.startswith(("new file mode ", "new mode ")):
+                mode = int(line.split()[-1], 8)
+            elif line.startswith("index ") and len(parts := line.split()) == 3:
+                mode = int(parts[2], 8)
+        elif line[:1] in (" ", "+"):
+            pos += line[:1] == " "
+            out.append(line[1:])
+        elif line[:1] == "-":
+            pos += 1
+        elif line[:1] == "\\" and previous[:1] in (" ", "+"):
+            out[-1] = out[-1].removesuffix("\n")
+        previous = line
+    out.extend(old_lines[pos:])
+    return "".join(out), mode
+
+
+def diff_between(base: Mapping[str, Content], previous: str, current: str) -> str:
+    """Diff from the tree previous leads to, to the tree current leads to, both being diffs of base.
+
+    Files of base are regular. Binary files can't be reconstructed from a diff,
+    their section of current is repeated when it changed.
+    """
+    before, after = split_diff(previous), split_diff(current)
+    out = []
+    for path in sorted(before.keys() | after.keys(), key=lambda p: p.encode()):
+        old_section, new_section = before.get(path), after.get(path)
+        if old_section == new_section:
+            continue
+        if _is_binary_section(old_section) or _is_binary_section(new_section):
+            if new_section is not None:
+                out.append(new_section)
+            continue
+        base_content = _text(base[path]) if path in base else None
+        old, old_mode = apply_file_diff(base_content, old_section) if old_section else (base_content, REGULAR)
+        new, new_mode = apply_file_diff(base_content, new_section) if new_section else (base_content, REGULAR)
+        if old_mode == new_mode and old == new:
+            continue
+        out.append(file_diff(path, old, new, old_mode, new_mode))
+    return "".join(out)
@@ -0,0 +1,28 @@
+"""Diffs against the template directories, read from their manifests."""
+
+from typing import Callable, Mapping
+
+from core.template_manifest import template_manifests
+from diff.git_diff import Content, tracked, unified_diff
+
+
+def diff_with_template(
+    snapshot: Mapping[str, Content],
+    template_path: str,
+    files: Mapping[str, Content],
+    exclude: Callable[[str], bool] | None = None,
+) -> str:
+    """`git diff HEAD` after committing snapshot, then copying the template and files over it.
+
+    Paths matching exclude are left out on both sides.
+    """
+    template = template_manifests.get(template_path)
+    old = tracked(snapshot)
+    merged = {**snapshot, **template.files, **files}
+    new = tracked(merged, already_tracked=old)
+    modes = {p: m for p, m in template.modes.items() if p not in files}
+    ids = {p: i for p, i in template.ids.items() if p not in files}
+    if exclude is not None:
+        old = {p: c for p, c in old.items() if not exclude(p)}
+        new = {p: c for p, c in new.items() if not exclude(p)}
+    return unified_diff(old, new, new_modes=modes, new_ids=ids)
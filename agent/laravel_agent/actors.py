@@ -5,6 +5,7 @@ from typing import Callable, Awaitable
 from core.base_node import Node
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
+from core.validation_cache import cached_check
 from llm.common import AsyncLLM, Message, TextRaw, ToolUse, ToolUseResult
 from laravel_agent import playbooks
 from laravel_agent.utils import run_migrations, run_tests
@@ -27,8 +28,17 @@ class LaravelActor(FileOperationsActor):
         files_protected: list[str] = None,
         files_allowed: list[str] = None,
         event_callback: Callable[[str], Awaitable[None]] | None = None,
+        eval_concurrency: int = 1,
+        pipelined: bool = False,
     ):
-        super().__init__(llm, workspace, beam_width, max_depth)
+        super().__init__(
+            llm,
+            workspace,
+            beam_width,
+            max_depth,
+            eval_concurrency=eval_concurrency,
+            pipelined=pipelined,
+        )
         self.system_prompt = system_prompt
         self.event_callback = event_callback
         
@@ -150,8 +160,7 @@ class LaravelActor(FileOperationsActor):
         logger.info(
             f"Start {self.__class__.__name__} execution with files: {files.keys()}"
         )
-        for file_path, content in files.items():
-            workspace.write_file(file_path, content)
+        await workspace.write_files(files)
         workspace.permissions(
             protected=self.files_protected, allowed=self.files_allowed
         )
@@ -176,37 +185,35 @@ class LaravelActor(FileOperationsActor):
 
         solution: Node[BaseData] | None = None
         iteration = 0
-        while solution is None:
-            iteration += 1
-            candidates = self.select(self.root)
-            if not candidates:
-                logger.error("No candidates to evaluate, search terminated")
-                await notify_stage(self.event_callback, "❌ Laravel agent failed: No candidates to evaluate", "failed")
-                raise AgentSearchFailedException(
-                    agent_name="LaravelActor",
-                    message="No candidates to evaluate, search terminated"
-                )
+        async with self.pipeline():
+            while solution is None:
+                iteration += 1
+                candidates = self.select(self.root)
+                if not candidates:
+                    logger.error("No candidates to evaluate, search terminated")
+                    await notify_stage(self.event_callback, "❌ Laravel agent failed: No candidates to evaluate", "failed")
+                    raise AgentSearchFailedException(
+                        agent_name="LaravelActor",
+                        message="No candidates to evaluate, search terminated"
+                    )
 
-            await notify_if_callback(self.event_callback, f"🔄 Working on implementation (iteration {iteration})...", "iteration progress")
+                await notify_if_callback(self.event_callback, f"🔄 Working on implementation (iteration {iteration})...", "iteration progress")
 
-            logger.info(
-                f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
-            )
-            nodes = await self.run_llm(
-                candidates,
-                system_prompt=self.system_prompt,
-                tools=self.tools,
-                max_tokens=8192,
-            )
-            logger.info(f"Received {len(nodes)} nodes from LLM")
+                logger.info(
+                    f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
+                )
+                nodes = await self.run_llm(
+                    candidates,
+                    system_prompt=self.system_prompt,
+                    tools=self.tools,
+                    max_tokens=8192,
+                )
+                logger.info(f"Received {len(nodes)} nodes from LLM")
 
-            for i, new_node in enumerate(nodes):
-                logger.info(f"Evaluating node {i + 1}/{len(nodes)}")
-                if await self.eval_node(new_node, user_prompt):
-                    logger.info(f"Found solution at depth {new_node.depth}")
+                solution = await self.eval_nodes(nodes, user_prompt)
+                if solution is not None:
+                    logger.info(f"Found solution at depth {solution.depth}")
                     await notify_stage(self.event_callback, "✅ Laravel application generated successfully", "completed")
-                    solution = new_node
-                    break
         if solution is None:
             logger.error(f"{self.__class__.__name__} failed to find a solution")
             await notify_stage(self.event_callback, "❌ Laravel application generation failed", "failed")
@@ -234,6 +241,7 @@ class LaravelActor(FileOperationsActor):
         logger.info(f"Selected {len(candidates)} leaf nodes for evaluation")
         return candidates
 
+    @cached_check("ts_type_check")
     async def run_ts_type_checks(self, node: Node[BaseData]) -> str | None:
         # CRITICAL: Ziggy-js causes typecheck to fail, agent fixes this but template has to be updated
         type_check_result = await node.data.workspace.exec(
@@ -243,6 +251,7 @@ class LaravelActor(FileOperationsActor):
             return f"{type_check_result.stdout}\n{type_check_result.stderr}"
         return None
 
+    @cached_check("ts_lint")
     async def run_ts_lint_checks(self, node: Node[BaseData]) -> str | None:
         ts_lint_result = await node.data.workspace.exec(
             ["npm", "run", "lint"]
@@ -251,6 +260,7 @@ class LaravelActor(FileOperationsActor):
             return f"{ts_lint_result.stdout}\n{ts_lint_result.stderr}"
         return None
 
+    @cached_check("php_lint")
     async def run_php_lint_checks(self, node: Node[BaseData]) -> str | None:
         php_lint_result = await node.data.workspace.exec(
             ["composer", "lint"]
@@ -259,6 +269,7 @@ class LaravelActor(FileOperationsActor):
             return f"{php_lint_result.stdout}\n{php_lint_result.stderr}"
         return None
 
+    @cached_check("tests")
     async def run_tests(self, node: Node[BaseData]) -> str | None:
         composer_result = await run_tests(node.data.workspace.ctr)
         if composer_result.exit_code != 0:
@@ -282,6 +293,10 @@ class LaravelActor(FileOperationsActor):
             return "Migration syntax errors found:\n" + "\n".join(migration_errors)
         
         # If syntax is valid, run the migrations
+        return await self.apply_migrations(node)
+
+    @cached_check("migrations")
+    async def apply_migrations(self, node: Node[BaseData]) -> str | None:
         migrations_result = await run_migrations(node.data.workspace.client, node.data.workspace.ctr)
         if migrations_result.exit_code != 0:
             return f"{migrations_result.stdout}\n{migrations_result.stderr}"
@@ -1,18 +1,21 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass, field
 from core.statemachine import StateMachine, State, Context
-from core.dagger_utils import write_files_bulk
+from diff.template_files import diff_with_template
+from core.template_manifest import template_manifests
 from llm.utils import get_best_coding_llm_client
 from core.actors import BaseData
 from core.base_node import Node
 from core.statemachine import MachineCheckpoint
 from laravel_agent.actors import LaravelActor
 from laravel_agent import playbooks
-from laravel_agent.utils import create_workspace
+from laravel_agent.utils import create_workspace, build_base_container
+from core.workspace_pool import workspace_pool
 import dagger
 
 # Set up logging
@@ -165,8 +168,13 @@ class FSMApplication:
             # TODO: implement lint -- --fix for PHP filesß
 
         llm = get_best_coding_llm_client()
+        template, context = await template_manifests.snapshot(client, cls.template_path())
         workspace = await create_workspace(
-            client, client.host().directory(cls.template_path())
+            client,
+            context,
+            context_key=template.digest,
+            context_files=template.files,
+            base=await workspace_pool.acquire(client, "laravel"),
         )
 
         # Extract event_callback from settings if provided
@@ -177,6 +185,8 @@ class FSMApplication:
             workspace=workspace.clone(),
             beam_width=5,
             max_depth=100,  # Increased to 100 iterations as requested
+            eval_concurrency=settings.get("eval_concurrency", 1) if settings else 1,
+            pipelined=settings.get("pipelined_search", False) if settings else False,
             system_prompt=playbooks.APPLICATION_SYSTEM_PROMPT,
             # files_allowed will use the default from actors.py
             event_callback=event_callback,
@@ -315,69 +325,32 @@ class FSMApplication:
         logger.info(
             f"SERVER get_diff_with: Received snapshot with {len(snapshot)} files."
         )
-
-        # Temporary fix: exclude .png and .ico files from diffs
-        def should_exclude_from_diff(file_path: str) -> bool:
-            return file_path.lower().endswith((".png", ".ico"))
-
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
-
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
 
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory(self.template_path())
-        start = start.with_directory(".", template_dir)
-        logger.info("SERVER get_diff_with: Added template directory to workspace")
-
-        # Exclude .png and .ico files from being tracked by git
-        # Using || true to prevent failures if no files are found
-        start = start.with_exec(
-            [
-                "sh",
-                "-c",
-                "find . -name '*.png' -o -name '*.ico' | xargs -r git rm --cached || true",
-            ]
-        )
-
-        # Add FSM context files on top
-        filtered_ctx_files = {
-            k: v
-            for k, v in self.fsm.context.files.items()
-            if not should_exclude_from_diff(k)
-        }
-        start = await write_files_bulk(start, filtered_ctx_files, self.client)
+        # Temporary fix: exclude .png and .ico files from diffs
+        def should_exclude_from_diff(file_path: str) -> bool:
+            return file_path.lower().endswith((".png", ".ico"))
 
-        logger.info(
-            "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
-        )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        # Same as committing the snapshot, copying the template and FSM context files over it and
+        # running `git add . && git diff HEAD`, without a git container
+        diff = await anyio.to_thread.run_sync(
+            diff_with_template,
+            snapshot,
+            self.template_path(),
+            self.fsm.context.files,
+            should_exclude_from_diff,
         )
         logger.info(
-            f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"
+            f"SERVER get_diff_with: Diff succeeded. Diff length: {len(diff)}"
         )
         if not diff:
             logger.warning(
@@ -387,6 +360,9 @@ class FSMApplication:
         return diff
 
 
+workspace_pool.register("laravel", FSMApplication.template_path(), build_base_container)
+
+
 async def main(user_prompt="Add header to welcome page that says Hello World"):
     async with dagger.Connection(
         dagger.Config(log_output=open(os.devnull, "w"))
@@ -1,5 +1,7 @@
 import uuid
+import hashlib
 import dagger
+from typing import Mapping
 from core.workspace import Workspace, ExecResult
 from core.postgres_utils import create_postgres_service, pg_health_check_cmd
 
@@ -36,7 +38,8 @@ _DOCKER_EXT_PACKAGES = [
     "soap",
 ]
 
-async def create_workspace(client: dagger.Client, context: dagger.Directory, protected: list[str] = [], allowed: list[str] = []):
+def build_base_container(client: dagger.Client, context: dagger.Directory) -> dagger.Container:
+    """PHP toolchain plus installed composer and npm dependencies for the template."""
     ctr = (
         client
         .container()
@@ -59,6 +62,11 @@ async def create_workspace(client: dagger.Client, context: dagger.Directory, pro
         .with_exec(["composer", "install", "--optimize-autoloader", "--no-interaction"])
         .with_exec(["npm", "install"])
     )
+    return ctr
+
+
+async def create_workspace(client: dagger.Client, context: dagger.Directory, protected: list[str] = [], allowed: list[str] = [], context_key: str | None = None, base: dagger.Container | None = None, context_files: Mapping[str, str | bytes] | None = None):
+    ctr = base or build_base_container(client, context)
     ctr = ctr.with_env_variable("INSTANCE_ID", uuid.uuid4().hex)
     
     # Generate a secure APP_KEY for Laravel
@@ -68,13 +76,20 @@ async def create_workspace(client: dagger.Client, context: dagger.Directory, pro
     app_key = f"base64:{base64.b64encode(random_bytes).decode('utf-8')}"
     ctr = ctr.with_env_variable("APP_KEY", app_key)
     
-    return Workspace(
-        client=client,
+    workspace = Workspace(
         ctr=ctr,
         start=context,
         protected=set(protected),
         allowed=set(allowed),
     )
+    workspace._client = client
+    if context_key is not None:
+        # setup steps above are fixed, so the template digest identifies the base state
+        workspace._lineage = hashlib.sha256(f"laravel\0{context_key}".encode()).hexdigest()
+    workspace._workdir = "/var/www/html"
+    if context_files is not None:
+        workspace.seed_files(context_files)
+    return workspace
 
 async def run_tests(ctr: dagger.Container) -> ExecResult:
     """Run the project test-suite inside the given container.
@@ -1,28 +1,80 @@
 import random
-from typing import List, Literal
-from llm.common import AsyncLLM, Message, Completion, Tool
+import time
+from collections import deque
+from typing import AsyncIterator, List, Literal
+
+import anyio
+
+from llm.common import AsyncLLM, Message, Completion, CompletionDelta, Tool
+from llm.telemetry import observe_latency
 from log import get_logger
 
 logger = get_logger(__name__)
 
+SelectionStrategy = Literal["random", "round_robin", "latency"]
+
+# weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+# models failing more often than this are only used when all of them are
+MAX_ERROR_RATE = 0.5
+# an unhealthy model gets another chance after this long without errors
+ERROR_COOLDOWN = 30.0
+# samples needed before a model's p90 latency is trusted for hedging
+MIN_HEDGE_SAMPLES = 5
+
+
+class ModelStats:
+    """Moving averages of a model's latency and error rate."""
+
+    def __init__(self, window: int = 50):
+        self.latency: float | None = None
+        self.error_rate = 0.0
+        self.last_error = 0.0
+        self.recent: deque[float] = deque(maxlen=window)
+
+    def record_latency(self, seconds: float):
+        self.recent.append(seconds)
+        self.latency = seconds if self.latency is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency
+        self.error_rate *= 1 - EWMA_ALPHA
+
+    def record_error(self):
+        self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+        self.last_error = time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        return self.error_rate <= MAX_ERROR_RATE or time.monotonic() - self.last_error > ERROR_COOLDOWN
+
+    @property
+    def p90(self) -> float | None:
+        if len(self.recent) < MIN_HEDGE_SAMPLES:
+            return None
+        return sorted(self.recent)[int(0.9 * (len(self.recent) - 1))]
+
 
 class AlloyLLM(AsyncLLM):
     """Alloy Agent implementation that combines multiple models in a single conversation thread.
 
     Models alternate generating responses, unaware they are part of an alloy.
+    The "latency" strategy routes to the healthy model with the lowest average
+    latency instead, and with hedge=True repeats a completion on the next best
+    model once the first one takes longer than its p90 latency.
     """
 
     def __init__(
         self,
         models: List[AsyncLLM],
-        selection_strategy: Literal["random", "round_robin"] = "random",
+        selection_strategy: SelectionStrategy = "random",
+        hedge: bool = False,
     ):
         if not models:
             raise ValueError("At least one model must be provided")
 
         self.models = models
         self.selection_strategy = selection_strategy
+        self.hedge = hedge
         self.current_index = 0
+        self.stats = [ModelStats() for _ in models]
         logger.info(
             f"Initialized AlloyLLM with {len(models)} models, strategy: {selection_strategy}"
         )
@@ -31,18 +83,20 @@ class AlloyLLM(AsyncLLM):
     def from_models(
         cls,
         models: List[AsyncLLM],
-        selection_strategy: Literal["random", "round_robin"] = "random",
+        selection_strategy: SelectionStrategy = "random",
+        hedge: bool = False,
     ) -> "AlloyLLM":
         """Create an AlloyLLM from a list of model instances.
 
         Args:
             models: List of AsyncLLM instances to combine
-            selection_strategy: How to select models ("random" or "round_robin")
+            selection_strategy: How to select models ("random", "round_robin" or "latency")
+            hedge: Hedge slow completions on a second model (with the "latency" strategy)
 
         Returns:
             An AlloyLLM instance
         """
-        return cls(models, selection_strategy)
+        return cls(models, selection_strategy, hedge)
 
     async def completion(
         self,
@@ -56,8 +110,114 @@ class AlloyLLM(AsyncLLM):
         *args,
         **kwargs,
     ) -> Completion:
+        request_params = {
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "model": model,
+            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "system_prompt": system_prompt,
+            **kwargs,
+        }
+        if self.selection_strategy != "latency":
+            selected_model = self._select_model()
+            # delegate to selected model
+            return await selected_model.completion(*args, **request_params)
+
+        ranked = self._ranked()
+        primary = ranked[0]
+        hedge_after = self.stats[primary].p90 if self.hedge and len(ranked) > 1 else None
+        if hedge_after is None:
+            return await self._tracked_completion(primary, args, request_params)
+        return await self._hedged_completion(primary, ranked[1], hedge_after, args, request_params)
+
+    async def _tracked_completion(self, idx: int, args: tuple, request_params: dict) -> Completion:
+        stats = self.stats[idx]
+        try:
+            with observe_latency(stats.record_latency):
+                return await self.models[idx].completion(*args, **request_params)
+        except Exception:
+            stats.record_error()
+            raise
+
+    async def _hedged_completion(
+        self, primary: int, secondary: int, hedge_after: float, args: tuple, request_params: dict
+    ) -> Completion:
+        """First completion of primary and secondary, secondary starting after hedge_after or a primary failure."""
+        results: list[Completion] = []
+        errors: list[Exception] = []
+        primary_failed = anyio.Event()
+
+        async def attempt(idx: int, delay: float):
+            with anyio.move_on_after(delay):
+                await primary_failed.wait()
+            if idx != primary:
+                logger.info(f"AlloyLLM hedging on {self.models[idx]!r} after {delay:.2f}s")
+            try:
+                completion = await self._tracked_completion(idx, args, request_params)
+            except Exception as e:
+                errors.append(e)
+                primary_failed.set()
+                return
+            if not results:
+                results.append(completion)
+                tg.cancel_scope.cancel()
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(attempt, primary, 0)
+            tg.start_soon(attempt, secondary, hedge_after)
+        if results:
+            return results[0]
+        raise errors[0]
+
+    async def stream_completion(
+        self,
+        messages: list[Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[CompletionDelta | Completion]:
+        selected_model = self._select_model()
+        request_params = {
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "model": model,
+            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "system_prompt": system_prompt,
+            **kwargs,
+        }
+        if (stream := getattr(selected_model, "stream_completion", None)) is None:
+            yield await selected_model.completion(*args, **request_params)
+            return
+        async for item in stream(*args, **request_params):
+            yield item
+
+    def _ranked(self) -> list[int]:
+        """Model indices, healthy ones first, untried ones first, then by average latency."""
+        return sorted(
+            range(len(self.models)),
+            key=lambda i: (
+                not self.stats[i].healthy,
+                self.stats[i].error_rate if not self.stats[i].healthy else 0.0,
+                self.stats[i].latency is not None,
+                self.stats[i].latency or 0.0,
+            ),
+        )
+
+    def _select_model(self) -> AsyncLLM:
         # select model based on strategy
-        if self.selection_strategy == "random":
+        if self.selection_strategy == "latency":
+            model_idx = self._ranked()[0]
+            selected_model = self.models[model_idx]
+        elif self.selection_strategy == "random":
             selected_model = random.choice(self.models)
             model_idx = self.models.index(selected_model)
         else:  # round_robin
@@ -68,16 +228,4 @@ class AlloyLLM(AsyncLLM):
         logger.info(
             f"AlloyLLM selected model index {model_idx} of {len(self.models)}, which is {repr(selected_model)}"
         )
-
-        # delegate to selected model
-        return await selected_model.completion(
-            messages=messages,
-            max_tokens=max_tokens,
-            model=model,
-            temperature=temperature,
-            tools=tools,
-            tool_choice=tool_choice,
-            system_prompt=system_prompt,
-            *args,
-            **kwargs,
-        )
+        return selected_model
@@ -1,4 +1,7 @@
-from typing import Iterable, TypedDict, NotRequired
+from contextlib import nullcontext
+from typing import AsyncContextManager, AsyncIterator, Callable, Iterable, TypedDict, NotRequired
+import hashlib
+import ujson as json
 import anthropic
 from anthropic.types import (
     ToolParam,
@@ -11,12 +14,20 @@ from anthropic.types import (
     ToolUseBlockParam,
     ToolResultBlockParam,
     ToolChoiceParam,
+    RawContentBlockStartEvent,
+    RawContentBlockDeltaEvent,
+    TextDelta,
+    ThinkingDelta,
+    InputJSONDelta,
 )
 from llm import common
+from llm.prefix_cache import PrefixCacheCoordinator
+from llm.rate_limit import backoff_sleep, report_rate_limited
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
 from tenacity import (
+    AsyncRetrying,
     retry,
     stop_after_attempt,
     wait_exponential_jitter,
@@ -31,6 +42,8 @@ logger = get_logger(__name__)
 def is_retryable_error(exception: BaseException) -> bool:
     """Check if the exception is retryable (rate limit or server error)."""
     if isinstance(exception, anthropic.APIStatusError):
+        if exception.status_code == 429:
+            report_rate_limited()  # back off the shared limiter while this request retries
         # Retry on rate limits (429) and server errors (>=500)
         return exception.status_code == 429 or exception.status_code >= 500
     return False
@@ -41,10 +54,15 @@ retry_rate_limits = retry(
     wait=wait_exponential_jitter(initial=1.5, max=30),
     retry=retry_if_exception(is_retryable_error),
     before_sleep=before_sleep_log(logger, logging.WARNING),
+    sleep=backoff_sleep,
     reraise=True,
 )
 
 
+# prompts shorter than the smallest cacheable prefix (1024 tokens) aren't worth coordinating
+MIN_CACHEABLE_PREFIX_CHARS = 4096
+
+
 class AnthropicParams(TypedDict):
     max_tokens: int
     messages: list[MessageParam]
@@ -60,6 +78,7 @@ class AnthropicLLM(common.AsyncLLM):
         self,
         client: anthropic.AsyncAnthropic | anthropic.AsyncAnthropicBedrock,
         default_model: str,
+        prefix_coordinator: PrefixCacheCoordinator | None = None,
     ):
         self.client = client
         self.default_model = default_model
@@ -67,8 +86,9 @@ class AnthropicLLM(common.AsyncLLM):
             "bedrock" not in self.client.__class__.__name__.lower()
         )
         # this is a workaround for the fact that the bedrock client does not support caching yet
+        self.prefix_coordinator = prefix_coordinator or PrefixCacheCoordinator()
 
-    async def completion(
+    def _call_args(
         self,
         messages: list[common.Message],
         max_tokens: int,
@@ -77,13 +97,15 @@ class AnthropicLLM(common.AsyncLLM):
         tools: list[common.Tool] | None = None,
         tool_choice: str | None = None,
         system_prompt: str | None = None,
-    ) -> common.Completion:
+    ) -> AnthropicParams:
         call_args: AnthropicParams = {
             "model": model or self.default_model,
             "max_tokens": max_tokens or 8192,
             "temperature": temperature,
             "messages": self._messages_into(messages),
         }
+        if self.use_prompt_caching:
+            self._mark_breakpoints(call_args["messages"])
 
         if system_prompt is not None:
             if self.use_prompt_caching:
@@ -102,8 +124,107 @@ class AnthropicLLM(common.AsyncLLM):
             call_args["tools"] = tools  # type: ignore
         if tool_choice is not None:
             call_args["tool_choice"] = {"type": "tool", "name": tool_choice}
+        return call_args
+
+    @staticmethod
+    def _mark_breakpoints(messages: list[MessageParam]):
+        """Cache the history up to its end and up to the previous user turn.
+
+        The last message writes the prefix the next turn extends; the previous
+        user turn is where the prior request wrote it, so it is read even when
+        the turn added more blocks than the provider looks back over. With the
+        system prompt and tools this uses all four breakpoints.
+        """
+        user_turns = [m for m in messages if m["role"] == "user"]
+        marked = [messages[-1]] if messages else []
+        if len(user_turns) > 1 and user_turns[-2] is not messages[-1]:
+            marked.append(user_turns[-2])
+        for message in marked:
+            content = message["content"]
+            if isinstance(content, list) and content:
+                content[-1]["cache_control"] = {"type": "ephemeral"}  # type: ignore
+
+    def _prefix_turn(self, call_args: AnthropicParams) -> AsyncContextManager[Callable[[], None] | None]:
+        """Lead or follow concurrent requests with the same cacheable prefix."""
+        if not self.use_prompt_caching:
+            return nullcontext(None)
+        prefix = json.dumps(
+            [call_args["model"], call_args.get("system"), call_args.get("tools"), call_args["messages"]],
+            sort_keys=True,
+        )
+        if len(prefix) < MIN_CACHEABLE_PREFIX_CHARS:
+            return nullcontext(None)
+        return self.prefix_coordinator.lead_or_follow(hashlib.sha256(prefix.encode()).hexdigest())
+
+    async def completion(
+        self,
+        messages: list[common.Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+    ) -> common.Completion:
+        call_args = self._call_args(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        async with self._prefix_turn(call_args) as release:
+            if release is None:
+                return await self._create_message_with_retry(call_args)
+            # streamed to learn when the prompt is processed and siblings can read it
+            return await self._stream_message_with_retry(call_args, release)
+
+    async def stream_completion(
+        self,
+        messages: list[common.Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+    ) -> AsyncIterator[common.CompletionDelta | common.Completion]:
+        call_args = self._call_args(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        started = False
+        async with self._prefix_turn(call_args) as release:
+            # retry like completion, but only until the first delta was handed out
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(5),
+                wait=wait_exponential_jitter(initial=1.5, max=30),
+                retry=retry_if_exception(lambda e: not started and is_retryable_error(e)),
+                before_sleep=before_sleep_log(logger, logging.WARNING),
+                sleep=backoff_sleep,
+                reraise=True,
+            ):
+                with attempt:
+                    telemetry = LLMTelemetry()
+                    telemetry.start_timing()
+                    async with self.client.messages.stream(**call_args) as stream:
+                        async for event in stream:
+                            if release is not None and event.type == "message_start":
+                                release()
+                            if (delta := self._delta_from(event)) is not None:
+                                started = True
+                                yield delta
+                        completion = await stream.get_final_message()
+                    self._log_telemetry(telemetry, call_args, completion)
+                    yield self._completion_from(completion)
 
-        return await self._create_message_with_retry(call_args)
+    @staticmethod
+    def _delta_from(event: object) -> common.CompletionDelta | None:
+        match event:
+            case RawContentBlockStartEvent(index=index, content_block=ToolUseBlock(name=name, id=id)):
+                return common.CompletionDelta("tool_use", index, "", name=name, id=id)
+            case RawContentBlockDeltaEvent(index=index, delta=TextDelta(text=text)):
+                return common.CompletionDelta("text", index, text)
+            case RawContentBlockDeltaEvent(index=index, delta=ThinkingDelta(thinking=thinking)):
+                return common.CompletionDelta("thinking", index, thinking)
+            case RawContentBlockDeltaEvent(index=index, delta=InputJSONDelta(partial_json=partial_json)):
+                return common.CompletionDelta("tool_use", index, partial_json)
+        return None
 
     @retry_rate_limits
     async def _create_message_with_retry(
@@ -113,7 +234,29 @@ class AnthropicLLM(common.AsyncLLM):
         telemetry.start_timing()
 
         completion = await self.client.messages.create(**call_args)
+        self._log_telemetry(telemetry, call_args, completion)
+        return self._completion_from(completion)
 
+    @retry_rate_limits
+    async def _stream_message_with_retry(
+        self, call_args: AnthropicParams, on_start: Callable[[], None]
+    ) -> common.Completion:
+        """Same as _create_message_with_retry, calling on_start when the response starts."""
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        async with self.client.messages.stream(**call_args) as stream:
+            async for event in stream:
+                if event.type == "message_start":
+                    on_start()
+            completion = await stream.get_final_message()
+        self._log_telemetry(telemetry, call_args, completion)
+        return self._completion_from(completion)
+
+    @staticmethod
+    def _log_telemetry(
+        telemetry: LLMTelemetry, call_args: AnthropicParams, completion: Message
+    ):
         # Log telemetry if usage data is available
         if hasattr(completion, "usage"):
             # extract cached tokens if available
@@ -145,8 +288,6 @@ class AnthropicLLM(common.AsyncLLM):
                 provider="Anthropic",
             )
 
-        return self._completion_from(completion)
-
     @staticmethod
     def _completion_from(completion: Message) -> common.Completion:
         ours_content: list[common.TextRaw | common.ToolUse | common.ThinkingBlock] = []
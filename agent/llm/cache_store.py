@@ -0,0 +1,179 @@
+import os
+import fcntl
+import threading
+import ujson as json
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class CacheStore:
+    """Append-only JSONL store of recorded completions, indexed by cache key.
+
+    Each line is `<key>\\t<json entry>\\n` and a later line for a key supersedes
+    earlier ones. The in-memory index maps keys to line offsets and is built by
+    reading keys only; entries are parsed when requested.
+
+    Several processes (pytest-xdist workers) can share a file: appends are
+    single O_APPEND writes under a shared flock, compaction rewrites the file
+    under an exclusive one and swaps it in atomically. Lookups stat the file
+    and index whatever was appended since the last scan.
+    """
+
+    COMPACT_MIN_STALE = 64
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._index: dict[str, int] = {}
+        self._inode: int | None = None
+        self._scanned = 0
+        self._stale = 0
+
+    @classmethod
+    def open(cls, path: str | Path, legacy_path: str | Path | None = None) -> "CacheStore":
+        """Open a store, importing a legacy single-file JSON cache on first use."""
+        store = cls(path)
+        if legacy_path is not None and not store.path.exists() and Path(legacy_path).exists():
+            store.import_legacy(legacy_path)
+        return store
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def import_legacy(self, legacy_path: str | Path):
+        """Convert a {key: entry} JSON cache file written by earlier versions."""
+        with open(legacy_path, "r") as f:
+            data: dict[str, Any] = json.loads(f.read() or "{}")
+        # workers racing to migrate write the same content, the last replace wins
+        self._write_atomic(data.items())
+        logger.info(f"Migrated {len(data)} cache entries from {legacy_path} to {self.path}")
+
+    def _write_atomic(self, items: Iterable[tuple[str, Any]]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            for key, entry in items:
+                f.write(self._line(key, entry))
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _line(key: str, entry: Any) -> bytes:
+        return f"{key}\t{json.dumps(entry)}\n".encode()
+
+    def _open_locked(self, mode: str, operation: int):
+        """Open the current file under flock, retrying if it was swapped while waiting."""
+        while True:
+            f = open(self.path, mode)
+            fcntl.flock(f, operation)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._index, self._inode, self._scanned, self._stale = {}, None, 0, 0
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._scanned:
+            # compacted, cleared or migrated by someone else
+            self._index, self._inode, self._scanned, self._stale = {}, stat.st_ino, 0, 0
+        if stat.st_size == self._scanned:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._scanned)
+            offset = self._scanned
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                key = line[: line.index(b"\t")].decode()
+                if key in self._index:
+                    self._stale += 1
+                self._index[key] = offset
+                offset += len(line)
+        self._scanned = offset
+
+    def _read_at(self, key: str, offset: int) -> Any | None:
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            line = f.readline()
+        line_key, _, payload = line.partition(b"\t")
+        if line_key.decode() != key:
+            return None
+        return json.loads(payload)
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            for _ in range(2):
+                self._refresh()  # a stat unless someone appended
+                if (offset := self._index.get(key)) is None:
+                    return None
+                try:
+                    if (entry := self._read_at(key, offset)) is not None:
+                        return entry
+                except FileNotFoundError:
+                    pass
+                self._inode = None  # file changed under us, rebuild the index
+            return None
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return key in self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._index)
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        for key in self.keys():
+            if (entry := self.get(key)) is not None:
+                yield key, entry
+
+    def append(self, key: str, entry: Any):
+        """Add or supersede an entry; blocking, run it off the event loop."""
+        line = self._line(key, entry)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.touch(exist_ok=True)
+            with self._open_locked("ab", fcntl.LOCK_SH) as f:
+                f.write(line)
+            self._refresh()
+            should_compact = self._stale >= max(self.COMPACT_MIN_STALE, len(self._index))
+        if should_compact:
+            self.compact()
+
+    def compact(self):
+        """Drop superseded lines."""
+        with self._lock:
+            if not self.path.exists():
+                return
+            with self._open_locked("rb", fcntl.LOCK_EX):
+                self._inode = None
+                self._refresh()
+                entries = [(key, self._read_at(key, offset)) for key, offset in self._index.items()]
+                self._write_atomic(entries)
+                self._inode = None
+            logger.info(f"Compacted {self.path} to {len(entries)} entries")
+
+    def rewrite(self, items: Iterable[tuple[str, Any]]):
+        """Replace the contents of the store."""
+        with self._lock:
+            self._write_atomic(items)
+            self._index, self._inode, self._scanned, self._stale = {}, None, 0, 0
+
+    def clear(self):
+        self.rewrite(())
@@ -1,12 +1,15 @@
-from typing import Literal, Dict, Any, List, Tuple
+from typing import AsyncIterator, Iterable, Literal, Dict, Any, List, Tuple
 import ujson as json
 from pathlib import Path
-from llm.common import AsyncLLM, Completion, Message, Tool
+from llm.common import AsyncLLM, Completion, CompletionDelta, InternalMessage, Message, Tool, dump_content
+from llm.cache_store import CacheStore
 import os
 import anyio
+import anyio.to_thread
 from collections import OrderedDict
 import hashlib
 import difflib
+import weakref
 
 from log import get_logger
 
@@ -15,7 +18,7 @@ logger = get_logger(__name__)
 CacheMode = Literal["off", "record", "replay", "auto", "lru"]
 
 
-def normalize(obj):
+def normalize(obj) -> Any:
     match obj:
         case list() | tuple():
             return [normalize(item) for item in obj]
@@ -46,19 +49,155 @@ def normalize(obj):
             return obj
 
 
-def find_closest_dict(target: dict, candidates: list[dict]):
-    if not candidates:
-        return None
+# bump when the key scheme changes; stores recorded with another version are rekeyed from their params
+KEY_VERSION = 2
+_MAX_TOOL_LISTS = 64
+_tools_digests: OrderedDict[int, Tuple[tuple, str]] = OrderedDict()
+# id of a message -> (the message, its role and blocks when digested, digest); dropped with the message
+_message_digests: dict[int, Tuple[weakref.ref, str, tuple, str]] = {}
 
-    target_str = json.dumps(target, sort_keys=True)
-    candidate_strs = [json.dumps(c, sort_keys=True) for c in candidates]
-    similarity = [
-        difflib.SequenceMatcher(None, target_str, c_str).ratio()
-        for c_str in candidate_strs
-    ]
 
-    max_index = similarity.index(max(similarity))
-    return max_index
+def _digest(value: Any) -> str:
+    return hashlib.md5(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def _block_digests(block: Any) -> list[str]:
+    """Digests of a content block's normalized dumps (ToolResult dumps to nothing)."""
+    # blocks aren't mutated once created, so the digest is kept on the block
+    if (memo := getattr(block, "_cache_digests", None)) is None:
+        memo = [_digest(normalize(b)) for b in dump_content([block])]
+        block._cache_digests = memo
+    return memo
+
+
+def _message_digest_from(message: dict) -> str:
+    """Digest of a normalized message, as stored in cache params."""
+    return _digest({"role": message["role"], "content": [_digest(b) for b in message["content"]]})
+
+
+def message_digest(message: Any) -> str:
+    if not isinstance(message, InternalMessage):
+        return _message_digest_from(normalize(message))
+    content = tuple(message.content)
+    memo = _message_digests.get(id(message))
+    # the memo holds the blocks, so blocks identical to them are the same blocks
+    if (
+        memo is not None
+        and memo[0]() is message
+        and memo[1] == message.role
+        and len(memo[2]) == len(content)
+        and all(a is b for a, b in zip(memo[2], content))
+    ):
+        return memo[3]
+    digests = [d for block in content for d in _block_digests(block)]
+    digest = _digest({"role": message.role, "content": digests})
+    key = id(message)
+    ref = weakref.ref(message, lambda _: _message_digests.pop(key, None))
+    _message_digests[key] = (ref, message.role, content, digest)
+    return digest
+
+
+def tools_digest(tools: list) -> str:
+    """Digest of a tool list, computed once per list object (actors reuse theirs)."""
+    if (memo := _tools_digests.get(id(tools))) is not None and memo[0] == tuple(tools):
+        _tools_digests.move_to_end(id(tools))
+        return memo[1]
+    digest = _digest(normalize(tools))
+    # the memo holds the list and its items, so their ids can't be reused meanwhile
+    _tools_digests[id(tools)] = (tuple(tools), digest)
+    while len(_tools_digests) > _MAX_TOOL_LISTS:
+        _tools_digests.popitem(last=False)
+    return digest
+
+
+def request_key(**kwargs) -> str:
+    """Cache key of a request: a digest over per-message and tool list digests.
+
+    Equal to params_key(normalize(kwargs)), without normalizing the history.
+    """
+    messages, tools = kwargs.get("messages"), kwargs.get("tools")
+    parts = normalize({
+        k: v for k, v in kwargs.items()
+        if not (k == "messages" and messages is not None) and not (k == "tools" and tools is not None)
+    })
+    if messages is not None:
+        parts["messages"] = [message_digest(m) for m in messages]
+    if tools is not None:
+        parts["tools"] = tools_digest(tools)
+    return _digest(parts)
+
+
+def params_key(params: dict) -> str:
+    """Cache key from the normalized params stored with an entry."""
+    parts = dict(params)
+    if (messages := params.get("messages")) is not None:
+        parts["messages"] = [_message_digest_from(m) for m in messages]
+    if (tools := params.get("tools")) is not None:
+        parts["tools"] = _digest(tools)
+    return _digest(parts)
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.keys: List[str] = []
+
+
+class ClosestRequestIndex:
+    """Prefix trie over the per-message digests of cached requests.
+
+    Conversations that miss the cache usually share a history prefix with a
+    recorded one and diverge at a single message, so the nearest entry is the
+    one sharing the longest prefix; ties go to the entry matching most of the
+    other params. Lookups cost one digest per message of the request.
+    """
+
+    def __init__(self, items: Iterable[Tuple[str, Dict[str, Any]]] = ()):
+        self._root = _TrieNode()
+        self._fields: Dict[str, Dict[str, str]] = {}
+        self._lengths: Dict[str, int] = {}
+        for key, params in items:
+            self.add(key, params)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    @staticmethod
+    def _field_digests(params: dict) -> Dict[str, str]:
+        return {k: _digest(v) for k, v in params.items() if k != "messages"}
+
+    def add(self, key: str, params: dict):
+        messages = params.get("messages") or []
+        node = self._root
+        node.keys.append(key)
+        for message in messages:
+            node = node.children.setdefault(_message_digest_from(message), _TrieNode())
+            node.keys.append(key)
+        self._fields[key] = self._field_digests(params)
+        self._lengths[key] = len(messages)
+
+    def closest(self, params: dict) -> Tuple[str, int, List[str]] | None:
+        """Nearest key, the number of leading messages it shares, and the differing fields."""
+        if not self._fields:
+            return None
+        digests = [_message_digest_from(m) for m in params.get("messages") or []]
+        node, depth = self._root, 0
+        for digest in digests:
+            if (child := node.children.get(digest)) is None:
+                break
+            node, depth = child, depth + 1
+        fields = self._field_digests(params)
+
+        def _score(key: str):
+            matched = sum(fields.get(k) == v for k, v in self._fields[key].items())
+            return matched, -abs(self._lengths[key] - len(digests))
+
+        best = max(node.keys, key=_score)
+        cached = self._fields[best]
+        differing = sorted(k for k in fields.keys() | cached.keys() if fields.get(k) != cached.get(k))
+        return best, depth, differing
 
 
 def find_closest_str(s: str, index: list[str]) -> str:
@@ -74,6 +213,10 @@ class CachedLLM(AsyncLLM):
     - record: Record all requests and responses to cache file
     - replay: Replay responses from cache file without making real requests
     - lru: Keep cache of N most recent invocations using LRU strategy; use cached response if available, otherwise call the model
+
+    Recorded responses live in an append-only JSONL store next to cache_path
+    (see CacheStore) and are read by key on demand; a legacy JSON file at
+    cache_path is migrated on first use.
     """
 
     def __init__(
@@ -91,28 +234,33 @@ class CachedLLM(AsyncLLM):
             logger.info(f"Inferred cache mode {self.cache_mode}")
         self.cache_path = cache_path
         self.max_cache_size = max_cache_size
+        # responses made by this instance, and in lru mode the recently used ones
         self._cache: Dict[str, Any] = {}
         self._cache_lru: OrderedDict[str, None] = OrderedDict()
         self.lock = anyio.Lock()
         self._pending_requests: Dict[str, anyio.Event] = {}
+        self._closest_index: ClosestRequestIndex | None = None
 
-        match (self.cache_mode, Path(self.cache_path)):
-            case ("replay", file) if not file.exists():
-                raise ValueError(f"cache file missing: {file}")
-            case ("replay", file):
-                logger.info(f"cache file found: {file}")
-                self._cache = self._load_cache()
-            case ("record", file):
-                if file.exists():
-                    logger.info(f"cache file already exists: {file}; wiping")
-                    file.unlink()
-                self._save_cache()
-            case ("lru", file) if file.exists():
-                logger.info(f"loading lru cache from: {file}")
-                self._cache = self._load_cache()
-                # Initialize LRU order from existing cache
-                for key in self._cache:
-                    self._cache_lru[key] = None
+        legacy_path = Path(self.cache_path)
+        store_path = legacy_path.with_suffix(".jsonl")
+        match self.cache_mode:
+            case "replay":
+                self._store = CacheStore.open(store_path, legacy_path)
+                if not self._store.exists():
+                    raise ValueError(f"cache file missing: {store_path}")
+                logger.info(f"cache file found: {store_path}")
+                self._rekey_store()
+            case "record":
+                self._store = CacheStore(store_path)
+                if self._store.exists() or legacy_path.exists():
+                    logger.info(f"cache file already exists: {store_path}; wiping")
+                    legacy_path.unlink(missing_ok=True)
+                self._store.clear()
+            case _:
+                self._store = CacheStore.open(store_path, legacy_path)
+                if self.cache_mode == "lru" and self._store.exists():
+                    logger.info(f"using lru cache from: {store_path}")
+                    self._rekey_store()
 
     @staticmethod
     def _infer_cache_mode():
@@ -122,23 +270,14 @@ class CachedLLM(AsyncLLM):
             raise ValueError(f"invalid cache mode from env: {env_mode}")
         return "off"
 
-    def _load_cache(self) -> Dict[str, Any]:
-        """load cache from file if it exists, otherwise return empty dict."""
-        if (cache_file := Path(self.cache_path)).exists():
-            with cache_file.open("r") as f:
-                if content := f.read():
-                    return json.loads(content)
-        return {}
-
-    def _save_cache(self) -> None:
-        """save cache to file."""
-        cache_file = Path(self.cache_path)
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with cache_file.open("w") as f:
-            json.dump(self._cache, f, indent=2)
-
-    def _update_lru_cache(self, key: str) -> None:
+    def _lookup(self, key: str) -> Dict[str, Any] | None:
+        if (entry := self._cache.get(key)) is not None:
+            return entry
+        return self._store.get(key)
+
+    def _update_lru_cache(self, key: str, entry: Dict[str, Any]) -> None:
         """Update the LRU cache order and ensure it stays within size limit."""
+        self._cache[key] = entry
         # Move to end (most recently used) or add if not present
         self._cache_lru.pop(key, None)
         self._cache_lru[key] = None
@@ -150,25 +289,53 @@ class CachedLLM(AsyncLLM):
             logger.debug(f"Evicted oldest cache entry: {oldest_key}")
 
     @staticmethod
-    def _get_cache_key(**kwargs) -> Tuple[Any, str]:
+    def _get_cache_key(**kwargs) -> str:
         """generate a consistent cache key from request parameters."""
-        normalized_kwargs = normalize(kwargs)
-        key_str = json.dumps(normalized_kwargs, sort_keys=True)
-        return normalized_kwargs, hashlib.md5(key_str.encode()).hexdigest()
-
-    def report_closest_cache_key(self, cache_key: str, norm_params: dict) -> None:
-        cache = list(self._cache.items())
-        idx = find_closest_dict(norm_params, [x[1]["params"] for x in cache])
-        if idx is None:
+        return request_key(**kwargs)
+
+    def _rekey_store(self) -> None:
+        """Rewrite entries recorded under an older key scheme, keyed from their params."""
+        first = next(self._store.items(), None)
+        if first is None or first[1].get("key_version") == KEY_VERSION:
+            return
+        entries = [
+            (params_key(entry["params"]), {**entry, "key_version": KEY_VERSION})
+            for _, entry in self._store.items()
+        ]
+        self._store.rewrite(entries)
+        logger.info(f"Rekeyed {len(entries)} cache entries in {self._store.path}")
+
+    def report_closest_cache_key(self, cache_key: str, norm_params: dict) -> Dict[str, Any] | None:
+        if self._closest_index is None:
+            # built once, replay stores don't change while tests run
+            self._closest_index = ClosestRequestIndex(
+                (key, entry["params"]) for key, entry in self._store.items()
+            )
+        match = self._closest_index.closest(norm_params)
+        if match is None:
             logger.error(
                 f"Cache miss by {self.client.__class__.__name__} - probably empty cache"
             )
-            return
-        cache_params = cache[idx][1]["params"]
+            return None
+        closest_key, shared, differing = match
+        if (closest := self._lookup(closest_key)) is None:
+            return None
+        cache_params = closest["params"]
+        n_messages = len(norm_params.get("messages") or [])
+        if shared < n_messages or shared < len(cache_params.get("messages") or []):
+            logger.info(
+                f"Closest cached request {closest_key} shares {shared} of {n_messages} messages; "
+                f"first difference at ['messages'][{shared}]"
+            )
+        if differing:
+            logger.info(f"Closest cached request {closest_key} differs in: {', '.join(differing)}")
 
         def _compare(x, y, prefix=""):
             if isinstance(x, dict):
                 for k in x:
+                    if k not in y:
+                        logger.info(f"Missing key at {prefix}['{k}']")
+                        continue
                     _compare(x[k], y[k], prefix + f"['{k}']")
             elif isinstance(x, list):
                 if not len(x) == len(y):
@@ -195,7 +362,6 @@ class CachedLLM(AsyncLLM):
     async def _get_or_make_request(
         self,
         cache_key: str,
-        norm_params: dict,
         request_params: dict,
         use_lru: bool = False,
     ) -> Completion:
@@ -204,11 +370,11 @@ class CachedLLM(AsyncLLM):
         make_request = False
 
         async with self.lock:
-            if cache_key in self._cache:
+            if (entry := self._lookup(cache_key)) is not None:
                 logger.info(f"cache hit: {cache_key}")
                 if use_lru:
-                    self._update_lru_cache(cache_key)
-                return Completion.from_dict(self._cache[cache_key]["data"])
+                    self._update_lru_cache(cache_key, entry)
+                return Completion.from_dict(entry["data"])
             elif cache_key in self._pending_requests:
                 event = self._pending_requests[cache_key]
             else:
@@ -222,9 +388,11 @@ class CachedLLM(AsyncLLM):
         if not make_request:
             await event.wait()
             async with self.lock:
+                if (entry := self._lookup(cache_key)) is None:
+                    raise RuntimeError(f"Concurrent request for {cache_key} failed")
                 if use_lru:
-                    self._update_lru_cache(cache_key)
-                return Completion.from_dict(self._cache[cache_key]["data"])
+                    self._update_lru_cache(cache_key, entry)
+                return Completion.from_dict(entry["data"])
 
         try:
             # Filter out parameters that the underlying client may not accept.
@@ -237,25 +405,23 @@ class CachedLLM(AsyncLLM):
             }
 
             response = await self.client.completion(**safe_request_params)
+            entry = {
+                "data": response.to_dict(),
+                "params": normalize(request_params),
+                "key_version": KEY_VERSION,
+            }
 
-            async with self.lock:
-                self._cache[cache_key] = {
-                    "data": response.to_dict(),
-                    "params": norm_params,
-                }
-                if use_lru:
-                    self._update_lru_cache(cache_key)
-                else:
-                    self._save_cache()
-                del self._pending_requests[cache_key]
-
-            event.set()
+            if use_lru:
+                async with self.lock:
+                    self._update_lru_cache(cache_key, entry)
+            else:
+                self._cache[cache_key] = entry
+                await anyio.to_thread.run_sync(self._store.append, cache_key, entry)
             return response
-        except Exception:
+        finally:
             async with self.lock:
                 del self._pending_requests[cache_key]
             event.set()
-            raise
 
     async def completion(
         self,
@@ -289,25 +455,23 @@ class CachedLLM(AsyncLLM):
                 return await self.client.completion(**request_params)
 
             case "record":
-                norm_params, cache_key = self._get_cache_key(**request_params)
+                cache_key = self._get_cache_key(**request_params)
                 logger.info(f"Caching response with key: {cache_key}")
-                return await self._get_or_make_request(
-                    cache_key, norm_params, request_params
-                )
+                return await self._get_or_make_request(cache_key, request_params)
 
             case "lru":
-                norm_params, cache_key = self._get_cache_key(**request_params)
+                cache_key = self._get_cache_key(**request_params)
                 return await self._get_or_make_request(
-                    cache_key, norm_params, request_params, use_lru=True
+                    cache_key, request_params, use_lru=True
                 )
 
             case "replay":
-                norm_params, cache_key = self._get_cache_key(**request_params)
-                if cache_key in self._cache:
+                cache_key = self._get_cache_key(**request_params)
+                if (entry := self._store.get(cache_key)) is not None:
                     logger.info(f"cache hit: {cache_key}")
-                    return Completion.from_dict(self._cache[cache_key]["data"])
+                    return Completion.from_dict(entry["data"])
                 else:
-                    self.report_closest_cache_key(cache_key, norm_params)
+                    self.report_closest_cache_key(cache_key, normalize(request_params))
                     logger.error(
                         f"Cache miss by {self.client.__class__.__name__}: {normalize(request_params)}"
                     )
@@ -319,5 +483,36 @@ class CachedLLM(AsyncLLM):
             case _:
                 raise ValueError(f"unknown cache mode: {self.cache_mode}")
 
+    async def stream_completion(
+        self,
+        messages: List[Message],
+        max_tokens: int = 8192,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[Tool] | None = None,
+        tool_choice: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[CompletionDelta | Completion]:
+        """Streams from the wrapped client when caching is off.
+
+        Cached modes store whole completions, so they yield only the final one.
+        """
+        request_params = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            **kwargs,
+        }
+        stream = getattr(self.client, "stream_completion", None)
+        if self.cache_mode == "off" and stream is not None:
+            async for item in stream(**request_params):
+                yield item
+            return
+        yield await self.completion(*args, **request_params)
+
     def __repr__(self):
         return f"CachedLLM(client={self.client.__class__.__name__})"
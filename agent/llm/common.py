@@ -1,4 +1,7 @@
 from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
     Literal,
     Protocol,
     Self,
@@ -174,6 +177,25 @@ class Completion:
         )
 
 
+@dataclass
+class CompletionDelta:
+    """Incremental piece of a completion as it is being generated.
+
+    Pieces with the same index extend the same content block. For tool_use
+    deltas, text is a fragment of the JSON input and the first delta of a
+    block carries the tool name and id.
+    """
+
+    kind: Literal["text", "thinking", "tool_use"]
+    index: int
+    text: str
+    name: str | None = None
+    id: str | None = None
+
+
+DeltaCallback: TypeAlias = Callable[[CompletionDelta], Awaitable[None]]
+
+
 class Tool(TypedDict, total=False):
     name: Required[str]
     description: str
@@ -202,3 +224,20 @@ class AsyncLLM(Protocol):
         *args,
         **kwargs,
     ) -> Completion: ...
+
+
+class StreamingLLM(AsyncLLM, Protocol):
+    def stream_completion(
+        self,
+        messages: list[Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[CompletionDelta | Completion]:
+        """Same request as completion; yields deltas as they arrive, then the final Completion."""
+        ...
@@ -1,14 +1,21 @@
-from typing import List
+import hashlib
+import mimetypes
+import time
+from typing import Any, AsyncIterator, List, cast
 
+import anyio
 from google import genai
 from google.genai import types as genai_types
 from google.genai.errors import ServerError, ClientError
 import os
+import ujson as json
 from llm import common
+from llm.rate_limit import backoff_sleep, report_rate_limited
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
 from tenacity import (
+    AsyncRetrying,
     retry,
     stop_after_attempt,
     wait_exponential_jitter,
@@ -30,6 +37,8 @@ class RetryableError(RuntimeError):
 def is_retryable_error(exception: BaseException) -> bool:
     """Check if the exception is retryable (rate limit or server error)."""
     if isinstance(exception, ClientError):
+        if exception.code == 429:
+            report_rate_limited()  # back off the shared limiter while this request retries
         # Retry on rate limits (429) and server errors (>=500)
         return exception.code == 429 or exception.code >= 500
     # Keep existing retry behavior for ServerError, RetryableError, and RuntimeError
@@ -41,22 +50,34 @@ retry_gemini_errors = retry(
     wait=wait_exponential_jitter(initial=1.5, max=30),
     retry=retry_if_exception(is_retryable_error),
     before_sleep=before_sleep_log(logger, logging.WARNING),
+    sleep=backoff_sleep,
     reraise=True,
 )
 
+# the Files API keeps uploads for 48 hours, stop reusing them a bit earlier
+UPLOAD_TTL = 47 * 3600
+UPLOAD_EXPIRY_MARGIN = 3600
+
 retry_file_upload = retry(
     stop=stop_after_attempt(5),
     wait=wait_exponential_jitter(initial=0.5, max=1.5),
     retry=retry_if_exception_type(ServerError),
     before_sleep=before_sleep_log(logger, logging.WARNING),
+    sleep=backoff_sleep,
     reraise=True,
 )
 
 
 class GeminiLLM(common.AsyncLLM):
     def __init__(
-        self, model_name: str, api_key: str | None = None, client_params: dict = {}
+        self,
+        model_name: str,
+        api_key: str | None = None,
+        client_params: dict = {},
+        inline_files_max_bytes: int | None = None,
     ):
+        """inline_files_max_bytes: attached files up to this size are sent as bytes
+        instead of uploaded, defaults to GEMINI_INLINE_FILES_MAX_BYTES or 0."""
         super().__init__()
 
         _client = genai.Client(
@@ -64,6 +85,14 @@ class GeminiLLM(common.AsyncLLM):
         )
         self._async_client = _client.aio
         self.model_name = model_name
+        self.inline_files_max_bytes = (
+            inline_files_max_bytes
+            if inline_files_max_bytes is not None
+            else int(os.getenv("GEMINI_INLINE_FILES_MAX_BYTES", "0"))
+        )
+        # content hash -> uploaded file and when to stop reusing it
+        self._uploads: dict[str, tuple[genai_types.File, float]] = {}
+        self._pending_uploads: dict[str, anyio.Event] = {}
 
     async def completion(
         self,
@@ -79,6 +108,91 @@ class GeminiLLM(common.AsyncLLM):
         *args,  # consume unused args passed down
         **kwargs,  # consume unused kwargs passed down
     ) -> common.Completion:
+        config = self._config(max_tokens, temperature, tools, tool_choice, system_prompt, force_tool_use)
+        gemini_messages = await self._messages_into(messages, attach_files)
+        return await self._generate_content_with_retry(gemini_messages, config)
+
+    async def stream_completion(
+        self,
+        messages: list[common.Message],
+        max_tokens: int | None = 8192,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        force_tool_use: bool = False,
+        attach_files: common.AttachedFiles | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[common.CompletionDelta | common.Completion]:
+        config = self._config(max_tokens, temperature, tools, tool_choice, system_prompt, force_tool_use)
+        gemini_messages = await self._messages_into(messages, attach_files)
+        started = False
+        # retry like completion, but only until the first delta was handed out
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(5),
+            wait=wait_exponential_jitter(initial=1.5, max=30),
+            retry=retry_if_exception(lambda e: not started and is_retryable_error(e)),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            sleep=backoff_sleep,
+            reraise=True,
+        ):
+            with attempt:
+                telemetry = LLMTelemetry()
+                telemetry.start_timing()
+                parts: list[genai_types.Part] = []
+                last = None
+                async for chunk in await self._async_client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=gemini_messages,
+                    config=config,
+                ):
+                    last = chunk
+                    if not chunk.candidates or not chunk.candidates[0].content:
+                        continue
+                    for part in chunk.candidates[0].content.parts or []:
+                        if delta := self._merge_part(parts, part):
+                            started = True
+                            yield delta
+                if last is None or not last.candidates:
+                    raise RetryableError(f"Empty streamed completion: {last}")
+                last.candidates[0].content = genai_types.Content(role="model", parts=parts)
+                self._log_telemetry(telemetry, last, config)
+                yield self._completion_from(last)
+
+    @staticmethod
+    def _merge_part(
+        parts: list[genai_types.Part], part: genai_types.Part
+    ) -> common.CompletionDelta | None:
+        """Fold a streamed part into parts, extending the previous text part of the same kind."""
+        if part.text:
+            kind = "thinking" if part.thought else "text"
+            if parts and parts[-1].text is not None and bool(parts[-1].thought) == bool(part.thought):
+                parts[-1] = parts[-1].model_copy(update={"text": parts[-1].text + part.text})
+            else:
+                parts.append(part)
+            return common.CompletionDelta(kind, len(parts) - 1, part.text)
+        if part.function_call and part.function_call.name:
+            parts.append(part)
+            return common.CompletionDelta(
+                "tool_use",
+                len(parts) - 1,
+                json.dumps(part.function_call.args or {}),
+                name=part.function_call.name,
+                id=part.function_call.id,
+            )
+        return None
+
+    @staticmethod
+    def _config(
+        max_tokens: int | None,
+        temperature: float,
+        tools: list[common.Tool] | None,
+        tool_choice: str | None,
+        system_prompt: str | None,
+        force_tool_use: bool,
+    ) -> genai_types.GenerateContentConfig:
         config = genai_types.GenerateContentConfig(
             max_output_tokens=max_tokens,
             temperature=temperature,
@@ -103,9 +217,7 @@ class GeminiLLM(common.AsyncLLM):
                         allowed_function_names=[tool_choice] if tool_choice else None,
                     )
                 )
-
-        gemini_messages = await self._messages_into(messages, attach_files)
-        return await self._generate_content_with_retry(gemini_messages, config)
+        return config
 
     @retry_gemini_errors
     async def _generate_content_with_retry(
@@ -121,7 +233,15 @@ class GeminiLLM(common.AsyncLLM):
             contents=gemini_messages,
             config=config,
         )
+        self._log_telemetry(telemetry, response, config)
+        return self._completion_from(response)
 
+    def _log_telemetry(
+        self,
+        telemetry: LLMTelemetry,
+        response: genai_types.GenerateContentResponse,
+        config: genai_types.GenerateContentConfig,
+    ):
         # Log telemetry - always call to ensure validation
         if hasattr(response, "usage_metadata"):
             usage = response.usage_metadata
@@ -148,17 +268,50 @@ class GeminiLLM(common.AsyncLLM):
                 provider="Gemini",
             )
 
-        return self._completion_from(response)
-
     async def upload_files(self, files: List[str]) -> List[genai_types.File]:
-        result = []
+        """Upload files concurrently, reusing earlier uploads of the same content."""
+        digests = []
         for f in files:
             if not os.path.exists(f):
                 raise FileNotFoundError(f"File {f} does not exist")
+            digests.append(hashlib.sha256(await anyio.Path(f).read_bytes()).hexdigest())
+
+        uploaded: dict[str, genai_types.File] = {}
+
+        async def upload(digest: str, file_path: str):
+            uploaded[digest] = await self._upload_cached(digest, file_path)
 
-            uploaded = await self._upload_single_file(f)
-            result.append(uploaded)
-        return result
+        async with anyio.create_task_group() as tg:
+            for digest, file_path in dict(zip(digests, files)).items():
+                tg.start_soon(upload, digest, file_path)
+        return [uploaded[digest] for digest in digests]
+
+    async def _upload_cached(self, digest: str, file_path: str) -> genai_types.File:
+        while True:
+            match self._uploads.get(digest):
+                case (uploaded, expires) if expires > time.time():
+                    return uploaded
+            if (pending := self._pending_uploads.get(digest)) is None:
+                break
+            # another request is uploading the same content; retry ourselves if it failed
+            await pending.wait()
+
+        pending = self._pending_uploads[digest] = anyio.Event()
+        try:
+            uploaded = await self._upload_single_file(file_path)
+            now = time.time()
+            self._uploads = {d: entry for d, entry in self._uploads.items() if entry[1] > now}
+            self._uploads[digest] = (uploaded, self._upload_expiry(uploaded))
+        finally:
+            del self._pending_uploads[digest]
+            pending.set()
+        return uploaded
+
+    @staticmethod
+    def _upload_expiry(uploaded: genai_types.File) -> float:
+        if uploaded.expiration_time is not None:
+            return uploaded.expiration_time.timestamp() - UPLOAD_EXPIRY_MARGIN
+        return time.time() + UPLOAD_TTL
 
     @retry_file_upload
     async def _upload_single_file(self, file_path: str) -> genai_types.File:
@@ -238,8 +391,8 @@ class GeminiLLM(common.AsyncLLM):
                         theirs_parts.append(genai_types.Part.from_text(text=text))
                     case common.ToolUse(name, input):
                         theirs_parts.append(
-                            genai_types.Part.from_function_call(name=name, args=input)
-                        )  # pyright: ignore
+                            genai_types.Part.from_function_call(name=name, args=cast(dict[str, Any], input))
+                        )
                     case common.ToolUseResult(tool_use, tool_result):
                         theirs_parts.append(
                             genai_types.Part.from_function_response(
@@ -259,15 +412,24 @@ class GeminiLLM(common.AsyncLLM):
             )
 
         if files:
-            uploaded = await self.upload_files(files.files)
-            files_parts = [
-                genai_types.Part.from_uri(
-                    file_uri=file.uri,
-                    mime_type=file.mime_type,
-                )
-                for file in uploaded
-                if file.uri and file.mime_type
-            ]
+            sizes = [os.path.getsize(f) if os.path.exists(f) else None for f in files.files]
+            inline = [size is not None and size <= self.inline_files_max_bytes for size in sizes]
+            uploaded = iter(
+                await self.upload_files([f for f, small in zip(files.files, inline) if not small])
+            )
+            files_parts = []
+            for f, small in zip(files.files, inline):
+                if small:
+                    files_parts.append(
+                        genai_types.Part.from_bytes(
+                            data=await anyio.Path(f).read_bytes(),
+                            mime_type=mimetypes.guess_type(f)[0] or "application/octet-stream",
+                        )
+                    )
+                elif (file := next(uploaded)).uri and file.mime_type:
+                    files_parts.append(
+                        genai_types.Part.from_uri(file_uri=file.uri, mime_type=file.mime_type)
+                    )
 
             match theirs_messages[-1].parts:
                 case list():
@@ -1,13 +1,20 @@
 """LLM-based generation utilities for app names and commit messages."""
 
+import asyncio
 import logging
 import re
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine
 
 from llm.utils import AsyncLLM
 from llm.common import Message, TextRaw
 
 logger = logging.getLogger(__name__)
 
+# generations started by precompute_*, per (generator, input, client)
+_precomputed: OrderedDict[tuple[str, str, AsyncLLM], asyncio.Task[str]] = OrderedDict()
+MAX_PRECOMPUTED = 256
+
 
 async def generate_app_name(prompt: str, llm_client: AsyncLLM) -> str:
     """Generate a GitHub repository name from the application description"""
@@ -90,3 +97,27 @@ Return ONLY the commit message, nothing else.""")
     except Exception as e:
         logger.exception(f"Error generating commit message: {e}")
         return "Initial commit"
+
+
+def _precompute(
+    generate: Callable[[str, AsyncLLM], Coroutine[Any, Any, str]], text: str, llm_client: AsyncLLM
+) -> asyncio.Task[str]:
+    key = (generate.__name__, text, llm_client)
+    task = _precomputed.get(key)
+    if task is None or task.cancelled():
+        task = asyncio.create_task(generate(text, llm_client))
+        _precomputed[key] = task
+        while len(_precomputed) > MAX_PRECOMPUTED:
+            _precomputed.popitem(last=False)
+    _precomputed.move_to_end(key)
+    return task
+
+
+def precompute_app_name(prompt: str, llm_client: AsyncLLM) -> asyncio.Task[str]:
+    """Start generating the app name in the background, or get the generation for this prompt and client"""
+    return _precompute(generate_app_name, prompt, llm_client)
+
+
+def precompute_commit_message(user_request: str, llm_client: AsyncLLM) -> asyncio.Task[str]:
+    """Start generating the commit message in the background, or get the generation for this request and client"""
+    return _precompute(generate_commit_message, user_request, llm_client)
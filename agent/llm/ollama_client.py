@@ -1,11 +1,14 @@
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
+import ujson as json
 import ollama
 from llm import common
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
 from tenacity import (
+    AsyncRetrying,
     retry,
+    retry_if_exception,
     stop_after_attempt,
     wait_exponential_jitter,
     before_sleep_log,
@@ -134,6 +137,74 @@ class OllamaLLM:
         *args,
         **kwargs,
     ) -> common.Completion:
+        request_params = self._request(messages, max_tokens, model, temperature, tools, system_prompt)
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        response = await self.client.chat(**request_params)
+        return self._finish(telemetry, request_params, response)
+
+    async def stream_completion(
+        self,
+        messages: List[common.Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[common.CompletionDelta | common.Completion]:
+        request_params = self._request(messages, max_tokens, model, temperature, tools, system_prompt)
+        started = False
+        # retry like completion, but only until the first delta was handed out
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential_jitter(initial=1, max=60, jitter=1),
+            retry=retry_if_exception(lambda e: not started),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            reraise=True,
+        ):
+            with attempt:
+                telemetry = LLMTelemetry()
+                telemetry.start_timing()
+                text: list[str] = []
+                tool_calls: list[Any] = []
+                response: Dict[str, Any] = {}
+                async for chunk in await self.client.chat(**request_params, stream=True):
+                    message = chunk.get("message") or {}
+                    if content := message.get("content"):
+                        text.append(content)
+                        started = True
+                        yield common.CompletionDelta("text", 0, content)
+                    for tool_call in message.get("tool_calls") or []:
+                        tool_calls.append(tool_call)
+                        function = tool_call.get("function") or {}
+                        started = True
+                        yield common.CompletionDelta(
+                            "tool_use",
+                            len(tool_calls),
+                            json.dumps(function.get("arguments", {})),
+                            name=function.get("name", ""),
+                        )
+                    if chunk.get("done"):
+                        response = {
+                            "prompt_eval_count": chunk.get("prompt_eval_count"),
+                            "eval_count": chunk.get("eval_count"),
+                        }
+                response["message"] = {"content": "".join(text), "tool_calls": tool_calls}
+                yield self._finish(telemetry, request_params, response)
+
+    def _request(
+        self,
+        messages: List[common.Message],
+        max_tokens: int,
+        model: str | None,
+        temperature: float,
+        tools: List[common.Tool] | None,
+        system_prompt: str | None,
+    ) -> Dict[str, Any]:
         chosen_model = model or self.default_model
         ollama_messages = self._messages_into(messages)
 
@@ -154,22 +225,22 @@ class OllamaLLM:
             request_params["tools"] = ollama_tools
 
         logger.info(f"Ollama request params: {request_params}")
-        telemetry = LLMTelemetry()
-        telemetry.start_timing()
-
-        response = await self.client.chat(**request_params)
+        return request_params
 
+    def _finish(
+        self, telemetry: LLMTelemetry, request_params: Dict[str, Any], response: Any
+    ) -> common.Completion:
         # log telemetry - ollama returns token counts in response dict
         # use None instead of 0 as default to trigger validation if tokens are missing
         input_tokens = response.get("prompt_eval_count")
         output_tokens = response.get("eval_count")
 
         telemetry.log_completion(
-            model=chosen_model,
+            model=request_params["model"],
             input_tokens=input_tokens,
             output_tokens=output_tokens,
-            temperature=temperature,
-            has_tools=ollama_tools is not None,
+            temperature=request_params["options"]["temperature"],
+            has_tools="tools" in request_params,
             provider="Ollama",
         )
 
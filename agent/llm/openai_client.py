@@ -15,19 +15,23 @@ Supports:
 
 from __future__ import annotations
 
-from typing import List, Dict, Any, Literal, cast
+from types import SimpleNamespace
+from typing import AsyncIterator, List, Dict, Any, Literal, cast
 from openai import AsyncOpenAI
 import json
 import os
 import logging
 from tenacity import (
+    AsyncRetrying,
     retry,
+    retry_if_exception,
     stop_after_attempt,
     wait_exponential_jitter,
     before_sleep_log,
 )
 from llm import common
 from llm.common import ToolUseResult
+from llm.rate_limit import backoff_sleep, is_rate_limit_error, report_rate_limited
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 
@@ -272,6 +276,7 @@ class OpenAILLM:
         stop=stop_after_attempt(3),
         wait=wait_exponential_jitter(initial=1, max=40, jitter=1),
         before_sleep=before_sleep_log(logger, logging.WARNING),
+        sleep=backoff_sleep,
         reraise=True,
     )
     async def completion(
@@ -286,6 +291,117 @@ class OpenAILLM:
         *args,
         **kwargs,
     ) -> common.Completion:
+        request = self._request(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        chosen_model = request["model"]
+
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        try:
+            response = await self.client.chat.completions.create(**request)
+        except Exception as e:
+            logger.error(
+                f"{self.provider_name} API error for model '{chosen_model}': {e}"
+            )
+            if is_rate_limit_error(e):
+                report_rate_limited()
+            raise
+
+        self._log_telemetry(telemetry, request, getattr(response, "usage", None))
+        return self._log_completion(self._completion_into(response))
+
+    async def stream_completion(
+        self,
+        messages: List[common.Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[common.CompletionDelta | common.Completion]:
+        request = self._request(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        request["stream"] = True
+        request["stream_options"] = {"include_usage": True}
+        started = False
+        # retry like completion, but only until the first delta was handed out
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential_jitter(initial=1, max=40, jitter=1),
+            retry=retry_if_exception(lambda e: not started),
+            before_sleep=before_sleep_log(logger, logging.WARNING),
+            sleep=backoff_sleep,
+            reraise=True,
+        ):
+            with attempt:
+                telemetry = LLMTelemetry()
+                telemetry.start_timing()
+                text: list[str] = []
+                tool_calls: dict[int, SimpleNamespace] = {}
+                finish_reason, usage = None, None
+                async for chunk in await self.client.chat.completions.create(**request):
+                    usage = getattr(chunk, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    finish_reason = choice.finish_reason or finish_reason
+                    for delta in self._deltas_from(choice.delta, text, tool_calls):
+                        started = True
+                        yield delta
+                self._log_telemetry(telemetry, request, usage)
+                # reassemble the response so subclasses' _completion_into applies as-is
+                message = SimpleNamespace(
+                    content="".join(text) or None,
+                    tool_calls=[tool_calls[i] for i in sorted(tool_calls)] or None,
+                )
+                response = SimpleNamespace(
+                    choices=[SimpleNamespace(message=message, finish_reason=finish_reason)],
+                    usage=usage,
+                )
+                yield self._log_completion(self._completion_into(response))
+
+    @staticmethod
+    def _deltas_from(
+        delta: Any, text: list[str], tool_calls: dict[int, SimpleNamespace]
+    ) -> List[common.CompletionDelta]:
+        """Accumulate a streamed chunk into text/tool_calls and report what it added.
+
+        Text is block 0, tool calls follow in their streamed order.
+        """
+        result = []
+        if delta.content:
+            text.append(delta.content)
+            result.append(common.CompletionDelta("text", 0, delta.content))
+        for tc in delta.tool_calls or []:
+            call = tool_calls.get(tc.index)
+            if call is None:
+                call = tool_calls[tc.index] = SimpleNamespace(
+                    id=tc.id, function=SimpleNamespace(name=tc.function.name, arguments="")
+                )
+                result.append(
+                    common.CompletionDelta("tool_use", 1 + tc.index, "", name=tc.function.name, id=tc.id)
+                )
+            if tc.function and tc.function.arguments:
+                call.function.arguments += tc.function.arguments
+                result.append(common.CompletionDelta("tool_use", 1 + tc.index, tc.function.arguments))
+        return result
+
+    def _request(
+        self,
+        messages: List[common.Message],
+        max_tokens: int,
+        model: str | None,
+        temperature: float,
+        tools: List[common.Tool] | None,
+        tool_choice: str | None,
+        system_prompt: str | None,
+    ) -> Dict[str, Any]:
         chosen_model = model or self.default_model
         openai_messages = self._messages_into(messages)
 
@@ -325,41 +441,31 @@ class OpenAILLM:
             f"tools={len(openai_tools) if openai_tools else 0} "
             f"{'tool_choice=' + tool_choice if tool_choice else ''}"
         )
+        return request
 
-        telemetry = LLMTelemetry()
-        telemetry.start_timing()
-
-        try:
-            response = await self.client.chat.completions.create(**request)
-        except Exception as e:
-            logger.error(
-                f"{self.provider_name} API error for model '{chosen_model}': {e}"
-            )
-            raise
-
+    def _log_telemetry(self, telemetry: LLMTelemetry, request: Dict[str, Any], usage: Any):
         # always log telemetry to ensure validation
-        if hasattr(response, "usage") and response.usage:
+        if usage:
             telemetry.log_completion(
-                model=chosen_model,
-                input_tokens=response.usage.prompt_tokens,
-                output_tokens=response.usage.completion_tokens,
-                temperature=temperature,
-                has_tools=openai_tools is not None,
+                model=request["model"],
+                input_tokens=usage.prompt_tokens,
+                output_tokens=usage.completion_tokens,
+                temperature=request["temperature"],
+                has_tools="tools" in request,
                 provider=self.provider_name,
             )
         else:
             # always call telemetry even without usage data - this will trigger validation errors
             telemetry.log_completion(
-                model=chosen_model,
+                model=request["model"],
                 input_tokens=None,
                 output_tokens=None,
-                temperature=temperature,
-                has_tools=openai_tools is not None,
+                temperature=request["temperature"],
+                has_tools="tools" in request,
                 provider=self.provider_name,
             )
 
-        completion = self._completion_into(response)
-
+    def _log_completion(self, completion: common.Completion) -> common.Completion:
         tool_use_blocks = [
             b for b in completion.content if isinstance(b, common.ToolUse)
         ]
@@ -0,0 +1,52 @@
+"""Coordination of concurrent requests sharing a provider-cached prompt prefix.
+
+Beam search sends siblings with the same history at once. Sent together, each
+of them pays for writing the prefix to the provider cache and none reads it.
+The coordinator lets the first request for a prefix lead; the others wait
+until the provider has processed the leader's prompt (its cache entry exists
+once the response starts) and then read the cached prefix.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+import anyio
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+class PrefixCacheCoordinator:
+    def __init__(self, max_wait: float = 60.0):
+        # followers go ahead anyway if the leader takes longer to start (e.g. retrying)
+        self.max_wait = max_wait
+        self._leaders: dict[str, anyio.Event] = {}
+
+    @asynccontextmanager
+    async def lead_or_follow(self, prefix_key: str) -> AsyncIterator[Callable[[], None] | None]:
+        """Yield a release callback when leading, None once a follower may go.
+
+        The leader calls release as soon as its prompt is cached; leaving the
+        context releases too, so failed leaders don't hold followers back.
+        """
+        if (warm := self._leaders.get(prefix_key)) is not None:
+            with anyio.move_on_after(self.max_wait) as scope:
+                await warm.wait()
+            if scope.cancelled_caught:
+                logger.warning(f"Prefix {prefix_key[:8]} not warmed in {self.max_wait}s, sending anyway")
+            yield None
+            return
+
+        warm = anyio.Event()
+        self._leaders[prefix_key] = warm
+
+        def release():
+            if self._leaders.get(prefix_key) is warm:
+                del self._leaders[prefix_key]
+            warm.set()
+
+        try:
+            yield release
+        finally:
+            release()
@@ -0,0 +1,329 @@
+"""Shared request budget per LLM backend and model.
+
+All clients get_llm_client returns for a (backend, model) pair go through one
+RateLimiter, so parallel handlers, beam siblings and concurrent sessions draw
+from the same budget instead of each finding the provider's limit by a 429:
+
+- token buckets for requests and tokens per minute, set with
+  LLM_<BACKEND>_RPM and LLM_<BACKEND>_TPM (unlimited when unset);
+- a concurrency limit adapted AIMD-style: it grows by one after a limit's
+  worth of calls without rate limiting and halves when the provider answers
+  429, up to LLM_<BACKEND>_MAX_CONCURRENCY;
+- waiting requests are admitted round-robin across sessions (trace ids), so
+  one session's fan-out doesn't starve the others.
+
+Clients retry 429s internally, so their retry predicates call
+report_rate_limited() to shrink the limit while they back off, and they sleep
+with backoff_sleep, which hands the slot back until the retry. Time spent
+waiting is reported with the completion telemetry.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, List
+
+import anyio
+
+from llm.common import (
+    AsyncLLM,
+    Completion,
+    CompletionDelta,
+    Message,
+    TextRaw,
+    Tool,
+    ToolUse,
+    ToolUseResult,
+)
+from llm.telemetry import queued_for
+from log import get_logger, get_trace_id
+
+logger = get_logger(__name__)
+
+# several retries of one burst shouldn't halve the limit several times
+DECREASE_INTERVAL = 2.0
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class RateLimits:
+    rpm: float | None = None
+    tpm: float | None = None
+    max_concurrency: int = 32
+    min_concurrency: int = 1
+
+    @classmethod
+    def from_env(cls, backend: str) -> "RateLimits":
+        prefix = f"LLM_{backend.upper()}_"
+        limits = cls()
+        if rpm := os.getenv(prefix + "RPM"):
+            limits.rpm = float(rpm)
+        if tpm := os.getenv(prefix + "TPM"):
+            limits.tpm = float(tpm)
+        if max_concurrency := os.getenv(prefix + "MAX_CONCURRENCY"):
+            limits.max_concurrency = int(max_concurrency)
+        return limits
+
+
+class TokenBucket:
+    """Refills per_minute units over a minute; takes may overdraw it."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until amount is available; requests above capacity wait for a full bucket."""
+        self._refill()
+        return max(0.0, min(amount, self.capacity) - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class _Slot:
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.rate_limited = False
+        self.held = True
+
+    def used(self, tokens: int):
+        """Settle the token budget with what the request actually used."""
+        if self.limiter._tokens is not None:
+            self.limiter._tokens.take(tokens - self.estimated_tokens)
+
+
+_current_slot: ContextVar[_Slot | None] = ContextVar("llm_rate_limit_slot", default=None)
+
+
+def report_rate_limited():
+    """Called by clients when the provider answers 429 to the current request."""
+    if (slot := _current_slot.get()) is not None and not slot.rate_limited:
+        slot.rate_limited = True
+        slot.limiter._decrease()
+
+
+async def backoff_sleep(seconds: float):
+    """Sleep between retries of a client, without holding the current request's slot."""
+    if (slot := _current_slot.get()) is None:
+        await anyio.sleep(seconds)
+    else:
+        await slot.limiter._backoff(slot, seconds)
+
+
+def is_rate_limit_error(exception: BaseException) -> bool:
+    return 429 in (getattr(exception, "status_code", None), getattr(exception, "code", None))
+
+
+class RateLimiter:
+    def __init__(self, name: str, limits: RateLimits):
+        self.name = name
+        self.limits = limits
+        self.limit = float(limits.max_concurrency)
+        self.active = 0
+        self._waiting: OrderedDict[str, deque[anyio.Event]] = OrderedDict()
+        self._requests = TokenBucket(limits.rpm) if limits.rpm else None
+        self._tokens = TokenBucket(limits.tpm) if limits.tpm else None
+        self._last_decrease = 0.0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[_Slot]:
+        started = time.monotonic()
+        await self._acquire(get_trace_id() or "default")
+        slot = _Slot(self, estimated_tokens)
+        try:
+            await self._wait_budget(estimated_tokens)
+            token = _current_slot.set(slot)
+            try:
+                with queued_for(time.monotonic() - started):
+                    yield slot
+            except BaseException as e:
+                if is_rate_limit_error(e):
+                    report_rate_limited()
+                raise
+            finally:
+                _current_slot.reset(token)
+            if not slot.rate_limited:
+                self._increase()
+        finally:
+            if slot.held:
+                self._release()
+
+    async def _backoff(self, slot: _Slot, seconds: float):
+        # the retry queues again behind the other sessions and is a new request for the buckets
+        slot.held = False
+        self._release()
+        await anyio.sleep(seconds)
+        await self._acquire(get_trace_id() or "default")
+        slot.held = True
+        await self._wait_budget(slot.estimated_tokens)
+
+    async def _acquire(self, session: str):
+        if self.active < self.limit and not self._waiting:
+            self.active += 1
+            return
+        admitted = anyio.Event()
+        self._waiting.setdefault(session, deque()).append(admitted)
+        try:
+            await admitted.wait()
+        except BaseException:
+            if admitted.is_set():
+                self._release()  # admitted as we were cancelled, pass the slot on
+            else:
+                queue = self._waiting[session]
+                queue.remove(admitted)
+                if not queue:
+                    del self._waiting[session]
+            raise
+
+    def _release(self):
+        self.active -= 1
+        self._admit()
+
+    def _admit(self):
+        while self._waiting and self.active < self.limit:
+            session, queue = next(iter(self._waiting.items()))
+            admitted = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(session)  # round-robin across sessions
+            else:
+                del self._waiting[session]
+            self.active += 1
+            admitted.set()
+
+    async def _wait_budget(self, estimated_tokens: int):
+        buckets = [(b, n) for b, n in ((self._requests, 1), (self._tokens, estimated_tokens)) if b is not None]
+        while buckets and (delay := max(b.delay(n) for b, n in buckets)) > 0:
+            await anyio.sleep(delay)
+        for bucket, amount in buckets:
+            bucket.take(amount)
+
+    def _increase(self):
+        self.limit = min(float(self.limits.max_concurrency), self.limit + 1 / self.limit)
+        self._admit()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.limits.min_concurrency), self.limit / 2)
+        logger.warning(f"Rate limited by {self.name}, concurrency limit lowered to {int(self.limit)}")
+
+
+_limiters: dict[tuple[str, str], RateLimiter] = {}
+
+
+def get_rate_limiter(backend: str, model_name: str) -> RateLimiter:
+    key = (backend, model_name)
+    if key not in _limiters:
+        _limiters[key] = RateLimiter(f"{backend}/{model_name}", RateLimits.from_env(backend))
+    return _limiters[key]
+
+
+def estimate_tokens(messages: List[Message], system_prompt: str | None = None) -> int:
+    """Rough input size of a request, before the provider counts it."""
+    chars = len(system_prompt or "")
+    for message in messages:
+        for block in message.content:
+            match block:
+                case TextRaw(text):
+                    chars += len(text)
+                case ToolUse(name, input):
+                    chars += len(name) + len(str(input))
+                case ToolUseResult(_, result):
+                    chars += len(result.content)
+    return chars // CHARS_PER_TOKEN
+
+
+class RateLimitedLLM(AsyncLLM):
+    """Wrapper running each request of a client in a slot of its backend's limiter."""
+
+    def __init__(self, client: AsyncLLM, limiter: RateLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    async def completion(
+        self,
+        messages: List[Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> Completion:
+        async with self.limiter.slot(estimate_tokens(messages, system_prompt)) as slot:
+            completion = await self.client.completion(
+                messages=messages,
+                max_tokens=max_tokens,
+                model=model,
+                temperature=temperature,
+                tools=tools,
+                tool_choice=tool_choice,
+                system_prompt=system_prompt,
+                *args,
+                **kwargs,
+            )
+            slot.used(completion.input_tokens + completion.output_tokens)
+        return completion
+
+    async def stream_completion(
+        self,
+        messages: List[Message],
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncIterator[CompletionDelta | Completion]:
+        async with self.limiter.slot(estimate_tokens(messages, system_prompt)) as slot:
+            if (stream := getattr(self.client, "stream_completion", None)) is None:
+                completion = await self.client.completion(
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    model=model,
+                    temperature=temperature,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    system_prompt=system_prompt,
+                    *args,
+                    **kwargs,
+                )
+                slot.used(completion.input_tokens + completion.output_tokens)
+                yield completion
+                return
+            async for item in stream(
+                messages=messages,
+                max_tokens=max_tokens,
+                model=model,
+                temperature=temperature,
+                tools=tools,
+                tool_choice=tool_choice,
+                system_prompt=system_prompt,
+                *args,
+                **kwargs,
+            ):
+                if isinstance(item, Completion):
+                    slot.used(item.input_tokens + item.output_tokens)
+                yield item
+
+    def __repr__(self):
+        return f"RateLimitedLLM(client={self.client!r}, limiter={self.limiter.name})"
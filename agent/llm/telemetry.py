@@ -6,7 +6,9 @@ import atexit
 import os
 import signal
 import threading
-from typing import Optional, Any, Dict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, Any, Dict
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -17,6 +19,50 @@ _cumulative_enabled = os.getenv("CUMULATIVE_TELEMETRY_LOG") is not None
 _stats_lock = threading.Lock()
 _call_count_since_save = 0
 
+# prompt cache usage per actor, see telemetry_actor
+_actor_stats: Dict[str, Dict[str, int]] = {}
+_current_actor: ContextVar[Optional[str]] = ContextVar("llm_telemetry_actor", default=None)
+_queue_wait: ContextVar[Optional[float]] = ContextVar("llm_telemetry_queue_wait", default=None)
+_latency_observer: ContextVar[Optional[Callable[[float], None]]] = ContextVar(
+    "llm_telemetry_latency_observer", default=None
+)
+
+
+@contextmanager
+def telemetry_actor(name: str) -> Iterator[None]:
+    """Attribute LLM calls made in this context, and tasks started from it, to an actor."""
+    token = _current_actor.set(name)
+    try:
+        yield
+    finally:
+        _current_actor.reset(token)
+
+
+@contextmanager
+def queued_for(seconds: float) -> Iterator[None]:
+    """Report the time a request waited for a rate limiter slot with its completion."""
+    token = _queue_wait.set(seconds)
+    try:
+        yield
+    finally:
+        _queue_wait.reset(token)
+
+
+@contextmanager
+def observe_latency(observer: Callable[[float], None]) -> Iterator[None]:
+    """Pass the duration of completions logged in this context to observer."""
+    token = _latency_observer.set(observer)
+    try:
+        yield
+    finally:
+        _latency_observer.reset(token)
+
+
+def actor_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Input tokens sent, written to and read from the prompt cache, per actor."""
+    with _stats_lock:
+        return {actor: dict(stats) for actor, stats in _actor_stats.items()}
+
 
 class LLMTelemetry:
     """Utility class for consistent LLM telemetry logging across providers."""
@@ -89,6 +135,20 @@ class LLMTelemetry:
         if provider:
             message_parts.insert(1, f"Provider: {provider}")
 
+        actor = _current_actor.get()
+        if actor is not None:
+            message_parts.insert(1, f"Actor: {actor}")
+            _accumulate_actor_stats(
+                actor,
+                input_for_total,
+                cache_creation_input_tokens or 0,
+                cache_read_input_tokens or 0,
+            )
+
+        queue_wait = _queue_wait.get()
+        if queue_wait is not None:
+            message_parts.append(f"Queue wait: {queue_wait:.2f}s")
+
         # add cached token info if available
         if cache_creation_input_tokens is not None:
             message_parts.append(
@@ -103,6 +163,9 @@ class LLMTelemetry:
 
         logger.info(" | ".join(message_parts))
 
+        if (observer := _latency_observer.get()) is not None:
+            observer(elapsed_time)
+
         # accumulate stats globally if enabled
         if _cumulative_enabled:
             _accumulate_stats(
@@ -112,6 +175,7 @@ class LLMTelemetry:
                 elapsed_time,
                 cache_creation_input_tokens or 0,
                 cache_read_input_tokens or 0,
+                queue_wait or 0.0,
             )
 
             # periodically save stats to avoid loss on unexpected termination
@@ -161,6 +225,7 @@ def _accumulate_stats(
     elapsed_time: float,
     cache_creation_tokens: int = 0,
     cache_read_tokens: int = 0,
+    queue_wait: float = 0.0,
 ) -> None:
     """accumulate telemetry stats for a model"""
     with _stats_lock:
@@ -172,6 +237,7 @@ def _accumulate_stats(
                 "total_time_seconds": 0.0,
                 "total_cache_creation_tokens": 0,
                 "total_cache_read_tokens": 0,
+                "total_queue_wait_seconds": 0.0,
             }
 
         _cumulative_stats[model]["total_calls"] += 1
@@ -180,6 +246,38 @@ def _accumulate_stats(
         _cumulative_stats[model]["total_time_seconds"] += elapsed_time
         _cumulative_stats[model]["total_cache_creation_tokens"] += cache_creation_tokens
         _cumulative_stats[model]["total_cache_read_tokens"] += cache_read_tokens
+        _cumulative_stats[model]["total_queue_wait_seconds"] += queue_wait
+
+
+def _accumulate_actor_stats(
+    actor: str,
+    input_tokens: int,
+    cache_creation_tokens: int,
+    cache_read_tokens: int,
+) -> None:
+    with _stats_lock:
+        stats = _actor_stats.setdefault(
+            actor,
+            {
+                "total_calls": 0,
+                "total_input_tokens": 0,
+                "total_cache_creation_tokens": 0,
+                "total_cache_read_tokens": 0,
+            },
+        )
+        stats["total_calls"] += 1
+        stats["total_input_tokens"] += input_tokens
+        stats["total_cache_creation_tokens"] += cache_creation_tokens
+        stats["total_cache_read_tokens"] += cache_read_tokens
+
+
+def _write_stats(log_file: str) -> None:
+    """write per-model stats to log_file and per-actor cache stats next to it; holds _stats_lock"""
+    with open(log_file, "w") as f:
+        json.dump(_cumulative_stats, f, indent=2)
+    if _actor_stats:
+        with open(os.path.splitext(log_file)[0] + ".actors.json", "w") as f:
+            json.dump(_actor_stats, f, indent=2)
 
 
 def save_cumulative_stats() -> None:
@@ -196,8 +294,7 @@ def save_cumulative_stats() -> None:
             return
 
         try:
-            with open(log_file, "w") as f:
-                json.dump(_cumulative_stats, f, indent=2)
+            _write_stats(log_file)
             logger.info(f"Saved cumulative telemetry stats to {log_file}")
         except Exception as e:
             logger.error(
@@ -219,8 +316,7 @@ def _periodic_save() -> None:
             return
 
         try:
-            with open(log_file, "w") as f:
-                json.dump(_cumulative_stats, f, indent=2)
+            _write_stats(log_file)
         except Exception as e:
             logger.error(
                 f"Failed to save cumulative telemetry stats to {log_file}: {e}"
@@ -1,9 +1,20 @@
+import dataclasses
 import itertools
 import os
 import re
 from typing import Literal, Dict
-from llm.common import AsyncLLM, Message, TextRaw, ContentBlock, ToolUse
+from llm.common import (
+    AsyncLLM,
+    Completion,
+    CompletionDelta,
+    DeltaCallback,
+    Message,
+    TextRaw,
+    ContentBlock,
+    ToolUse,
+)
 from llm.cached import CachedLLM, CacheMode
+from llm.rate_limit import RateLimitedLLM, get_rate_limiter
 from llm.models_config import ModelCategory, get_model_for_category
 from llm.providers import get_backend_for_model
 from llm.client import create_client
@@ -40,10 +51,36 @@ def extract_tag(source: str | None, tag: str):
     return None
 
 
+async def streamed_completion(
+    m_client: AsyncLLM,
+    on_delta: DeltaCallback | None = None,
+    **kwargs,
+) -> Completion:
+    """Completion that reports deltas to on_delta while it is generated.
+
+    Falls back to a plain completion when there is no callback or the client
+    has no stream_completion.
+    """
+    stream = getattr(m_client, "stream_completion", None)
+    if on_delta is None or stream is None:
+        return await m_client.completion(**kwargs)
+    completion = None
+    async for item in stream(**kwargs):
+        match item:
+            case CompletionDelta():
+                await on_delta(item)
+            case Completion():
+                completion = item
+    if completion is None:
+        raise RuntimeError(f"{m_client!r} stream ended without a completion")
+    return completion
+
+
 async def loop_completion(
     m_client: AsyncLLM,
     messages: list[Message],
     system_prompt: str | None = None,
+    on_delta: DeltaCallback | None = None,
     **kwargs,
 ) -> Message:
     content: list[ContentBlock] = []
@@ -53,8 +90,18 @@ async def loop_completion(
             if content
             else messages
         )
-        completion = await m_client.completion(
-            messages=payload, system_prompt=system_prompt, **kwargs
+
+        async def forward(delta: CompletionDelta, offset: int = len(content)):
+            # continuations append to the same message, keep block indices unique
+            assert on_delta is not None
+            await on_delta(dataclasses.replace(delta, index=delta.index + offset))
+
+        completion = await streamed_completion(
+            m_client,
+            forward if on_delta else None,
+            messages=payload,
+            system_prompt=system_prompt,
+            **kwargs,
         )
         content.extend(completion.content)
         # If the model returned any tool_use, stop immediately to allow tool_result to follow
@@ -118,10 +165,13 @@ def get_llm_client(
     # create new client
     logger.debug(f"Creating new LLM client for {backend}/{model_name}")
     client = create_client(backend, model_name, client_params)
+    # clients of the same backend and model share one request budget
+    client = RateLimitedLLM(client, get_rate_limiter(backend, model_name))
 
     # wrap with caching if enabled
     if cache_mode != "off":
         current_dir = os.path.dirname(__file__)
+        # CachedLLM keeps entries in the .jsonl next to it, migrating a legacy .json once
         cache_path = os.path.join(current_dir, "caches", f"{cache_key}.json")
         os.makedirs(os.path.dirname(cache_path), exist_ok=True)
         client = CachedLLM(
@@ -5,6 +5,7 @@ from typing import Callable, Awaitable
 from core.base_node import Node
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
+from core.validation_cache import cached_check
 from llm.common import AsyncLLM, Message, TextRaw, Tool, ToolUse, ToolUseResult
 from nicegui_agent import playbooks
 from core.notification_utils import notify_if_callback, notify_stage
@@ -28,8 +29,17 @@ class NiceguiActor(FileOperationsActor):
         event_callback: Callable[[str], Awaitable[None]] | None = None,
         databricks_host: str | None = None,
         databricks_token: str | None = None,
+        eval_concurrency: int = 1,
+        pipelined: bool = False,
     ):
-        super().__init__(llm, workspace, beam_width, max_depth)
+        super().__init__(
+            llm,
+            workspace,
+            beam_width,
+            max_depth,
+            eval_concurrency=eval_concurrency,
+            pipelined=pipelined,
+        )
         self.system_prompt = system_prompt
         self.event_callback = event_callback
 
@@ -66,8 +76,7 @@ class NiceguiActor(FileOperationsActor):
         logger.info(
             f"Start {self.__class__.__name__} execution with files: {files.keys()}"
         )
-        for file_path, content in files.items():
-            workspace.write_file(file_path, content)
+        await workspace.write_files(files)
         workspace.permissions(
             protected=self.files_protected, allowed=self.files_allowed
         )
@@ -92,52 +101,52 @@ class NiceguiActor(FileOperationsActor):
 
         solution: Node[BaseData] | None = None
         iteration = 0
-        while solution is None:
-            iteration += 1
-            candidates = self.select(self.root)
-            if not candidates:
-                logger.error("No candidates to evaluate, search terminated")
-                await notify_stage(
-                    self.event_callback,
-                    "❌ NiceGUI agent failed: No candidates to evaluate",
-                    "failed"
+        async with self.pipeline():
+            while solution is None:
+                iteration += 1
+                candidates = self.select(self.root)
+                if not candidates:
+                    logger.error("No candidates to evaluate, search terminated")
+                    await notify_stage(
+                        self.event_callback,
+                        "❌ NiceGUI agent failed: No candidates to evaluate",
+                        "failed"
+                    )
+                    raise AgentSearchFailedException(
+                        agent_name="NiceguiActor",
+                        message="No candidates to evaluate, search terminated"
+                    )
+
+                logger.info(
+                    f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
                 )
-                raise AgentSearchFailedException(
-                    agent_name="NiceguiActor",
-                    message="No candidates to evaluate, search terminated"
+                nodes = await self.run_llm(
+                    candidates,
+                    system_prompt=self.system_prompt,
+                    tools=self.tools,
+                    max_tokens=8192,
                 )
+                logger.info(f"Received {len(nodes)} nodes from LLM")
 
-            logger.info(
-                f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
-            )
-            nodes = await self.run_llm(
-                candidates,
-                system_prompt=self.system_prompt,
-                tools=self.tools,
-                max_tokens=8192,
-            )
-            logger.info(f"Received {len(nodes)} nodes from LLM")
-
-            for i, new_node in enumerate(nodes):
-                logger.info(f"Evaluating node {i + 1}/{len(nodes)}")
+                async def show_file_actions(new_node: Node[BaseData]):
+                    # show what actions are being taken
+                    file_actions = self._get_file_actions(new_node)
+                    await notify_if_callback(
+                        self.event_callback,
+                        f"💭 {file_actions}",
+                        "iteration progress",
+                    )
 
-                # show what actions are being taken
-                file_actions = self._get_file_actions(new_node)
-                await notify_if_callback(
-                    self.event_callback,
-                    f"💭 {file_actions}",
-                    "iteration progress",
+                solution = await self.eval_nodes(
+                    nodes, user_prompt, on_eval=show_file_actions
                 )
-
-                if await self.eval_node(new_node, user_prompt):
-                    logger.info(f"Found solution at depth {new_node.depth}")
+                if solution is not None:
+                    logger.info(f"Found solution at depth {solution.depth}")
                     await notify_stage(
                         self.event_callback,
                         "✅ NiceGUI application generated successfully",
                         "completed",
                     )
-                    solution = new_node
-                    break
         if solution is None:
             logger.error(f"{self.__class__.__name__} failed to find a solution")
             await notify_stage(
@@ -463,6 +472,7 @@ class NiceguiActor(FileOperationsActor):
             case _:
                 return await super().handle_custom_tool(tool_use, node)
 
+    @cached_check("type_check")
     async def run_type_checks(self, node: Node[BaseData]) -> str | None:
         type_check_result = await node.data.workspace.exec(
             ["uv", "run", "pyright", "."]
@@ -471,6 +481,7 @@ class NiceguiActor(FileOperationsActor):
             return f"{type_check_result.stdout}\n{type_check_result.stderr}"
         return None
 
+    @cached_check("lint")
     async def run_lint_checks(self, node: Node[BaseData]) -> str | None:
         lint_result = await node.data.workspace.exec(
             ["uv", "run", "ruff", "check", ".", "--fix"]
@@ -479,12 +490,14 @@ class NiceguiActor(FileOperationsActor):
             return f"{lint_result.stdout}\n{lint_result.stderr}"
         return None
 
+    @cached_check("tests")
     async def run_tests(self, node: Node[BaseData]) -> str | None:
         pytest_result = await node.data.workspace.exec_with_pg(["uv", "run", "pytest"])
         if pytest_result.exit_code != 0:
             return f"{pytest_result.stdout}\n{pytest_result.stderr}"
         return None
 
+    @cached_check("sqlmodel")
     async def run_sqlmodel_checks(self, node: Node[BaseData]) -> str | None:
         try:
             await node.data.workspace.read_file("app/database.py")
@@ -499,6 +512,7 @@ class NiceguiActor(FileOperationsActor):
             )
         return None
 
+    @cached_check("astgrep")
     async def run_astgrep_checks(self, node: Node[BaseData]) -> str | None:
         astgrep_result = await node.data.workspace.exec(
             ["uv", "run", "ast-grep", "scan", "app/", "tests/"]
@@ -603,6 +617,12 @@ class NiceguiActor(FileOperationsActor):
                     case "read_file":
                         path = block.input.get("path", "unknown") if isinstance(block.input, dict) else "unknown"
                         actions.append(f"Reading `{path}`")
+                    case "read_files":
+                        paths = block.input.get("paths", []) if isinstance(block.input, dict) else []
+                        actions.append(f"Reading {len(paths)} files")
+                    case "read_file_lines":
+                        path = block.input.get("path", "unknown") if isinstance(block.input, dict) else "unknown"
+                        actions.append(f"Reading `{path}`")
                     case "uv_add":
                         packages = block.input.get("packages", []) if isinstance(block.input, dict) else []
                         if packages:
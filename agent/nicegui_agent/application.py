@@ -1,18 +1,21 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass
 from core.statemachine import StateMachine, State, Context
 from core.application import BaseApplicationContext
-from core.dagger_utils import write_files_bulk
+from diff.template_files import diff_with_template
+from core.template_manifest import template_manifests
 from llm.utils import get_best_coding_llm_client, get_universal_llm_client
 from llm.alloy import AlloyLLM
 from core.actors import BaseData
 from core.base_node import Node
 from core.statemachine import MachineCheckpoint
 from core.workspace import Workspace
+from core.workspace_pool import workspace_pool
 from nicegui_agent.actors import NiceguiActor
 from nicegui_agent import playbooks
 import dagger
@@ -25,6 +28,36 @@ for package in ["urllib3", "httpx", "google_genai.models"]:
     logging.getLogger(package).setLevel(logging.WARNING)
 
 
+TEMPLATE_DIR = "./nicegui_agent/template"
+BASE_IMAGE = "alpine:3.21.3"
+SETUP_CMD = [
+    [
+        "apk",
+        "add",
+        "--update",
+        "--no-cache",
+        "curl",
+        "python3",
+        "nodejs",
+        "gcc",
+        "musl-dev",
+        "linux-headers",
+    ],  # node for pyright, gcc/musl-dev for building ast-grep-cli
+    [
+        "sh",
+        "-c",
+        "curl -LsSf https://astral.sh/uv/install.sh | XDG_BIN_HOME=/usr/local/bin sh",
+    ],
+    ["uv", "sync"],
+]
+
+workspace_pool.register(
+    "nicegui",
+    TEMPLATE_DIR,
+    lambda client, context: Workspace.base_container(client, BASE_IMAGE, context, SETUP_CMD),
+)
+
+
 class FSMState(str, enum.Enum):
     DATA_MODEL_GENERATION = "data_model_generation"
     REVIEW_DATA_MODEL = "review_data_model"
@@ -210,11 +243,10 @@ class FSMApplication:
             )
 
             # read all files again after modifications and update context
-            for file in ctx.files.keys():
-                if file.endswith(".py"):
-                    content = await result.data.workspace.read_file(file)
-                    if content is not None:
-                        ctx.files[file] = content
+            paths = [file for file in ctx.files.keys() if file.endswith(".py")]
+            for file, content in (await result.data.workspace.read_files(paths)).items():
+                if content is not None:
+                    ctx.files[file] = content
 
         if os.getenv("USE_ALLOY_LLM"):
             llm = AlloyLLM.from_models(
@@ -223,30 +255,15 @@ class FSMApplication:
         else:
             llm = get_best_coding_llm_client()
 
+        template, context = await template_manifests.snapshot(client, TEMPLATE_DIR)
         workspace = await Workspace.create(
             client=client,
-            base_image="alpine:3.21.3",
-            context=client.host().directory("./nicegui_agent/template"),
-            setup_cmd=[
-                [
-                    "apk",
-                    "add",
-                    "--update",
-                    "--no-cache",
-                    "curl",
-                    "python3",
-                    "nodejs",
-                    "gcc",
-                    "musl-dev",
-                    "linux-headers",
-                ],  # node for pyright, gcc/musl-dev for building ast-grep-cli
-                [
-                    "sh",
-                    "-c",
-                    "curl -LsSf https://astral.sh/uv/install.sh | XDG_BIN_HOME=/usr/local/bin sh",
-                ],
-                ["uv", "sync"],
-            ],
+            base_image=BASE_IMAGE,
+            context=context,
+            context_key=template.digest,
+            context_files=template.files,
+            setup_cmd=SETUP_CMD,
+            base=await workspace_pool.acquire(client, "nicegui"),
         )
 
         # Extract event_callback from settings if provided
@@ -266,6 +283,8 @@ class FSMApplication:
             workspace=workspace.clone(),
             beam_width=3,
             max_depth=50,
+            eval_concurrency=settings.get("eval_concurrency", 1),
+            pipelined=settings.get("pipelined_search", False),
             system_prompt=playbooks.get_data_model_system_prompt(
                 use_databricks=use_databricks
             ),
@@ -280,6 +299,8 @@ class FSMApplication:
             workspace=workspace.clone(),
             beam_width=3,
             max_depth=100,  # can be larger given every file change is a separate tool call,
+            eval_concurrency=settings.get("eval_concurrency", 1),
+            pipelined=settings.get("pipelined_search", False),
             system_prompt=playbooks.get_application_system_prompt(),
             event_callback=event_callback,
             databricks_host=databricks_host,
@@ -481,71 +502,29 @@ class FSMApplication:
         logger.info(
             f"SERVER get_diff_with: Received snapshot with {len(snapshot)} files."
         )
-
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
 
-        tree_snapshot = await start.with_exec(["tree"]).stdout()
-        logger.error(f"[ctr tree] [snapshot]\n{tree_snapshot}")
-
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory("./nicegui_agent/template")
-        start = start.with_directory(".", template_dir)
-        logger.info("SERVER get_diff_with: Added template directory to workspace")
-
-        tree_snapshot = await start.with_exec(["tree"]).stdout()
-        logger.error(f"[ctr tree] [template]\n{tree_snapshot}")
-
-        # Add FSM context files on top
-        start = await write_files_bulk(start, self.fsm.context.files, self.client)
-
-        tree_snapshot = await start.with_exec(["tree"]).stdout()
-        logger.error(f"[ctr tree] [fsm_context]\n{tree_snapshot}")
-        fsm_file_keys = list(self.fsm.context.files.keys())
-        logger.error(f"[fsm context] [files] {fsm_file_keys}")
-
-        logger.info(
-            "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
-        )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        # Same as committing the snapshot, copying the template and FSM context files over it and
+        # running `git add . && git diff HEAD`, without a git container
+        diff = await anyio.to_thread.run_sync(
+            diff_with_template, snapshot, self.template_path(), self.fsm.context.files
         )
         logger.info(
-            f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"
+            f"SERVER get_diff_with: Diff succeeded. Diff length: {len(diff)}"
         )
         if not diff:
             logger.warning(
                 "SERVER get_diff_with: Diff output is EMPTY. This might be expected if states match or an issue."
             )
-        diff_names_only = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD", "--name-only"])
-            .stdout()
-        )
-        logger.error(f"[diff] [names] {diff_names_only}")
 
         return diff
 
@@ -255,6 +255,8 @@ Use the following tools to manage files:
 1. **read_file** - Read the content of an existing file
    - Input: path (string)
    - Returns: File content
+   - To read several files, call **read_files** once with paths (list of strings) instead of read_file per file
+   - **read_file_lines** reads lines start to end (integers, 1-based) of a long file
 
 2. **write_file** - Create a new file or completely replace an existing file's content
    - Input: path (string), content (string)
@@ -9,6 +9,7 @@ from core.workspace import ExecResult
 from core.base_node import Node
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
+from core.validation_cache import cached_check
 from llm.common import AsyncLLM, Message, TextRaw, Tool, ToolUse, ToolUseResult
 from sam_agent import playbooks
 from core.postgres_utils import create_postgres_service, pg_health_check_cmd
@@ -99,8 +100,17 @@ class SamActor(FileOperationsActor):
         beam_width: int = 3,
         max_depth: int = 30,
         event_callback: Callable[[str, str], Awaitable[None]] | None = None,
+        eval_concurrency: int = 1,
+        pipelined: bool = False,
     ):
-        super().__init__(llm, workspace, beam_width, max_depth)
+        super().__init__(
+            llm,
+            workspace,
+            beam_width,
+            max_depth,
+            eval_concurrency=eval_concurrency,
+            pipelined=pipelined,
+        )
         self.vlm = vlm
         self.event_callback = event_callback
         # self.playwright = PlaywrightRunner(vlm)
@@ -131,7 +141,7 @@ class SamActor(FileOperationsActor):
 
         # Otherwise, proceed with normal generation
         # Update workspace with input files
-        self.workspace = self._create_workspace_with_permissions(files, [], [])
+        self.workspace = await self._create_workspace_with_permissions(files, [], [])
 
         # Determine what to generate based on existing files
         has_schema = any(
@@ -204,7 +214,7 @@ class SamActor(FileOperationsActor):
         )
 
         # Create workspace with input files and permissions
-        workspace = self._create_workspace_with_permissions(
+        workspace = await self._create_workspace_with_permissions(
             files,
             allowed=self.paths.files_allowed_draft + self.paths.files_allowed_frontend,
             protected=self.paths.files_protected_frontend,
@@ -394,7 +404,7 @@ class SamActor(FileOperationsActor):
         )
 
         # Create frontend workspace
-        workspace = self._create_workspace_with_permissions(
+        workspace = await self._create_workspace_with_permissions(
             draft_files,
             allowed=self.paths.files_allowed_frontend,
             protected=self.paths.files_protected_frontend,
@@ -440,30 +450,28 @@ class SamActor(FileOperationsActor):
         solution: Optional[Node[BaseData]] = None
         iteration = 0
 
-        while solution is None:
-            iteration += 1
-            candidates = self._select_candidates(root_node)
-            if not candidates:
-                logger.info("No candidates to evaluate, search terminated")
-                break
+        async with self.pipeline():
+            while solution is None:
+                iteration += 1
+                candidates = self._select_candidates(root_node)
+                if not candidates:
+                    logger.info("No candidates to evaluate, search terminated")
+                    break
 
-            logger.info(
-                f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
-            )
-            nodes = await self.run_llm(
-                candidates,
-                system_prompt=system_prompt,
-                tools=self.tools + (self.conditional_tools if conditional_tools else []),
-                max_tokens=8192,
-            )
-            logger.info(f"Received {len(nodes)} nodes from LLM")
+                logger.info(
+                    f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
+                )
+                nodes = await self.run_llm(
+                    candidates,
+                    system_prompt=system_prompt,
+                    tools=self.tools + (self.conditional_tools if conditional_tools else []),
+                    max_tokens=8192,
+                )
+                logger.info(f"Received {len(nodes)} nodes from LLM")
 
-            for i, new_node in enumerate(nodes):
-                logger.info(f"Evaluating node {i + 1}/{len(nodes)}")
-                if await self.eval_node(new_node, self._user_prompt):
-                    logger.info(f"Found solution at depth {new_node.depth}")
-                    solution = new_node
-                    break
+                solution = await self.eval_nodes(nodes, self._user_prompt)
+                if solution is not None:
+                    logger.info(f"Found solution at depth {solution.depth}")
 
         return solution
 
@@ -642,6 +650,7 @@ class SamActor(FileOperationsActor):
         )
         return True
 
+    @cached_check("py_backend")
     async def run_py_backend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for backend."""
         result = await node.data.workspace.exec(
@@ -652,6 +661,7 @@ class SamActor(FileOperationsActor):
             return f"Python errors (backend):\n{error_output}"
         return None
 
+    @cached_check("tsc_frontend")
     async def run_tsc_frontend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for frontend."""
         result = await node.data.workspace.exec(
@@ -662,6 +672,7 @@ class SamActor(FileOperationsActor):
             return f"TypeScript errors (frontend):\n{error_output}"
         return None
 
+    @cached_check("alembic")
     async def run_alembic_check(self, node: Node[BaseData]) -> str | None:
         """Run Alembic schema validation."""
         result = await alembic_push(
@@ -672,6 +683,7 @@ class SamActor(FileOperationsActor):
             return f"Alembic errors:\n{error_output} | {result.exit_code} | {result.stdout} | {result.stderr}"
         return None
 
+    @cached_check("build")
     async def run_build_check(self, node: Node[BaseData]) -> str | None:
         """Run frontend build check."""
         result = await node.data.workspace.exec(["make", "client-build"])
@@ -765,16 +777,14 @@ class SamActor(FileOperationsActor):
             return False
         return True
 
-    def _create_workspace_with_permissions(
+    async def _create_workspace_with_permissions(
         self,
         files: dict[str, str],
         allowed: list[str],
         protected: list[str] | None = None,
     ) -> Workspace:
         """Create workspace with files and permissions."""
-        workspace = self.workspace.clone()
-        for file_path, content in files.items():
-            workspace.write_file(file_path, content)
+        workspace = await self.workspace.clone().write_files(files)
         return workspace.permissions(allowed=allowed, protected=protected or [])
 
     async def _build_context(
@@ -817,15 +827,11 @@ class SamActor(FileOperationsActor):
             case _:
                 raise ValueError(f"Unknown context type: {context_type}")
 
-        # Add relevant files to context
-        for path in relevant_files:
-            try:
-                content = await workspace.read_file(path)
+        # Add relevant files to context, read at once; files that don't exist are skipped
+        for path, content in (await workspace.read_files(relevant_files)).items():
+            if content is not None:
                 context.append(f'\n<file path="{path}">\n{content.strip()}\n</file>\n')
                 logger.debug(f"Added {path} to context")
-            except Exception:
-                # File might not exist, skip it
-                pass
 
         # Add UI components info for frontend/edit contexts
         if context_type in ["frontend", "edit"]:
@@ -861,11 +867,9 @@ class SamActor(FileOperationsActor):
         self.handler_nodes = {}
 
         # Set up workspace with inherited files
-        workspace = self.workspace.clone()
-        for file in self.paths.files_inherit_handlers:
-            if file in draft_files:
-                workspace.write_file(file, draft_files[file])
-                logger.debug(f"Copied inherited file: {file}")
+        inherited = {f: draft_files[f] for f in self.paths.files_inherit_handlers if f in draft_files}
+        workspace = await self.workspace.clone().write_files(inherited)
+        logger.debug(f"Copied inherited files: {list(inherited)}")
 
         # Template will be rendered per handler
 
@@ -0,0 +1,90 @@
+import anyio
+import pytest
+
+from llm.alloy import MIN_HEDGE_SAMPLES, AlloyLLM
+from llm.common import AsyncLLM, Completion, Message, TextRaw
+from llm.telemetry import LLMTelemetry
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class TimedLLM(AsyncLLM):
+    """Stub answering after delay, or once gate is set, logging telemetry like the provider clients."""
+
+    def __init__(self, name: str, delay: float, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.gate: anyio.Event | None = None
+        self.calls = 0
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        self.calls += 1
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+        if self.gate is not None:
+            await self.gate.wait()
+        else:
+            await anyio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        telemetry.log_completion(model=self.name, input_tokens=1, output_tokens=1)
+        return Completion(role="assistant", content=[TextRaw(self.name)], input_tokens=1,
+                          output_tokens=1, stop_reason="end_turn")
+
+
+def _messages() -> list[Message]:
+    return [Message(role="user", content=[TextRaw("Hello")])]
+
+
+async def test_latency_strategy_prefers_fastest_model():
+    slow, fast = TimedLLM("slow", 0.03), TimedLLM("fast", 0.001)
+    alloy = AlloyLLM.from_models([slow, fast], selection_strategy="latency")
+    for _ in range(6):
+        await alloy.completion(messages=_messages(), max_tokens=10)
+    # both are tried once, then the fast one takes the traffic
+    assert slow.calls == 1
+    assert fast.calls == 5
+
+
+async def test_latency_strategy_avoids_failing_model():
+    broken, working = TimedLLM("broken", 0.0, fail=True), TimedLLM("working", 0.01)
+    alloy = AlloyLLM.from_models([broken, working], selection_strategy="latency")
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            await alloy.completion(messages=_messages(), max_tokens=10)
+    assert not alloy.stats[0].healthy
+
+    completion = await alloy.completion(messages=_messages(), max_tokens=10)
+    assert list(completion.content) == [TextRaw("working")]
+
+
+async def test_hedge_takes_the_faster_answer():
+    primary, backup = TimedLLM("primary", 0), TimedLLM("backup", 0)
+    alloy = AlloyLLM.from_models([primary, backup], selection_strategy="latency", hedge=True)
+    for stats, latency in zip(alloy.stats, (0.001, 0.002)):
+        for _ in range(MIN_HEDGE_SAMPLES):
+            stats.record_latency(latency)
+    assert alloy.stats[0].p90 == 0.001
+
+    primary.gate = anyio.Event()  # never set: primary stalls, backup answers once hedged
+    with anyio.fail_after(5):
+        completion = await alloy.completion(messages=_messages(), max_tokens=10)
+    assert list(completion.content) == [TextRaw("backup")]
+    assert primary.calls == 1 and backup.calls == 1
+
+
+async def test_hedge_on_primary_failure():
+    primary, backup = TimedLLM("primary", 0.001), TimedLLM("backup", 0.002)
+    alloy = AlloyLLM.from_models([primary, backup], selection_strategy="latency", hedge=True)
+    for _ in range(6):
+        await alloy.completion(messages=_messages(), max_tokens=10)
+
+    primary.fail = True
+    completion = await alloy.completion(messages=_messages(), max_tokens=10)
+    assert list(completion.content) == [TextRaw("backup")]
@@ -2,6 +2,7 @@ import os
 import pytest
 from unittest.mock import AsyncMock, MagicMock, Mock
 import dagger
+from trpc_agent import application as trpc_application
 from trpc_agent.application import FSMApplication
 from core.statemachine import StateMachine
 from log import get_logger
@@ -206,20 +207,19 @@ async def test_get_diff_with_removed_files():
         # prominently featured in the diff output
 
 @pytest.mark.anyio
-async def test_get_diff_with_exception_handling():
+async def test_get_diff_with_exception_handling(monkeypatch):
     """Test error handling when something goes wrong during diff generation"""
-    # Mock the dagger client instead of creating a real connection
-    mock_client = Mock()
-    mock_container = Mock()
-    mock_client.container.return_value.from_.return_value.with_workdir.return_value = mock_container
-    mock_container.with_exec.side_effect = Exception("Test diff error")
-    
-    fsm_application = FSMApplication(mock_client, create_mock_fsm())
-    
-    # Verify that an exception is raised
-    with pytest.raises(Exception) as exc_info:
+    def failing_diff(snapshot, template_path, files, exclude=None):
+        raise ValueError("Test diff error")
+
+    # the diff is computed in process, in a worker thread
+    monkeypatch.setattr(trpc_application, "diff_with_template", failing_diff)
+    fsm_application = FSMApplication(Mock(), create_mock_fsm())
+
+    # Verify that the exception reaches the caller
+    with pytest.raises(ValueError) as exc_info:
         await fsm_application.get_diff_with({})
-    
+
     assert "Test diff error" in str(exc_info.value)
 
 @pytest.mark.anyio
@@ -0,0 +1,155 @@
+import anyio
+import pytest
+from core.actors import BaseData, FileOperationsActor, _pipeline
+from core.base_node import Node
+from llm.common import Message, TextRaw, ToolUse
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class StubActor(FileOperationsActor):
+    """Evaluates nodes by sleeping; a node passes if its text is 'pass'."""
+
+    def __init__(self, delays: dict[str, float], eval_concurrency: int):
+        super().__init__(None, None, fast_llm=object(), eval_concurrency=eval_concurrency)  # pyright: ignore[reportArgumentType]
+        self.delays = delays
+        self.started: list[str] = []
+        self.finished: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def eval_node(self, node: Node[BaseData], user_prompt: str) -> bool:
+        name = node._id
+        self.started.append(name)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await anyio.sleep(self.delays[name])
+        finally:
+            self.in_flight -= 1
+        self.finished.append(name)
+        return list(node.data.messages[0].content) == [TextRaw("pass")]
+
+    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+        return None
+
+    async def execute(self, *args, **kwargs):
+        pass
+
+
+def make_nodes(*specs: tuple[str, str]) -> list[Node[BaseData]]:
+    return [
+        Node(BaseData(None, [Message(role="assistant", content=[TextRaw(text)])]), id=name)  # pyright: ignore[reportArgumentType]
+        for name, text in specs
+    ]
+
+
+async def test_sequential_eval_stops_at_first_pass():
+    actor = StubActor({"a": 0, "b": 0, "c": 0}, eval_concurrency=1)
+    nodes = make_nodes(("a", "fail"), ("b", "pass"), ("c", "pass"))
+    solution = await actor.eval_nodes(nodes, "prompt")
+    assert solution is nodes[1]
+    assert actor.started == ["a", "b"]
+
+
+async def test_concurrent_eval_cancels_losers():
+    actor = StubActor({"slow": 5, "fast": 0.01, "failing": 0}, eval_concurrency=3)
+    nodes = make_nodes(("slow", "pass"), ("fast", "pass"), ("failing", "fail"))
+    with anyio.fail_after(2):
+        solution = await actor.eval_nodes(nodes, "prompt")
+    assert solution is nodes[1]
+    assert "slow" in actor.started and "slow" not in actor.finished
+
+
+async def test_concurrent_eval_respects_limit():
+    actor = StubActor({str(i): 0.01 for i in range(6)}, eval_concurrency=2)
+    nodes = make_nodes(*[(str(i), "fail") for i in range(6)])
+    assert await actor.eval_nodes(nodes, "prompt") is None
+    assert len(actor.finished) == 6
+    assert actor.max_in_flight == 2
+
+
+async def test_parallel_searches_have_their_own_limit():
+    actor = StubActor({str(i): 0.05 for i in range(4)}, eval_concurrency=2)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(actor.eval_nodes, make_nodes(("0", "fail"), ("1", "fail")), "prompt")
+        tg.start_soon(actor.eval_nodes, make_nodes(("2", "fail"), ("3", "fail")), "prompt")
+    assert actor.max_in_flight == 4
+
+
+class FakeWorkspace:
+    def __init__(self, ctr: object):
+        self.ctr = ctr
+
+    def clone(self) -> "FakeWorkspace":
+        return FakeWorkspace(self.ctr)
+
+
+class CountingActor(FileOperationsActor):
+    def __init__(self):
+        super().__init__(None, None, fast_llm=object(), pipelined=True)  # pyright: ignore[reportArgumentType]
+        self.checked: list[object] = []
+        self.gate: anyio.Event | None = None
+
+    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+        self.checked.append(node.data.workspace.ctr)
+        if self.gate is not None:
+            await self.gate.wait()
+        else:
+            await anyio.sleep(0.01)
+        return "tsc failed"
+
+    async def execute(self, *args, **kwargs):
+        pass
+
+
+def complete_node(parent: Node[BaseData], workspace: FakeWorkspace) -> Node[BaseData]:
+    message = Message(role="assistant", content=[ToolUse("complete", {}, "tool-1")])
+    node = Node(BaseData(workspace, [message]), parent=parent)  # pyright: ignore[reportArgumentType]
+    parent.children.append(node)
+    return node
+
+
+async def test_pipelined_complete_reuses_speculative_checks():
+    actor = CountingActor()
+    write = Message(role="assistant", content=[TextRaw("wrote files")])
+    parent = Node(BaseData(FakeWorkspace("ctr-1"), [write], {"a.ts": "x"}))  # pyright: ignore[reportArgumentType]
+    async with actor.pipeline():
+        actor._speculate_checks(parent, "prompt")
+        unchanged = complete_node(parent, parent.data.workspace.clone())  # pyright: ignore[reportArgumentType]
+        changed = complete_node(parent, FakeWorkspace("ctr-2"))
+        assert not await actor.eval_node(unchanged, "prompt")
+        assert not await actor.eval_node(changed, "prompt")
+    # one speculative run for the parent state, one real run for the changed child
+    assert actor.checked == ["ctr-1", "ctr-2"]
+    [result] = unchanged.data.messages[-1].content
+    assert result.tool_result.content == "tsc failed"  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def test_speculative_checks_are_bounded_and_dropped_once_settled():
+    actor = CountingActor()
+    actor.gate = anyio.Event()
+    write = Message(role="assistant", content=[TextRaw("wrote files")])
+    parents = [Node(BaseData(FakeWorkspace(f"ctr-{i}"), [write], {"a.ts": "x"})) for i in range(3)]  # pyright: ignore[reportArgumentType]
+    async with actor.pipeline():
+        for parent in parents:
+            actor._speculate_checks(parent, "prompt")
+        await anyio.wait_all_tasks_blocked()
+        assert actor.checked == ["ctr-0"]  # eval_concurrency of 1
+
+        # the only child of the first parent is evaluated, nothing can reuse its checks
+        child = Node(BaseData(FakeWorkspace("ctr-3"), [write], {"b.ts": "y"}), parent=parents[0])  # pyright: ignore[reportArgumentType]
+        parents[0].children.append(child)
+        actor._settle_speculation(child)
+        await anyio.wait_all_tasks_blocked()
+        pipeline = _pipeline.get()
+        assert pipeline is not None
+        spec = pipeline.checks[parents[0]._id]
+        assert spec.done.is_set() and spec.failed
+        assert actor.checked == ["ctr-0", "ctr-1"]
+        actor.gate.set()
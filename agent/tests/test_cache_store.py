@@ -0,0 +1,114 @@
+import pytest
+import ujson as json
+from llm.cache_store import CacheStore
+from llm.cached import CachedLLM, ClosestRequestIndex, message_digest, normalize, params_key, request_key
+from llm.common import Completion, Message, TextRaw, ToolUse, ToolUseResult
+from tests.test_cached_llm import StubLLM
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+async def test_store_appends_and_sees_other_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(CacheStore, "COMPACT_MIN_STALE", 2)
+    writer = CacheStore(tmp_path / "cache.jsonl")
+    reader = CacheStore(tmp_path / "cache.jsonl")  # e.g. another xdist worker
+    assert reader.get("a") is None
+
+    writer.append("a", {"v": 1})
+    writer.append("b", {"v": 2})
+    assert reader.get("b") == {"v": 2}  # lookups pick up appends from other writers
+
+    writer.append("a", {"v": 3})
+    assert reader.get("a") == {"v": 3}
+    size = (tmp_path / "cache.jsonl").stat().st_size
+
+    writer.append("a", {"v": 4})  # second stale line triggers compaction
+    assert (tmp_path / "cache.jsonl").stat().st_size < size
+    assert len((tmp_path / "cache.jsonl").read_text().splitlines()) == 2
+    assert reader.get("a") == {"v": 4}
+    assert dict(reader.items()) == {"a": {"v": 4}, "b": {"v": 2}}
+
+
+async def test_cached_llm_migrates_legacy_json_and_records(tmp_path):
+    messages = [Message(role="user", content=[TextRaw("hello")])]
+    legacy_path = tmp_path / "cache.json"
+
+    recorder = CachedLLM(StubLLM(), cache_path=str(legacy_path), cache_mode="record")
+    recorded = await recorder.completion(messages=messages, max_tokens=10)
+    assert not legacy_path.exists()
+    # write what older versions produced and drop the new store to force a migration
+    legacy_path.write_text(json.dumps(dict(CacheStore(tmp_path / "cache.jsonl").items()), indent=2))
+    (tmp_path / "cache.jsonl").unlink()
+
+    replay_client = StubLLM()
+    replayer = CachedLLM(replay_client, cache_path=str(legacy_path), cache_mode="replay")
+    assert (tmp_path / "cache.jsonl").exists()
+    assert await replayer.completion(messages=messages, max_tokens=10) == recorded
+    assert replay_client.calls == 0
+
+    lru_client = StubLLM()
+    lru = CachedLLM(lru_client, cache_path=str(legacy_path), cache_mode="lru", max_cache_size=1)
+    assert await lru.completion(messages=messages, max_tokens=10) == recorded
+    other = [Message(role="user", content=[TextRaw("other")])]
+    await lru.completion(messages=other, max_tokens=10)
+    assert lru_client.calls == 1
+    # lru responses stay in memory, the recorded store is untouched
+    assert len(CacheStore(tmp_path / "cache.jsonl")) == 1
+
+
+async def test_request_key_matches_key_from_stored_params(tmp_path):
+    tools = [{"name": "noop", "description": "", "input_schema": {"type": "object"}}]
+    messages = [
+        Message(role="user", content=[TextRaw("hello")]),
+        Message(role="assistant", content=[ToolUse("noop", {"x": 1}, "id-1")]),
+        Message(role="user", content=[ToolUseResult.from_tool_use(ToolUse("noop", {"x": 1}, "id-1"), "done")]),
+    ]
+    # as CachedLLM.completion passes them on
+    params = {"messages": messages, "tools": tools, "max_tokens": 10, "model": None, "temperature": 1.0, "tool_choice": None}
+    key = request_key(**params)
+    assert key == params_key(normalize(params))
+    assert request_key(**params) == key  # memoized digests give the same key
+
+    messages[0].content = [TextRaw("changed")]
+    assert request_key(**params) == params_key(normalize(params)) != key
+
+    # a store recorded with whole-request md5 keys is rekeyed on open
+    legacy = {"data": {"role": "assistant", "content": [], "input_tokens": 0, "output_tokens": 0, "stop_reason": "end_turn"}, "params": normalize(params)}
+    (tmp_path / "cache.json").write_text(json.dumps({"old-key": legacy}))
+    replay = CachedLLM(StubLLM(), cache_path=str(tmp_path / "cache.json"), cache_mode="replay")
+    assert await replay.completion(**params) == Completion.from_dict(legacy["data"])
+
+
+async def test_message_digest_sees_in_place_changes():
+    message = Message(role="user", content=[TextRaw("a"), TextRaw("b")])
+    for i in range(100):
+        message_digest(message)
+        # the popped block is freed, a new block may get its id
+        message.content.pop()  # pyright: ignore[reportAttributeAccessIssue]
+        message.content.append(TextRaw(f"c{i}"))  # pyright: ignore[reportAttributeAccessIssue]
+        expected = Message(role="user", content=[TextRaw("a"), TextRaw(f"c{i}")])
+        assert message_digest(message) == message_digest(expected)
+
+
+async def test_closest_request_index_finds_divergence_point():
+    def params(texts, max_tokens=10):
+        messages = [Message(role="user", content=[TextRaw(t)]) for t in texts]
+        return normalize({"messages": messages, "max_tokens": max_tokens, "temperature": 1.0})
+
+    index = ClosestRequestIndex([
+        ("short", params(["a", "b"])),
+        ("long", params(["a", "b", "c", "d"])),
+        ("long-20", params(["a", "b", "c", "d"], max_tokens=20)),
+        ("other", params(["x", "y", "z"])),
+    ])
+    assert ClosestRequestIndex().closest(params(["a"])) is None
+
+    assert index.closest(params(["a", "b", "c", "e"])) == ("long", 3, [])
+    assert index.closest(params(["a", "b", "c", "d"], max_tokens=20)) == ("long-20", 4, [])
+    # same prefix, differs only in params
+    assert index.closest(params(["x", "y", "z"], max_tokens=30)) == ("other", 3, ["max_tokens"])
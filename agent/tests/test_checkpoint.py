@@ -0,0 +1,145 @@
+import pytest
+from core import checkpoint
+from core.actors import BaseActor, BaseData, FileOperationsActor
+from core.base_node import Node
+from llm.common import Message, TextRaw
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeWorkspace:
+    def __init__(self, files: dict[str, str] | None = None):
+        self.files = dict(files or {})
+        self.clones = 0
+
+    def clone(self) -> "FakeWorkspace":
+        self.clones += 1
+        return FakeWorkspace(self.files)
+
+    def write_file(self, path: str, content: str) -> "FakeWorkspace":
+        self.files[path] = content
+        return self
+
+    def rm(self, path: str) -> "FakeWorkspace":
+        del self.files[path]
+        return self
+
+    async def apply_files(self, files: dict[str, str | None]) -> "FakeWorkspace":
+        self.bulk_writes = getattr(self, "bulk_writes", 0) + 1
+        for path, content in files.items():
+            if content is None:
+                self.files.pop(path, None)
+            else:
+                self.files[path] = content
+        return self
+
+
+class TreeActor(BaseActor):
+    def __init__(self, workspace: FakeWorkspace, root: Node[BaseData] | None = None):
+        self.workspace = workspace  # pyright: ignore[reportAttributeAccessIssue]
+        self.root = root
+
+    async def execute(self, *args, **kwargs):
+        pass
+
+    async def dump(self) -> object:
+        assert self.root is not None
+        return await self.dump_node(self.root)
+
+    async def load(self, data: object):
+        self.root = await self.load_node(data)  # pyright: ignore[reportArgumentType]
+
+
+def make_tree() -> Node[BaseData]:
+    prompt = Message(role="user", content=[TextRaw("build a todo app " * 50)])
+    schema = "export const todos = pgTable('todos', {});\n" * 20
+    root = Node(BaseData(FakeWorkspace(), [prompt]))  # pyright: ignore[reportArgumentType]
+    for i in range(3):
+        reply = Message(role="assistant", content=[TextRaw(f"attempt {i}"), TextRaw("same long explanation " * 20)])
+        child = Node(BaseData(FakeWorkspace(), [reply], {"schema.ts": schema, "old.ts": None}), parent=root)  # pyright: ignore[reportArgumentType]
+        root.children.append(child)
+    return root
+
+
+async def test_blobs_are_stored_once():
+    actor = TreeActor(FakeWorkspace(), make_tree())
+    with checkpoint.use_blobs(checkpoint.BlobTable()) as table:
+        dumped = await actor.dump()
+    # prompt, schema and the shared explanation block; short blocks stay inline
+    assert len(table.blobs) == 3
+    children = [item for item in dumped if item["parent"]]  # pyright: ignore[reportGeneralTypeIssues]
+    assert len({str(item["data"]["files"]["schema.ts"]) for item in children}) == 1
+    assert checkpoint.is_ref(children[0]["data"]["files"]["schema.ts"])
+
+    base = FakeWorkspace({"old.ts": "x", "index.ts": "y"})
+    loaded = TreeActor(base)
+    with checkpoint.use_blobs(checkpoint.BlobTable(table.blobs)):
+        await loaded.load(dumped)
+    assert loaded.root is not None
+    assert loaded.root.data.messages == actor.root.data.messages  # pyright: ignore[reportOptionalMemberAccess]
+    child = loaded.root.children[0]
+    assert child.data.files == actor.root.children[0].data.files  # pyright: ignore[reportOptionalMemberAccess]
+
+    # workspaces are only built for nodes that are used
+    assert base.clones == 0 and not child.data.is_materialized
+    assert child.data.workspace.files == {"index.ts": "y", "schema.ts": child.data.files["schema.ts"]}  # pyright: ignore[reportAttributeAccessIssue]
+    assert not loaded.root.data.is_materialized
+    assert not loaded.root.children[1].data.is_materialized
+
+
+async def test_inline_checkpoints_still_load():
+    actor = TreeActor(FakeWorkspace(), make_tree())
+    dumped = await actor.dump()  # no blob table: legacy inline format
+    loaded = TreeActor(FakeWorkspace())
+    await loaded.load(dumped)
+    assert loaded.root is not None
+    original = {node._id: node for node in actor.root.get_all_children()}  # pyright: ignore[reportOptionalMemberAccess]
+    for node in loaded.root.get_all_children():
+        assert node.data.messages == original[node._id].data.messages
+        assert node.data.files == original[node._id].data.files
+
+
+async def test_materialize_folds_trajectory_into_one_bulk_write():
+    root = Node(BaseData(FakeWorkspace(), [Message(role="user", content=[TextRaw("go")])]))  # pyright: ignore[reportArgumentType]
+    parent = root
+    for depth in range(4):
+        files: dict[str, str | None] = {f"file{depth}.ts": f"v{depth}", "shared.ts": f"shared{depth}"}
+        if depth == 3:
+            files["file0.ts"] = None
+        node = Node(BaseData(FakeWorkspace(), [Message(role="assistant", content=[TextRaw(str(depth))])], files), parent=parent)  # pyright: ignore[reportArgumentType]
+        parent.children.append(node)
+        parent = node
+
+    loaded = TreeActor(FakeWorkspace({"index.ts": "y"}))
+    await loaded.load(await TreeActor(FakeWorkspace(), root).dump())
+    assert loaded.root is not None
+    leaf = loaded.root.get_all_children()[-1]
+    workspace = await leaf.data.materialize()
+    assert workspace.bulk_writes == 1  # pyright: ignore[reportAttributeAccessIssue]
+    assert workspace.files == {"index.ts": "y", "file1.ts": "v1", "file2.ts": "v2", "file3.ts": "v3", "shared.ts": "shared3"}  # pyright: ignore[reportAttributeAccessIssue]
+    assert not leaf.parent.data.is_materialized  # pyright: ignore[reportOptionalMemberAccess]
+
+
+class ToolsActor(FileOperationsActor):
+    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+        return None
+
+    async def execute(self, *args, **kwargs):
+        pass
+
+
+async def test_evaluating_a_restored_node_materializes_it():
+    base = FakeWorkspace({"index.ts": "y"})
+    loaded = TreeActor(base)
+    await loaded.load(await TreeActor(FakeWorkspace(), make_tree()).dump())
+    assert loaded.root is not None
+    child = loaded.root.children[0]
+    actor = ToolsActor(None, base, fast_llm=object())  # pyright: ignore[reportArgumentType]
+    await actor.eval_node(child, "prompt")
+    assert child.data.is_materialized
+    assert child.data.workspace.bulk_writes == 1  # pyright: ignore[reportAttributeAccessIssue]
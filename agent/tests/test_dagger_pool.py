@@ -0,0 +1,105 @@
+import anyio
+import dagger
+import pytest
+from contextlib import asynccontextmanager
+from core.dagger_pool import DaggerClientPool
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeClient:
+    def __init__(self, name: str):
+        self.name = name
+        self.closed = False
+
+    async def version(self) -> str:
+        if self.closed:
+            raise dagger.TransportError("session gone")
+        return "v0.0.0"
+
+
+class FakeEngine:
+    def __init__(self):
+        self.opened: list[FakeClient] = []
+
+    @asynccontextmanager
+    async def connect(self):
+        client = FakeClient(f"session-{len(self.opened)}")
+        self.opened.append(client)
+        try:
+            yield client
+        finally:
+            client.closed = True
+
+
+async def test_borrow_reuses_sessions_and_reconnects_on_transport_error():
+    engine = FakeEngine()
+    pool = DaggerClientPool(engine.connect)  # pyright: ignore[reportArgumentType]
+    async with pool.run(size=1, max_wait=0.1, health_interval=0):
+        async with pool.borrow() as first:
+            pass
+        async with pool.borrow() as second:
+            assert second is first
+
+        with pytest.raises(dagger.TransportError):
+            async with pool.borrow():
+                raise dagger.TransportError("engine restarted")
+        async with pool.borrow() as replacement:
+            assert replacement is not first
+            assert not replacement.closed  # pyright: ignore[reportAttributeAccessIssue]
+
+        async with pool.borrow() as held:
+            # pool exhausted: the second borrower gets a dedicated session
+            async with pool.borrow() as dedicated:
+                assert dedicated is not held
+        stats = pool.stats()
+    assert first.closed  # pyright: ignore[reportAttributeAccessIssue]
+    assert stats["borrows"] == 6 and stats["overflow"] == 1 and stats["reconnects"] == 1
+    assert len(engine.opened) == 3
+
+
+async def test_transport_error_from_a_task_group_reconnects():
+    engine = FakeEngine()
+    pool = DaggerClientPool(engine.connect)  # pyright: ignore[reportArgumentType]
+
+    async def fail():
+        raise dagger.TransportError("engine restarted")
+
+    async with pool.run(size=1, max_wait=0.1, health_interval=0):
+        async with pool.borrow() as first:
+            pass
+        with pytest.raises(ExceptionGroup):
+            async with pool.borrow():
+                async with anyio.create_task_group() as tg:
+                    tg.start_soon(fail)
+        async with pool.borrow() as replacement:
+            assert replacement is not first
+        stats = pool.stats()
+    assert stats["reconnects"] == 1 and len(engine.opened) == 2
+
+
+async def test_sessions_recycled_after_max_uses():
+    engine = FakeEngine()
+    pool = DaggerClientPool(engine.connect)  # pyright: ignore[reportArgumentType]
+    async with pool.run(size=1, max_uses=2):
+        seen = []
+        for _ in range(4):
+            async with pool.borrow() as client:
+                seen.append(client.name)  # pyright: ignore[reportAttributeAccessIssue]
+        stats = pool.stats()
+    assert seen == ["session-0", "session-0", "session-1", "session-1"]
+    assert stats["reconnects"] == 0
+
+
+async def test_disabled_pool_opens_dedicated_sessions():
+    engine = FakeEngine()
+    pool = DaggerClientPool(engine.connect)  # pyright: ignore[reportArgumentType]
+    async with pool.borrow() as client:
+        assert not client.closed  # pyright: ignore[reportAttributeAccessIssue]
+    assert client.closed  # pyright: ignore[reportAttributeAccessIssue]
+    assert pool.stats()["overflow"] == 0
@@ -0,0 +1,58 @@
+import anyio
+import pytest
+
+from api.base_agent_session import AgentSession
+from api.agent_server.models import AgentStatus, MessageKind
+from api.diff_history import DiffHistory, diff_history
+from diff.git_diff import unified_diff
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeApplication:
+    @classmethod
+    def template_path(cls) -> str:
+        return "./trpc_agent/template"
+
+
+async def send_diffs(session: AgentSession, diffs: list[str]):
+    tx, rx = anyio.create_memory_object_stream(len(diffs))
+    for diff in diffs:
+        await session.send_event(tx, AgentStatus.RUNNING, MessageKind.REVIEW_RESULT, "diff", unified_diff=diff)
+    tx.close()
+    return [event.message async for event in rx]
+
+
+async def test_diff_delta_sends_changes_since_the_last_diff():
+    snapshot = {"src/app.ts": "old\n"}
+    first = unified_diff(snapshot, {"src/app.ts": "new\n", "package.json": "{}\n"})
+    second = unified_diff(snapshot, {"src/app.ts": "new\n", "package.json": "{}\n", "src/db.ts": "db\n"})
+
+    session = AgentSession(None, FakeApplication, settings={"diff_delta": True})  # pyright: ignore[reportArgumentType]
+    session._diff_base = snapshot
+    messages = await send_diffs(session, [first, second])
+
+    assert messages[0].unified_diff == first
+    assert messages[1].unified_diff == unified_diff({}, {"src/db.ts": "db\n"})
+    assert [(s.path, s.insertions, s.deletions) for s in messages[1].diff_stat] == [("src/db.ts", 1, 0)]
+    assert diff_history.get(messages[1].complete_diff_hash) == second
+
+
+async def test_complete_diffs_without_the_setting():
+    diff = unified_diff({}, {"a.txt": "a\n"})
+    messages = await send_diffs(AgentSession(None, FakeApplication), [diff, diff])  # pyright: ignore[reportArgumentType]
+    assert [m.unified_diff for m in messages] == [diff, diff]
+    assert messages[0].complete_diff_hash == messages[1].complete_diff_hash
+
+
+def test_history_evicts_oldest_diffs():
+    history = DiffHistory(max_bytes=10)
+    first = history.put("x" * 6)
+    second = history.put("y" * 6)
+    assert history.get(first) is None
+    assert history.get(second) == "y" * 6
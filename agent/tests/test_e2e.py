@@ -64,6 +64,15 @@ def latest_app_name_and_commit_message(events):
     return app_name, commit_message
 
 
+def latest_kind(events):
+    """Kind of the last event, skipping metadata updates that patch earlier ones"""
+    return next(
+        evt.message.kind
+        for evt in reversed(events)
+        if evt.message.kind != MessageKind.METADATA_UPDATE
+    )
+
+
 async def run_e2e(
     prompt: str,
     standalone: bool,
@@ -93,7 +102,7 @@ async def run_e2e(
             refinement_count = 0
 
             while (
-                events[-1].message.kind == MessageKind.REFINEMENT_REQUEST
+                latest_kind(events) == MessageKind.REFINEMENT_REQUEST
                 and refinement_count < max_refinements
             ):
                 events, request = await client.continue_conversation(
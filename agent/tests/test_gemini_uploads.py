@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import anyio
+import pytest
+from google.genai import types as genai_types
+
+from llm.common import AttachedFiles, Message, TextRaw
+from llm.gemini import GeminiLLM
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeFiles:
+    def __init__(self):
+        self.uploaded: list[str] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def upload(self, file: str) -> genai_types.File:
+        self.uploaded.append(file)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await anyio.sleep(0.01)
+        self.active -= 1
+        return genai_types.File(uri=f"files/{len(self.uploaded)}", mime_type="image/png")
+
+
+def _client(monkeypatch, inline_files_max_bytes: int = 0) -> tuple[GeminiLLM, FakeFiles]:
+    client = GeminiLLM("gemini", api_key="test", inline_files_max_bytes=inline_files_max_bytes)
+    files = FakeFiles()
+    monkeypatch.setattr(client, "_async_client", SimpleNamespace(files=files))
+    return client, files
+
+
+@pytest.fixture
+def screenshots(tmp_path):
+    chromium, webkit, other = tmp_path / "chromium.png", tmp_path / "webkit.png", tmp_path / "other.png"
+    chromium.write_bytes(b"same screenshot")
+    webkit.write_bytes(b"same screenshot")
+    other.write_bytes(b"another screenshot, a bit larger")
+    return [str(chromium), str(webkit), str(other)]
+
+
+async def test_uploads_are_concurrent_and_reused(screenshots, monkeypatch):
+    client, files = _client(monkeypatch)
+    first = await client.upload_files(screenshots)
+    assert len(files.uploaded) == 2  # identical screenshots are uploaded once
+    assert files.max_active == 2
+    assert first[0] is first[1]
+
+    again = await client.upload_files(screenshots)
+    assert len(files.uploaded) == 2
+    assert [f.uri for f in again] == [f.uri for f in first]
+
+
+async def test_expired_uploads_are_redone(screenshots, monkeypatch):
+    client, files = _client(monkeypatch)
+    await client.upload_files(screenshots[:1])
+    for digest, (uploaded, _) in client._uploads.items():
+        client._uploads[digest] = (uploaded, 0.0)
+    await client.upload_files(screenshots[:1])
+    assert len(files.uploaded) == 2
+    assert len(client._uploads) == 1
+
+
+async def test_concurrent_requests_share_an_upload(screenshots, monkeypatch):
+    client, files = _client(monkeypatch)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(client.upload_files, screenshots[:1])
+        tg.start_soon(client.upload_files, screenshots[1:2])  # same content
+    assert files.uploaded == [screenshots[0]]
+    assert not client._pending_uploads
+
+
+async def test_expired_uploads_are_dropped(screenshots, monkeypatch):
+    client, files = _client(monkeypatch)
+    await client.upload_files(screenshots[:1])
+    for digest, (uploaded, _) in client._uploads.items():
+        client._uploads[digest] = (uploaded, 0.0)
+    await client.upload_files(screenshots[2:])
+    assert len(client._uploads) == 1
+
+
+async def test_small_files_are_inlined(screenshots, monkeypatch):
+    client, files = _client(monkeypatch, inline_files_max_bytes=20)
+    messages = [Message(role="user", content=[TextRaw("check the screenshots")])]
+    contents = await client._messages_into(messages, AttachedFiles(files=screenshots))
+    parts = contents[-1].parts
+    assert parts is not None
+    assert [p.inline_data.data for p in parts[1:3] if p.inline_data] == [b"same screenshot"] * 2
+    assert parts[3].file_data and parts[3].file_data.file_uri == "files/1"
+    assert files.uploaded == [screenshots[2]]
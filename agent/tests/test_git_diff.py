@@ -0,0 +1,104 @@
+import os
+
+from diff.git_diff import (
+    EXECUTABLE,
+    GitIgnore,
+    apply_file_diff,
+    blob_id,
+    diff_between,
+    file_diff,
+    split_diff,
+    tracked,
+    unified_diff,
+)
+from diff.template_files import diff_with_template
+
+
+def test_blob_id_matches_git():
+    assert blob_id("") == "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+    assert blob_id("Hello, world!\n") == "af5626b4a114abcb82d63db7c8082c3c4756e51b"
+
+
+def test_modified_file():
+    diff = file_diff("app.py", "import os\n\ndef main():\n    return 1\n", "import os\n\ndef main():\n    return 2\n")
+    assert diff == (
+        "diff --git a/app.py b/app.py\n"
+        "index bd122c4..8dddd30 100644\n"
+        "--- a/app.py\n"
+        "+++ b/app.py\n"
+        "@@ -1,4 +1,4 @@\n"
+        " import os\n"
+        " \n"
+        " def main():\n"
+        "-    return 1\n"
+        "+    return 2\n"
+    )
+
+
+def test_new_deleted_and_empty_files():
+    diff = unified_diff({"old.txt": "bye\n", "empty.txt": ""}, {"new.txt": "hi", "empty.txt": "x\n"})
+    assert "diff --git a/new.txt b/new.txt\nnew file mode 100644\n" in diff
+    assert "--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1 @@\n+hi\n\\ No newline at end of file\n" in diff
+    assert "deleted file mode 100644\nindex b023018..0000000\n--- a/old.txt\n+++ /dev/null\n" in diff
+    assert "index e69de29..587be6b 100644\n--- a/empty.txt\n+++ b/empty.txt\n@@ -0,0 +1 @@\n+x\n" in diff
+    # paths are sorted like git does
+    assert diff.index("empty.txt") < diff.index("new.txt") < diff.index("old.txt")
+
+
+def test_mode_and_binary_changes():
+    diff = unified_diff({"run.sh": "echo\n", "logo.png": b"\x89PNG\0a"},
+                        {"run.sh": "echo\n", "logo.png": b"\x89PNG\0b"},
+                        new_modes={"run.sh": EXECUTABLE})
+    assert "diff --git a/run.sh b/run.sh\nold mode 100644\nnew mode 100755\n" in diff
+    assert "Binary files a/logo.png and b/logo.png differ\n" in diff
+    assert unified_diff({"a": "x\n"}, {"a": b"x\n"}) == ""
+
+
+def test_hunk_header_has_function_context():
+    old = "".join(f"line {i}\n" for i in range(20))
+    new = old.replace("line 15\n", "changed\n")
+    diff = file_diff("f.txt", old, new)
+    assert "@@ -13,7 +13,7 @@ line 11\n" in diff
+
+
+def test_gitignore():
+    files = {
+        ".gitignore": "node_modules/\n/dist\n*.log\n!keep.log\n",
+        "node_modules/a/b.js": "x\n",
+        "dist/x": "1\n",
+        "src/dist/y": "2\n",
+        "a.log": "l\n",
+        "keep.log": "k\n",
+        "src/b.log": "q\n",
+    }
+    assert sorted(tracked(files)) == [".gitignore", "keep.log", "src/dist/y"]
+    assert sorted(tracked(files, already_tracked=["a.log"])) == [".gitignore", "a.log", "keep.log", "src/dist/y"]
+    assert GitIgnore({"sub/.gitignore": "*.tmp\n"}).ignored("sub/x/y.tmp")
+    assert not GitIgnore({"sub/.gitignore": "*.tmp\n"}).ignored("y.tmp")
+
+
+def test_diff_with_template(tmp_path):
+    (tmp_path / "package.json").write_text("{}\n")
+    (tmp_path / "run.sh").write_text("echo\n")
+    os.chmod(tmp_path / "run.sh", 0o755)
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("x\n")
+
+    snapshot = {"package.json": "{}\n", "src/app.ts": "old\n", "icon.ico": "a\n"}
+    diff = diff_with_template(snapshot, str(tmp_path), {"src/app.ts": "new\n", "run.sh": "echo\n"},
+                              exclude=lambda p: p.endswith(".ico"))
+    assert "package.json" not in diff  # unchanged template file
+    assert "icon.ico" not in diff
+    assert "diff --git a/run.sh b/run.sh\nnew file mode 100644\n" in diff  # context files are written as 0644
+    assert "-old\n+new\n" in diff
+
+
+def test_diff_between():
+    base = {"a.txt": "1\n2\n3\n", "b.txt": "b\n"}
+    first = {"a.txt": "1\n2\n3\n4\n", "c.txt": "c", "b.txt": "b\n"}
+    second = {"a.txt": "0\n1\n2\n3\n4\n", "c.txt": "c", "b.txt": "b2\n"}
+    previous = unified_diff(base, first)
+    current = unified_diff(base, second, new_modes={"c.txt": EXECUTABLE})
+    assert apply_file_diff(base["a.txt"], split_diff(current)["a.txt"]) == ("0\n1\n2\n3\n4\n", 0o100644)
+    assert diff_between(base, previous, current) == unified_diff(first, second, new_modes={"c.txt": EXECUTABLE})
+    assert diff_between(base, current, current) == ""
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import pytest
+from core import actors as core_actors
+from core.import_graph import ImportGraph
+from trpc_agent.actors import TrpcActor
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+TS_FILES = {
+    "server/src/index.ts": "import { createUser } from './handlers/create_user';\nimport { listUsers } from './handlers/list_users';\n",
+    "server/src/handlers/create_user.ts": "import { db } from '../db';\nimport { type CreateUserInput } from '../schema';\n",
+    "server/src/handlers/list_users.ts": "import { db } from '../db';\n",
+    "server/src/db/index.ts": "import * as schema from './schema';\nimport { drizzle } from 'drizzle-orm/node-postgres';\n",
+    "server/src/db/schema.ts": "export const users = 1;\n",
+    "server/src/schema.ts": "import { z } from 'zod';\n",
+    "server/src/tests/create_user.test.ts": "import { createUser } from '../handlers/create_user';\nimport { resetDB } from '../helpers';\n",
+    "server/src/tests/list_users.test.ts": "import { listUsers } from '../handlers/list_users.js';\n",
+    "server/src/helpers/index.ts": "export * from './reset';\n",
+    "server/src/helpers/reset.ts": "import { db } from '../db';\n",
+    "client/src/App.tsx": "import { Button } from '@/components/ui/button';\nimport './App.css';\n",
+    "client/src/components/ui/button.tsx": "import { cn } from '@/lib/utils';\n",
+    "client/src/lib/utils.ts": "export const cn = 1;\n",
+}
+
+
+async def test_ts_dependents():
+    graph = ImportGraph(TS_FILES, aliases={"@/": "client/src/"})
+    assert graph.dependents(["server/src/handlers/create_user.ts"]) == {
+        "server/src/handlers/create_user.ts",
+        "server/src/index.ts",
+        "server/src/tests/create_user.test.ts",
+    }
+    assert "server/src/tests/list_users.test.ts" in graph.dependents(["server/src/handlers/list_users.ts"])
+    server_files = {p for p in TS_FILES if p.startswith("server/")}
+    assert graph.dependents(["server/src/db/schema.ts"]) == server_files - {"server/src/schema.ts"}
+    assert graph.dependents(["client/src/lib/utils.ts"]) == {
+        "client/src/lib/utils.ts",
+        "client/src/components/ui/button.tsx",
+        "client/src/App.tsx",
+    }
+
+
+
+class RecordingActor(TrpcActor):
+    """Checks pass and are recorded; the node changed create_user and its test."""
+
+    def __init__(self, changed: set[str]):
+        super().__init__(None, None, None, incremental_checks=True)  # pyright: ignore[reportArgumentType]
+        self.changed = changed
+        self.runs: list[str] = []
+
+    async def _affected_files(self, node, project):
+        graph = ImportGraph(TS_FILES)
+        return self.changed, graph.dependents(self.changed)
+
+    async def run_tsc_backend_check(self, node):
+        self.runs.append(f"tsc:{node.data.context}")
+
+    async def run_test_check(self, node, handler_name=None):
+        self.runs.append("test")
+
+    async def run_scoped_tsc_check(self, node, project, roots):
+        self.runs.append("scoped_tsc")
+
+    async def run_scoped_test_check(self, node, test_files):
+        self.runs.append("scoped_test")
+
+
+async def materialize():
+    return None
+
+
+def handler_node(context: str = "handler:create_user"):
+    root = SimpleNamespace(_id="root", data=SimpleNamespace(context="root", materialize=materialize))
+    return SimpleNamespace(data=SimpleNamespace(context=context, messages=[]), get_trajectory=lambda: [root])
+
+
+@pytest.fixture(autouse=True)
+def no_llm(monkeypatch):
+    monkeypatch.setattr(core_actors, "get_ultra_fast_llm_client", lambda: None)
+
+
+async def test_scoped_checks_replace_the_full_run_they_cover():
+    actor = RecordingActor({"server/src/handlers/create_user.ts", "server/src/tests/create_user.test.ts"})
+    assert await actor._validate_handler(handler_node())  # pyright: ignore[reportArgumentType]
+    assert await actor._validate_handler(handler_node())  # pyright: ignore[reportArgumentType]
+    # the search root is type-checked once, the handler test runs only in the scoped set
+    assert actor.runs == ["scoped_tsc", "scoped_test", "tsc:root", "scoped_tsc", "scoped_test"]
+
+
+async def test_full_run_when_changes_reach_beyond_sources():
+    actor = RecordingActor({"server/src/handlers/create_user.ts", "server/package.json"})
+    assert await actor._validate_handler(handler_node("handler:list_users"))  # pyright: ignore[reportArgumentType]
+    assert sorted(actor.runs) == ["scoped_test", "scoped_tsc", "test", "tsc:handler:list_users"]
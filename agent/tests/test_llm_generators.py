@@ -0,0 +1,36 @@
+import anyio
+import pytest
+
+from llm.common import AsyncLLM, Completion, TextRaw
+from llm.llm_generators import precompute_app_name, precompute_commit_message
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class SlowLLM(AsyncLLM):
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        self.calls += 1
+        await anyio.sleep(0.01)
+        return Completion(role="assistant", content=[TextRaw(self.text)], input_tokens=1,
+                          output_tokens=1, stop_reason="end_turn")
+
+
+async def test_precompute_runs_in_background_once_per_input():
+    client = SlowLLM("Todo App")
+    task = precompute_app_name("a todo app", client)
+    assert not task.done()  # the caller doesn't wait for it
+    assert precompute_app_name("a todo app", client) is task
+    assert await task == "todo-app"
+    assert client.calls == 1
+
+    assert precompute_app_name("a todo app", SlowLLM("Other")) is not task
+    assert precompute_commit_message("a todo app", client) is not task
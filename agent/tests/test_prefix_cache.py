@@ -0,0 +1,105 @@
+import anyio
+import pytest
+from anthropic.types import Message as AnthropicMessage, TextBlock, Usage
+
+from llm.anthropic_client import AnthropicLLM
+from llm.common import Message, TextRaw
+from llm.telemetry import actor_cache_stats, telemetry_actor
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def _response(cache_read: int) -> AnthropicMessage:
+    return AnthropicMessage(
+        id="msg",
+        type="message",
+        role="assistant",
+        model="claude",
+        content=[TextBlock(type="text", text="ok")],
+        stop_reason="end_turn",
+        usage=Usage(input_tokens=10, output_tokens=1, cache_read_input_tokens=cache_read,
+                    cache_creation_input_tokens=0 if cache_read else 2000),
+    )
+
+
+class FakeMessages:
+    """Provider stub: the prefix is cached once a streamed response has started."""
+
+    def __init__(self):
+        self.log: list[str] = []
+        self.call_args: list[dict] = []
+        self.warm = False
+
+    async def create(self, **call_args):
+        self.call_args.append(call_args)
+        self.log.append("create")
+        return _response(2000 if self.warm else 0)
+
+    def stream(self, **call_args):
+        self.call_args.append(call_args)
+        messages = self
+
+        class Stream:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def __aiter__(self):
+                messages.log.append("stream")
+                await anyio.sleep(0.01)  # prompt processing
+                messages.warm = True
+                yield type("Event", (), {"type": "message_start"})()
+                await anyio.sleep(0.01)
+
+            async def get_final_message(self):
+                return _response(0)
+
+        return Stream()
+
+
+class FakeClient:
+    def __init__(self):
+        self.messages = FakeMessages()
+
+
+async def test_beam_siblings_read_prefix_warmed_by_leader():
+    client = FakeClient()
+    llm = AnthropicLLM(client, default_model="claude")  # type: ignore
+    history = [
+        Message(role="user", content=[TextRaw("spec " * 2000)]),
+        Message(role="assistant", content=[TextRaw("draft")]),
+        Message(role="user", content=[TextRaw("fix it")]),
+    ]
+    results = []
+
+    async def sibling():
+        results.append(await llm.completion(messages=history, max_tokens=100, system_prompt="system"))
+
+    with telemetry_actor("BeamTestActor"):
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(sibling)
+
+    # one leader streams, the others wait for its prompt to be cached
+    assert client.messages.log == ["stream", "create", "create"]
+    assert len(results) == 3
+    stats = actor_cache_stats()["BeamTestActor"]
+    assert stats["total_calls"] == 3
+    assert stats["total_cache_creation_tokens"] == 2000
+    assert stats["total_cache_read_tokens"] == 4000
+
+    # breakpoints at the end of the history and at the previous user turn
+    messages = client.messages.call_args[0]["messages"]
+    assert [m["content"][-1].get("cache_control") is not None for m in messages] == [True, False, True]
+
+    # short prompts are sent right away
+    client.messages.log.clear()
+    await llm.completion(messages=[Message(role="user", content=[TextRaw("hi")])], max_tokens=10)
+    assert client.messages.log == ["create"]
@@ -0,0 +1,134 @@
+import anyio
+import pytest
+
+from llm.common import AsyncLLM, Completion, Message, TextRaw
+from llm.rate_limit import RateLimitedLLM, backoff_sleep, RateLimiter, RateLimits, TokenBucket, report_rate_limited
+from llm.telemetry import _queue_wait
+from log import set_trace_id
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FakeLLM(AsyncLLM):
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.queue_waits: list[float | None] = []
+
+    async def completion(self, messages, max_tokens, **kwargs) -> Completion:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.queue_waits.append(_queue_wait.get())
+        try:
+            await anyio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return Completion(role="assistant", content=[TextRaw("ok")], input_tokens=10,
+                          output_tokens=1, stop_reason="end_turn")
+
+
+def _messages() -> list[Message]:
+    return [Message(role="user", content=[TextRaw("hi")])]
+
+
+async def test_concurrency_is_bounded_and_queue_wait_reported():
+    fake = FakeLLM()
+    client = RateLimitedLLM(fake, RateLimiter("test", RateLimits(max_concurrency=2)))
+    async with anyio.create_task_group() as tg:
+        for _ in range(6):
+            tg.start_soon(lambda: client.completion(_messages(), max_tokens=10))
+    assert fake.max_active == 2
+    waits = [wait for wait in fake.queue_waits if wait is not None]
+    assert len(waits) == 6 and max(waits) > 0
+
+
+async def test_rate_limit_halves_and_successes_restore_the_limit():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=8))
+    async with limiter.slot():
+        report_rate_limited()
+        report_rate_limited()  # one decrease per request
+    assert limiter.limit == 4
+
+    with pytest.raises(RateLimitError):
+        async with limiter.slot():
+            raise RateLimitError()
+    assert limiter.limit == 4  # within the decrease interval of the last 429
+
+    for _ in range(100):
+        async with limiter.slot():
+            pass
+    assert limiter.limit == 8
+
+
+async def test_waiting_requests_alternate_between_sessions():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=1))
+    order: list[str] = []
+    release = anyio.Event()
+
+    async def request(session: str):
+        set_trace_id(session)
+        async with limiter.slot():
+            order.append(session)
+            if session == "holder":
+                await release.wait()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(request, "holder")
+        await anyio.wait_all_tasks_blocked()
+        for _ in range(3):
+            tg.start_soon(request, "a")
+        await anyio.wait_all_tasks_blocked()
+        tg.start_soon(request, "b")
+        await anyio.wait_all_tasks_blocked()
+        release.set()
+    assert order == ["holder", "a", "b", "a", "a"]
+
+
+async def test_backoff_hands_the_slot_to_other_sessions():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=1))
+    order: list[str] = []
+
+    async def retrying():
+        set_trace_id("retrying")
+        async with limiter.slot():
+            order.append("attempt")
+            await backoff_sleep(0.2)
+            order.append("retry")
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(retrying)
+        await anyio.wait_all_tasks_blocked()
+        assert limiter.active == 0  # backing off
+        set_trace_id("other")
+        async with limiter.slot():
+            order.append("other")
+    assert order == ["attempt", "other", "retry"]
+    assert limiter.active == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = RateLimiter("test", RateLimits(max_concurrency=1))
+    async with limiter.slot():
+        with anyio.move_on_after(0.01):
+            async with limiter.slot():
+                pass
+        assert not limiter._waiting
+    assert limiter.active == 0
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.delay(10) == 0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1, abs=0.05)
+    assert bucket.delay(1000) == pytest.approx(60, abs=0.05)  # capped at a full bucket
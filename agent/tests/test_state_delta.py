@@ -0,0 +1,71 @@
+import pytest
+from api import state_delta
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def make_state(nodes: list[dict], messages: list[dict], files: dict[str, str]) -> dict:
+    return {
+        "fsm_state": {
+            "stack_path": ["application"],
+            "context": {"user_prompt": "todo app", "files": files},
+            "actors": [{"path": ["application"], "data": nodes}],
+        },
+        "fsm_messages": messages,
+        "metadata": {"app_name": "todo", "template_diff_sent": True},
+    }
+
+
+def node(id: str, parent: str | None, text: str) -> dict:
+    return {"id": id, "parent": parent, "data": {"messages": [{"role": "assistant", "content": text}], "files": {}}}
+
+
+async def test_roundtrip_sends_only_changes():
+    big = "x" * 10_000
+    base = make_state(
+        [node("root", None, big), node("a", "root", "first try")],
+        [{"role": "user", "content": "make a todo app"}],
+        {"server/src/index.ts": big},
+    )
+    new = make_state(
+        # DFS order changes as children are added
+        [node("root", None, big), node("b", "root", "second try"), node("a", "root", "first try, fixed")],
+        [{"role": "user", "content": "make a todo app"}, {"role": "assistant", "content": "done"}],
+        {"server/src/index.ts": big, "server/src/schema.ts": "export {}"},
+    )
+    payload = state_delta.encode(state_delta.versioned(base), state_delta.versioned(new))
+    assert state_delta.is_delta(payload)
+    assert big not in str(payload)
+    ops = {op["op"] for op in payload[state_delta.DELTA_KEY]["ops"]}
+    assert {"append", "order", "set"} <= ops
+    assert state_delta.decode(state_delta.versioned(base).state, payload) == new
+
+
+async def test_full_state_fallbacks():
+    state = make_state([node("root", None, "hi")], [], {})
+    assert state_delta.encode(None, state_delta.versioned(state)) == state
+    # a completely different state is cheaper to send in full
+    other = make_state([node("other", None, "bye")], [{"role": "user", "content": "x"}], {"a": "b"})
+    assert not state_delta.is_delta(state_delta.encode(state_delta.versioned(state), state_delta.versioned(other)))
+    assert state_delta.decode(None, other) is other
+
+
+async def test_decode_rejects_wrong_base():
+    base = make_state([node("root", None, "x" * 1000)], [], {})
+    new = make_state([node("root", None, "x" * 1000)], [{"role": "user", "content": "hi"}], {})
+    payload = state_delta.encode(state_delta.versioned(base), state_delta.versioned(new))
+    stale = make_state([node("root", None, "y" * 1000)], [], {})
+    with pytest.raises(state_delta.StateDeltaError):
+        state_delta.decode(stale, payload)
+
+
+async def test_apply_rejects_malformed_ops():
+    with pytest.raises(state_delta.StateDeltaError):
+        state_delta.apply({}, None)  # pyright: ignore[reportArgumentType]
+    with pytest.raises(state_delta.StateDeltaError):
+        state_delta.apply({}, [{"op": "set", "path": ["a", "b"], "value": 1}])
@@ -0,0 +1,101 @@
+import tempfile
+from typing import Literal
+import pytest
+from llm.cached import CachedLLM
+from llm.alloy import AlloyLLM
+from llm.common import AsyncLLM, Completion, CompletionDelta, Message, TextRaw, Tool, ToolUse
+from llm.utils import loop_completion, streamed_completion
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class StreamingStubLLM(AsyncLLM):
+    """Streams each scripted completion's text in two pieces, tool uses as one."""
+
+    def __init__(self, completions: list[Completion]):
+        self.completions = completions
+        self.calls = 0
+
+    async def completion(self, messages: list[Message], max_tokens: int, *args, **kwargs) -> Completion:
+        completion = self.completions[self.calls]
+        self.calls += 1
+        return completion
+
+    async def stream_completion(self, messages: list[Message], max_tokens: int, *args, **kwargs):
+        completion = await self.completion(messages, max_tokens)
+        for index, block in enumerate(completion.content):
+            match block:
+                case TextRaw(text):
+                    half = len(text) // 2
+                    yield CompletionDelta("text", index, text[:half])
+                    yield CompletionDelta("text", index, text[half:])
+                case ToolUse(name, _, id):
+                    yield CompletionDelta("tool_use", index, "", name=name, id=id)
+        yield completion
+
+
+def _completion(*content, stop_reason: Literal["end_turn", "max_tokens", "tool_use"] = "end_turn") -> Completion:
+    return Completion("assistant", list(content), input_tokens=1, output_tokens=1, stop_reason=stop_reason)
+
+
+async def test_loop_completion_forwards_deltas_across_continuations():
+    llm = StreamingStubLLM([
+        _completion(TextRaw("Hello, "), stop_reason="max_tokens"),
+        _completion(TextRaw("world"), ToolUse("confirm_state", {}, "t1"), stop_reason="tool_use"),
+    ])
+    deltas: list[CompletionDelta] = []
+
+    async def on_delta(delta: CompletionDelta):
+        deltas.append(delta)
+
+    message = await loop_completion(llm, [Message("user", [TextRaw("hi")])], max_tokens=10, on_delta=on_delta)
+
+    assert "".join(d.text for d in deltas if d.kind == "text") == "Hello, world"
+    # the continuation's blocks come after the first completion's
+    assert [(d.kind, d.index) for d in deltas] == [("text", 0), ("text", 0), ("text", 1), ("text", 1), ("tool_use", 2)]
+    assert deltas[-1].name == "confirm_state"
+    assert message.content == [TextRaw("Hello, world"), ToolUse("confirm_state", {}, "t1")]
+
+
+async def test_streamed_completion_without_streaming_support():
+    class PlainLLM(StreamingStubLLM):
+        stream_completion = None  # pyright: ignore[reportAssignmentType]
+
+    expected = _completion(TextRaw("plain"))
+    deltas: list[CompletionDelta] = []
+
+    async def on_delta(delta: CompletionDelta):
+        deltas.append(delta)
+
+    completion = await streamed_completion(PlainLLM([expected]), on_delta, messages=[], max_tokens=10)
+    assert completion == expected
+    assert deltas == []
+
+
+async def test_wrappers_pass_streams_through():
+    tools: list[Tool] = [{"name": "noop", "input_schema": {"type": "object"}}]
+    messages = [Message("user", [TextRaw("hi")])]
+    deltas: list[CompletionDelta] = []
+
+    async def on_delta(delta: CompletionDelta):
+        deltas.append(delta)
+
+    alloy = AlloyLLM.from_models([StreamingStubLLM([_completion(TextRaw("streamed"))])])
+    with tempfile.NamedTemporaryFile() as cache_file:
+        passthrough = CachedLLM(alloy, cache_path=cache_file.name, cache_mode="off")
+        await streamed_completion(passthrough, on_delta, messages=messages, max_tokens=10, tools=tools)
+        assert "".join(d.text for d in deltas) == "streamed"
+
+        deltas.clear()
+        lru = CachedLLM(StreamingStubLLM([_completion(TextRaw("cached"))]), cache_path=cache_file.name, cache_mode="lru")
+        first = await streamed_completion(lru, on_delta, messages=messages, max_tokens=10)
+        second = await streamed_completion(lru, on_delta, messages=messages, max_tokens=10)
+        # cached completions are whole, there is nothing to stream
+        assert deltas == []
+        assert first == second
+
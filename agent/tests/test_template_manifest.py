@@ -0,0 +1,99 @@
+import os
+
+import dagger
+import pytest
+
+from core.template_manifest import TemplateManifests
+from diff.git_diff import EXECUTABLE, REGULAR, blob_id
+
+
+def test_manifest_is_read_once(tmp_path):
+    (tmp_path / "package.json").write_text("{}\n")
+    (tmp_path / "run.sh").write_text("echo\n")
+    os.chmod(tmp_path / "run.sh", 0o755)
+    for excluded in ("node_modules", "dist"):
+        (tmp_path / excluded).mkdir()
+        (tmp_path / excluded / "x.js").write_text("x\n")
+
+    manifests = TemplateManifests()
+    manifest = manifests.get(str(tmp_path))
+    assert set(manifest.entries) == {"package.json", "run.sh"}
+    assert manifest.entries["package.json"].size == 3
+    assert manifest.modes == {"package.json": REGULAR, "run.sh": EXECUTABLE}
+    assert manifest.ids["run.sh"] == blob_id("echo\n")
+    with pytest.raises(TypeError):
+        manifest.files["package.json"] = "changed"  # pyright: ignore[reportIndexIssue]
+
+    (tmp_path / "package.json").write_text('{"name": "app"}\n')
+    assert manifests.get(str(tmp_path)) is manifest
+    assert manifests.refresh(str(tmp_path)).files["package.json"] == '{"name": "app"}\n'
+    assert manifests.refresh(str(tmp_path)).digest != manifest.digest
+    assert manifests.refresh(str(tmp_path)) is manifests.get(str(tmp_path))
+
+
+class FakeDirectory:
+    def __init__(self, directory_id: str):
+        self.directory_id = directory_id
+
+    async def sync(self) -> "FakeDirectory":
+        if self.directory_id == "expired":
+            raise dagger.TransportError("directory is gone")
+        return self
+
+    async def id(self) -> str:
+        return self.directory_id
+
+
+class FakeClient:
+    def __init__(self, during_upload=None):
+        self.uploads = 0
+        self.during_upload = during_upload
+
+    def host(self) -> "FakeClient":
+        return self
+
+    def directory(self, path: str, exclude: list[str]) -> FakeDirectory:
+        self.uploads += 1
+        if self.during_upload is not None:
+            self.during_upload()
+            self.during_upload = None
+        return FakeDirectory(f"upload-{self.uploads}")
+
+    def load_directory_from_id(self, directory_id: str) -> FakeDirectory:
+        return FakeDirectory(directory_id)
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.mark.anyio
+async def test_snapshot_picks_up_edits_and_reuploads(tmp_path):
+    (tmp_path / "package.json").write_text("{}\n")
+    manifests, client = TemplateManifests(), FakeClient()
+    first, directory = await manifests.snapshot(client, str(tmp_path))  # pyright: ignore[reportArgumentType]
+    assert (await manifests.snapshot(client, str(tmp_path)))[1].directory_id == directory.directory_id  # pyright: ignore
+    assert client.uploads == 1
+
+    (tmp_path / "package.json").write_text('{"name": "app"}\n')
+    edited, directory = await manifests.snapshot(client, str(tmp_path))  # pyright: ignore[reportArgumentType]
+    assert edited.digest != first.digest and edited.files["package.json"] == '{"name": "app"}\n'
+    assert client.uploads == 2
+
+    # an expired upload is replaced, the manifest returned with it is current
+    manifests._directories[edited.root] = (edited.digest, dagger.DirectoryID("expired"))
+    (tmp_path / "package.json").write_text('{"name": "renamed"}\n')
+    renamed, directory = await manifests.snapshot(client, str(tmp_path))  # pyright: ignore[reportArgumentType]
+    assert renamed.files["package.json"] == '{"name": "renamed"}\n'
+    assert directory.directory_id == "upload-3"  # pyright: ignore[reportAttributeAccessIssue]
+
+
+@pytest.mark.anyio
+async def test_snapshot_uploads_again_when_edited_during_upload(tmp_path):
+    package = tmp_path / "package.json"
+    package.write_text("{}\n")
+    client = FakeClient(during_upload=lambda: package.write_text('{"name": "app"}\n'))
+    manifest, directory = await TemplateManifests().snapshot(client, str(tmp_path))  # pyright: ignore[reportArgumentType]
+    assert manifest.files["package.json"] == '{"name": "app"}\n'
+    assert client.uploads == 2 and directory.directory_id == "upload-2"  # pyright: ignore[reportAttributeAccessIssue]
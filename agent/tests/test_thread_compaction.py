@@ -0,0 +1,95 @@
+import anyio
+import pytest
+
+from api.thread_compaction import ThreadCompactor
+from llm.common import AsyncLLM, Completion, InternalMessage, TextRaw, ToolUse, ToolUseResult
+from llm.rate_limit import estimate_tokens
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class SummaryLLM(AsyncLLM):
+    def __init__(self):
+        self.calls = 0
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        self.calls += 1
+        return Completion(role="assistant", content=[TextRaw("<summary>built a todo app</summary>")],
+                          input_tokens=1, output_tokens=1, stop_reason="end_turn")
+
+
+def _turn(i: int, result_size: int = 2000, text_size: int = 0) -> list[InternalMessage]:
+    tool_use = ToolUse("confirm_state", {}, f"tool-{i}")
+    return [
+        InternalMessage(role="assistant", content=[TextRaw(f"step {i}" + "." * text_size), tool_use]),
+        InternalMessage(role="user", content=[ToolUseResult.from_tool_use(tool_use, "x" * result_size)]),
+    ]
+
+
+def text_of(message: InternalMessage) -> str:
+    return "".join(b.text for b in message.content if isinstance(b, TextRaw))
+
+
+def _thread(turns: int, result_size: int = 2000, text_size: int = 0) -> list[InternalMessage]:
+    thread = [InternalMessage(role="user", content=[TextRaw("build a todo app")])]
+    for i in range(turns):
+        thread += _turn(i, result_size, text_size)
+    return thread
+
+
+def test_small_thread_is_sent_as_is():
+    thread = _thread(2)
+    assert ThreadCompactor(max_tokens=100_000).fit(thread, SummaryLLM()) == thread
+
+
+async def test_aged_turns_are_elided_then_summarized():
+    llm = SummaryLLM()
+    compactor = ThreadCompactor(max_tokens=20_000, window_tokens=6_000)
+    thread = _thread(10, result_size=8000, text_size=2000)
+    async with compactor.running():
+        fitted = compactor.fit(thread, llm)
+
+        # recent turns are kept verbatim, older large results become hash references
+        assert fitted[-4:] == thread[-4:]
+        elided = list(fitted[2].content)[0]
+        assert isinstance(elided, ToolUseResult)
+        assert "sha256" in elided.tool_result.content
+        assert elided.tool_use is list(thread[2].content)[0].tool_use  # pyright: ignore[reportAttributeAccessIssue]
+
+        await anyio.wait_all_tasks_blocked()  # let the background summary finish
+        fitted = compactor.fit(fitted + _turn(10, 8000, 2000), llm)
+    assert llm.calls == 1
+    assert fitted[0].role == "user"
+    assert "built a todo app" in text_of(fitted[0])
+    assert fitted[1].role == "assistant"
+    assert fitted[-2:] == _turn(10, 8000, 2000)
+
+
+async def test_pending_summary_is_cancelled_with_the_session():
+    class StalledLLM(SummaryLLM):
+        async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+            await anyio.sleep_forever()
+            raise AssertionError
+
+    compactor = ThreadCompactor(max_tokens=20_000, window_tokens=6_000)
+    thread = _thread(10, result_size=8000, text_size=2000)
+    with anyio.fail_after(5):
+        async with compactor.running():
+            compactor.fit(thread, StalledLLM())
+            await anyio.wait_all_tasks_blocked()
+    # the cancelled summary is dropped, the next fit can start another one
+    assert compactor.fit(thread, SummaryLLM())[0] is thread[0]
+    assert compactor._summary is None
+
+
+async def test_overflowing_thread_is_cut_at_an_assistant_message():
+    compactor = ThreadCompactor(max_tokens=3_000, window_tokens=2_500)
+    fitted = compactor.fit(_thread(20, result_size=3000), SummaryLLM())
+    assert "dropped" in text_of(fitted[0])
+    assert fitted[1].role == "assistant"
+    assert estimate_tokens(fitted) <= 3_000
@@ -0,0 +1,80 @@
+import os
+import pytest
+from types import SimpleNamespace
+from core import validation_cache as vc
+from core.workspace import Workspace
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeContainer:
+    """Stands in for dagger.Container; every builder call returns a new object."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: FakeContainer()
+
+
+def make_workspace() -> Workspace:
+    workspace = Workspace(ctr=FakeContainer(), start=None, protected=set(), allowed=set())  # pyright: ignore[reportArgumentType]
+    workspace._lineage = "template"
+    return workspace
+
+
+async def test_state_key_tracks_content():
+    a, b = make_workspace(), make_workspace()
+    a.write_file("x.ts", "1").write_file("y.ts", "2")
+    b.write_file("y.ts", "2").write_file("x.ts", "0").write_file("x.ts", "1")
+    assert a.state_key == b.state_key
+
+    c = a.clone()
+    assert c.state_key == a.state_key
+    c.rm("y.ts")
+    assert c.state_key != a.state_key
+
+    d = a.clone().add_env_variable("FOO", "bar")
+    assert d.state_key != a.state_key
+
+    untracked = make_workspace()
+    untracked._lineage = None
+    assert untracked.write_file("x.ts", "1").state_key is None
+
+
+async def test_cache_eviction(tmp_path):
+    cache = vc.ValidationCache(str(tmp_path), max_bytes=400)
+    for i in range(10):
+        cache.put(f"key{i}", "check", "x" * 50)
+        os.utime(tmp_path / f"key{i}.json", (i, i))
+    assert cache.get("key0") == (False, None)
+    assert cache.get("key9") == (True, "x" * 50)
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json")) <= 400
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_cached_check(tmp_path, monkeypatch):
+    cache = vc.ValidationCache(str(tmp_path))
+    monkeypatch.setattr(vc, "get_validation_cache", lambda: cache)
+    calls = []
+
+    class Checker:
+        @vc.cached_check("tsc")
+        async def run_tsc(self, node, target: str | None = None) -> str | None:
+            calls.append(target)
+            return None if target == "ok" else f"error in {target}"
+
+    workspace = make_workspace().write_file("a.ts", "broken")
+    node = SimpleNamespace(data=SimpleNamespace(workspace=workspace))
+    checker = Checker()
+    assert await checker.run_tsc(node, "ok") is None
+    assert await checker.run_tsc(node, "ok") is None
+    # failures may be flaky, they are run again
+    assert await checker.run_tsc(node, "a") == "error in a"
+    assert await checker.run_tsc(node, "a") == "error in a"
+    workspace.write_file("a.ts", "fixed")
+    await checker.run_tsc(node, "ok")
+    assert calls == ["ok", "a", "a", "ok"]
+    assert cache.hits == 1
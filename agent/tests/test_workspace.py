@@ -0,0 +1,199 @@
+import os
+import tempfile
+from types import SimpleNamespace
+import pytest
+import dagger
+import graphql
+from dagger._exceptions import QueryErrorValue
+from core import workspace as ws
+from core.dagger_utils import write_files_bulk
+from core.workspace import Workspace
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+async def test_write_files_matches_write_file_chain():
+    files = {f"src/module_{i}.py": f"VALUE = {i}\n" for i in range(20)}
+    async with dagger.Connection(dagger.Config(log_output=open(os.devnull, "w"))) as client:
+        workspace = await Workspace.create(client)
+
+        chained = workspace.clone()
+        for path, content in files.items():
+            chained.write_file(path, content)
+        bulk = await workspace.clone().write_files(files)
+
+        assert bulk.state_key == chained.state_key
+        assert sorted(await bulk.ls("src")) == sorted(os.path.basename(p) for p in files)
+        assert await bulk.read_file("src/module_7.py") == files["src/module_7.py"]
+
+
+async def test_write_files_enforces_permissions():
+    async with dagger.Connection(dagger.Config(log_output=open(os.devnull, "w"))) as client:
+        workspace = (await Workspace.create(client)).permissions(allowed=["src/"])
+        with pytest.raises(PermissionError):
+            await workspace.write_files({"src/ok.py": "", "setup.py": ""})
+        with pytest.raises(FileNotFoundError):
+            await workspace.read_file("src/ok.py")
+        await workspace.write_files({"setup.py": ""}, force=True)
+        assert await workspace.read_file("setup.py") == ""
+
+
+def query_error(message: str) -> dagger.QueryError:
+    return dagger.QueryError([QueryErrorValue(message)], graphql.parse("{ file { contents } }"))
+
+
+class FakeFile:
+    def __init__(self, ctr: "FakeContainer", path: str):
+        self.ctr, self.path = ctr, path
+
+    async def contents(self) -> str:
+        self.ctr.reads.append(self.path)
+        if self.path not in self.ctr.files:
+            raise query_error("no such file")
+        return self.ctr.files[self.path]
+
+
+class FakeContainer:
+    """Container whose files are a dict; records the reads that reached it."""
+
+    def __init__(self, files: dict[str, str], reads: list[str] | None = None):
+        self.files = files
+        self.reads = reads if reads is not None else []
+
+    def file(self, path: str) -> FakeFile:
+        return FakeFile(self, path.removeprefix("/app/"))
+
+    def with_new_file(self, path: str, contents: str) -> "FakeContainer":
+        return FakeContainer({**self.files, path: contents}, self.reads)
+
+    def without_file(self, path: str) -> "FakeContainer":
+        return FakeContainer({p: c for p, c in self.files.items() if p != path}, self.reads)
+
+    def with_directory(self, path: str, directory) -> "FakeContainer":
+        return FakeContainer({**self.files, **getattr(directory, "files", {})}, self.reads)
+
+
+class FakeHostDirectory:
+    """Host directory uploaded when synced, like the engine does."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: dict[str, str] = {}
+
+    async def sync(self) -> "FakeHostDirectory":
+        for dirpath, _, names in os.walk(self.path):
+            for name in names:
+                full = os.path.join(dirpath, name)
+                with open(full) as f:
+                    self.files[os.path.relpath(full, self.path)] = f.read()
+        return self
+
+
+def fake_workspace(files: dict[str, str]) -> Workspace:
+    ctr = FakeContainer(files)
+    return Workspace(ctr=ctr, start=None, protected=set(), allowed=set()).seed_files(files)  # pyright: ignore[reportArgumentType]
+
+
+async def test_write_files_keeps_paths_outside_the_workdir_in_the_container(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    client = SimpleNamespace(host=lambda: SimpleNamespace(directory=FakeHostDirectory))
+    files = {"./src/a.ts": "a", "/etc/passwd": "root", "../x": "x", "src/../b.ts": "b"}
+    ctr = await write_files_bulk(FakeContainer({}), files, client)  # pyright: ignore[reportArgumentType]
+    assert ctr.files == {"src/a.ts": "a", "b.ts": "b", "/etc/passwd": "root", "../x": "x"}  # pyright: ignore[reportAttributeAccessIssue]
+    assert not (tmp_path / "x").exists()
+
+
+async def test_reads_are_served_from_seeded_and_written_files():
+    workspace = fake_workspace({"package.json": "{}\n", "src/app.ts": "a\nb\nc", "uv.lock": "lock\n"})
+    workspace.write_file("src/db.ts", "db\n")
+    assert await workspace.read_file("package.json") == "{}\n"
+    assert await workspace.read_file("/app/src/../src/db.ts") == "db\n"
+    assert await workspace.read_file_lines("src/app.ts", 2, 5) == "b\nc"
+    assert workspace.ctr.reads == []  # pyright: ignore[reportAttributeAccessIssue]
+
+    assert await workspace.read_file("uv.lock") == "lock\n"  # setup may have rewritten it
+    assert workspace.ctr.reads == ["uv.lock"]  # pyright: ignore[reportAttributeAccessIssue]
+
+    workspace.rm("package.json")
+    with pytest.raises(FileNotFoundError):
+        await workspace.read_file("package.json")
+
+
+async def test_clones_share_reads_but_not_writes():
+    workspace = fake_workspace({})
+    workspace.ctr.files["late.txt"] = "late\n"  # pyright: ignore[reportAttributeAccessIssue]
+    clone = workspace.clone()
+    clone.write_file("late.txt", "changed\n")
+    assert await workspace.read_file("late.txt") == "late\n"
+    assert await workspace.clone().read_file("late.txt") == "late\n"
+    assert await clone.read_file("late.txt") == "changed\n"
+    assert workspace.ctr.reads == ["late.txt"]  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def test_reset_restores_seeded_files():
+    workspace = fake_workspace({"a.txt": "a\n"})
+    workspace.write_file("a.txt", "edited\n").write_file("b.txt", "b\n")
+    workspace.reset()
+    assert await workspace.read_file("a.txt") == "a\n"
+    assert await workspace.read_file("b.txt") == "b\n"  # reset keeps files not in start
+
+
+async def test_read_files_fetches_uncached_files_at_once(monkeypatch):
+    batches: list[list[str]] = []
+
+    async def read_files_bulk(ctr, paths):
+        batches.append(paths)
+        return {p: ctr.files.get(p.removeprefix("/app/")) for p in paths}
+
+    monkeypatch.setattr(ws, "read_files_bulk", read_files_bulk)
+    workspace = fake_workspace({"package.json": "{}\n"})
+    workspace.ctr.files.update({"src/a.ts": "a\n", "src/b.ts": "b\n"})  # pyright: ignore[reportAttributeAccessIssue]
+
+    files = await workspace.read_files(["package.json", "src/a.ts", "src/b.ts", "missing.ts"])
+    assert files == {"package.json": "{}\n", "src/a.ts": "a\n", "src/b.ts": "b\n", "missing.ts": None}
+    assert batches == [["/app/missing.ts", "/app/src/a.ts", "/app/src/b.ts"]]
+    assert await workspace.read_files(["src/a.ts", "missing.ts"]) == {"src/a.ts": "a\n", "missing.ts": None}
+    assert len(batches) == 1
+    with pytest.raises(FileNotFoundError):
+        await workspace.read_file_lines("missing.ts")
+
+
+async def test_read_files_fetches_a_single_uncached_file_directly(monkeypatch):
+    async def read_files_bulk(ctr, paths):
+        raise AssertionError("single files are read without an exec")
+
+    monkeypatch.setattr(ws, "read_files_bulk", read_files_bulk)
+    workspace = fake_workspace({"package.json": "{}\n"})
+    workspace.ctr.files["src/a.ts"] = "a\n"  # pyright: ignore[reportAttributeAccessIssue]
+
+    assert await workspace.read_files(["package.json", "missing.ts"]) == {"package.json": "{}\n", "missing.ts": None}
+    assert await workspace.read_files(["src/a.ts"]) == {"src/a.ts": "a\n"}
+    assert await workspace.read_files(["missing.ts", "src/a.ts"]) == {"missing.ts": None, "src/a.ts": "a\n"}
+    assert workspace.ctr.reads == ["missing.ts", "src/a.ts"]  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def test_cached_reads_match_the_engine():
+    contents = "one\ntwo\n\nfour"
+    async with dagger.Connection(dagger.Config(log_output=open(os.devnull, "w"))) as client:
+        workspace = (await Workspace.create(client)).write_file("notes.txt", contents)
+        uncached = workspace.clone()
+        uncached._files = {}
+        for start, end in [(1, 2), (2, 10), (4, 4), (5, 6)]:
+            assert await workspace.read_file_lines("notes.txt", start, end) == await uncached.read_file_lines("notes.txt", start, end)
+
+        await workspace.exec_mut(["sh", "-c", "echo changed > notes.txt"])
+        assert await workspace.read_file("notes.txt") == "changed\n"
+
+
+async def test_read_files_matches_read_file():
+    files = {"src/a.ts": "a\n", "src/nested/b.ts": "b", "long " + "x" * 120 + ".txt": "long\n"}
+    async with dagger.Connection(dagger.Config(log_output=open(os.devnull, "w"))) as client:
+        workspace = await (await Workspace.create(client)).write_files(files)
+        workspace._files = {}
+        read = await workspace.read_files([*files, "src", "missing.ts"])
+        assert read == {**files, "src": None, "missing.ts": None}
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import anyio
+import pytest
+from core import workspace_pool as wp
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeContainer:
+    def __init__(self, ctr_id: str):
+        self.ctr_id = ctr_id
+
+    async def sync(self) -> "FakeContainer":
+        return self
+
+    async def id(self) -> str:
+        return self.ctr_id
+
+
+class FakeClient:
+    def __init__(self):
+        self.loaded: list[str] = []
+
+    def load_container_from_id(self, ctr_id: str) -> FakeContainer:
+        self.loaded.append(ctr_id)
+        return FakeContainer(ctr_id)
+
+
+class FakeManifests:
+    """Template whose files are at version on disk, and at digest once refreshed."""
+
+    def __init__(self, version: str):
+        self.version = version
+        self.digest = version
+
+    def get(self, path: str) -> SimpleNamespace:
+        return SimpleNamespace(digest=self.digest)
+
+    def refresh(self, path: str) -> SimpleNamespace:
+        self.digest = self.version
+        return self.get(path)
+
+    async def snapshot(self, client, path: str) -> tuple[SimpleNamespace, str]:
+        manifest = self.refresh(path)
+        return manifest, manifest.digest
+
+
+async def test_pool_hands_out_warm_base_and_rebuilds_on_change(monkeypatch):
+    manifests = FakeManifests("v1")
+    monkeypatch.setattr(wp, "template_manifests", manifests)
+    builds: list[str] = []
+
+    def build(client, context):
+        builds.append(context)
+        return FakeContainer(f"ctr-{context}")
+
+    pool = wp.WorkspacePool()
+    pool.register("trpc", "./template", build)  # pyright: ignore[reportArgumentType]
+    client = FakeClient()
+    # pool not running
+    assert await pool.acquire(client, "trpc") is None  # pyright: ignore[reportArgumentType]
+
+    async with pool.run(client, ["trpc", "missing"], refresh_interval=0.05):  # pyright: ignore[reportArgumentType]
+        await anyio.wait_all_tasks_blocked()
+        first = await pool.acquire(client, "trpc")  # pyright: ignore[reportArgumentType]
+        second = await pool.acquire(client, "trpc")  # pyright: ignore[reportArgumentType]
+        assert first is not None and second is not None
+        assert client.loaded == ["ctr-v1", "ctr-v1"]
+        assert builds == ["v1"]
+
+        # the filesystem is not read per request, the change shows up with the next refresh
+        manifests.version = "v2"
+        assert (await pool.acquire(client, "trpc")).ctr_id == "ctr-v1"  # pyright: ignore
+        await anyio.sleep(0.1)
+        await anyio.wait_all_tasks_blocked()
+        assert builds == ["v1", "v2"]
+        assert (await pool.acquire(client, "trpc")).ctr_id == "ctr-v2"  # pyright: ignore
+
+    assert not pool.is_running
@@ -1,13 +1,18 @@
 import anyio
 import jinja2
+import json
 import logging
 import os
+import posixpath
+import re
 from typing import Optional, Callable, Awaitable
 from dataclasses import dataclass
 
 from core.base_node import Node
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
+from core.validation_cache import cached_check
+from core.import_graph import ImportGraph
 from llm.common import AsyncLLM, Message, TextRaw, Tool, ToolUse, ToolUseResult
 from trpc_agent import playbooks
 from trpc_agent.playwright import PlaywrightRunner, drizzle_push
@@ -69,8 +74,18 @@ class TrpcActor(FileOperationsActor):
         beam_width: int = 3,
         max_depth: int = 30,
         event_callback: Callable[[str, str], Awaitable[None]] | None = None,
+        eval_concurrency: int = 1,
+        pipelined: bool = False,
+        incremental_checks: bool = False,
     ):
-        super().__init__(llm, workspace, beam_width, max_depth)
+        super().__init__(
+            llm,
+            workspace,
+            beam_width,
+            max_depth,
+            eval_concurrency=eval_concurrency,
+            pipelined=pipelined,
+        )
         self.vlm = vlm
         self.event_callback = event_callback
         self.playwright = PlaywrightRunner(vlm)
@@ -86,6 +101,12 @@ class TrpcActor(FileOperationsActor):
         # File path configuration
         self.paths = TrpcPaths.default()
 
+        # Incremental validation: scoped checks replace the parts of the full gate they cover
+        self.incremental_checks = incremental_checks
+        self._source_trees: dict[tuple[str, str], dict[str, str]] = {}
+        self._base_tsc: dict[tuple[str, str], bool] = {}
+        self._base_tsc_lock = anyio.Lock()
+
     async def execute(
         self,
         files: dict[str, str],
@@ -101,7 +122,7 @@ class TrpcActor(FileOperationsActor):
 
         # Otherwise, proceed with normal generation
         # Update workspace with input files
-        self.workspace = self._create_workspace_with_permissions(files, [], [])
+        self.workspace = await self._create_workspace_with_permissions(files, [], [])
 
         # Determine what to generate based on existing files
         has_schema = any(
@@ -174,7 +195,7 @@ class TrpcActor(FileOperationsActor):
         )
 
         # Create workspace with input files and permissions
-        workspace = self._create_workspace_with_permissions(
+        workspace = await self._create_workspace_with_permissions(
             files,
             allowed=self.paths.files_allowed_draft + self.paths.files_allowed_frontend,
             protected=self.paths.files_protected_frontend,
@@ -364,7 +385,7 @@ class TrpcActor(FileOperationsActor):
         )
 
         # Create frontend workspace
-        workspace = self._create_workspace_with_permissions(
+        workspace = await self._create_workspace_with_permissions(
             draft_files,
             allowed=self.paths.files_allowed_frontend,
             protected=self.paths.files_protected_frontend,
@@ -410,30 +431,28 @@ class TrpcActor(FileOperationsActor):
         solution: Optional[Node[BaseData]] = None
         iteration = 0
 
-        while solution is None:
-            iteration += 1
-            candidates = self._select_candidates(root_node)
-            if not candidates:
-                logger.info("No candidates to evaluate, search terminated")
-                break
+        async with self.pipeline():
+            while solution is None:
+                iteration += 1
+                candidates = self._select_candidates(root_node)
+                if not candidates:
+                    logger.info("No candidates to evaluate, search terminated")
+                    break
 
-            logger.info(
-                f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
-            )
-            nodes = await self.run_llm(
-                candidates,
-                system_prompt=system_prompt,
-                tools=self.tools + (self.conditional_tools if conditional_tools else []),
-                max_tokens=8192,
-            )
-            logger.info(f"Received {len(nodes)} nodes from LLM")
+                logger.info(
+                    f"Iteration {iteration}: Running LLM on {len(candidates)} candidates"
+                )
+                nodes = await self.run_llm(
+                    candidates,
+                    system_prompt=system_prompt,
+                    tools=self.tools + (self.conditional_tools if conditional_tools else []),
+                    max_tokens=8192,
+                )
+                logger.info(f"Received {len(nodes)} nodes from LLM")
 
-            for i, new_node in enumerate(nodes):
-                logger.info(f"Evaluating node {i + 1}/{len(nodes)}")
-                if await self.eval_node(new_node, self._user_prompt):
-                    logger.info(f"Found solution at depth {new_node.depth}")
-                    solution = new_node
-                    break
+                solution = await self.eval_nodes(nodes, self._user_prompt)
+                if solution is not None:
+                    logger.info(f"Found solution at depth {solution.depth}")
 
         return solution
 
@@ -494,6 +513,12 @@ class TrpcActor(FileOperationsActor):
 
     async def _validate_handler(self, node: Node[BaseData]) -> bool:
         """Validate handler: TypeScript + tests only."""
+        covered: set[str] = set()
+        if self.incremental_checks:
+            if (scoped := await self._validate_scoped(node, "server")) is None:
+                return False
+            covered = scoped
+
         errors = []
         handler_name = self._get_handler_name(node)
 
@@ -507,13 +532,21 @@ class TrpcActor(FileOperationsActor):
                 if error := await self.run_test_check(node, handler_name):
                     errors.append(error)
 
-            tg.start_soon(check_tsc)
-            tg.start_soon(check_tests)
+            if "tsc" not in covered:
+                tg.start_soon(check_tsc)
+            if "tests" not in covered:
+                tg.start_soon(check_tests)
 
         return await self._handle_validation_errors(node, errors)
 
     async def _validate_frontend(self, node: Node[BaseData]) -> bool:
         """Validate frontend: TypeScript + build + Playwright."""
+        covered: set[str] = set()
+        if self.incremental_checks:
+            if (scoped := await self._validate_scoped(node, "client")) is None:
+                return False
+            covered = scoped
+
         errors = []
 
         # Quick checks first
@@ -527,7 +560,8 @@ class TrpcActor(FileOperationsActor):
                 if error := await self.run_build_check(node):
                     errors.append(error)
 
-            tg.start_soon(check_tsc)
+            if "tsc" not in covered:
+                tg.start_soon(check_tsc)
             tg.start_soon(check_build)
 
         if not await self._handle_validation_errors(node, errors):
@@ -542,6 +576,97 @@ class TrpcActor(FileOperationsActor):
 
         return True
 
+    async def _validate_scoped(self, node: Node[BaseData], project: str) -> set[str] | None:
+        """Type-check and test only what the node's changes can affect.
+
+        Returns None if the scoped checks failed, otherwise the full checks they
+        make redundant: "tsc" when only sources changed, all of them still exist
+        and the search root type-checks, since files no change reaches check as
+        they did there; "tests" when the handler's test was among the tests run.
+        """
+        changed, affected = await self._affected_files(node, project)
+        if not changed:
+            return set()
+        roots = sorted(f for f in affected if f.endswith((".ts", ".tsx")))
+        tests = sorted(f for f in affected if f.endswith(".test.ts"))
+        logger.info(
+            f"Scoped {project} checks for {len(changed)} changed files: {len(roots)} tsc roots, {len(tests)} tests"
+        )
+        errors = []
+
+        async with anyio.create_task_group() as tg:
+
+            async def check_tsc():
+                if error := await self.run_scoped_tsc_check(node, project, roots):
+                    errors.append(error)
+
+            async def check_tests():
+                if error := await self.run_scoped_test_check(node, tests):
+                    errors.append(error)
+
+            if roots:
+                tg.start_soon(check_tsc)
+            if tests and project == "server":
+                tg.start_soon(check_tests)
+
+        if not await self._handle_validation_errors(node, errors):
+            return None
+        covered = set()
+        sources_only = all(f.endswith((".ts", ".tsx")) and not f.endswith(".d.ts") for f in changed)
+        if sources_only and changed <= affected and await self._base_type_checks(node, project):
+            covered.add("tsc")
+        handler_test = f"server/src/tests/{self._get_handler_name(node)}.test.ts"
+        if project == "server" and handler_test in tests:
+            covered.add("tests")
+        return covered
+
+    async def _base_type_checks(self, node: Node[BaseData], project: str) -> bool:
+        """Whether the full type check passes at the root of the node's search, run once per root."""
+        root = node.get_trajectory()[0]
+        key = (root._id, project)
+        async with self._base_tsc_lock:
+            if key not in self._base_tsc:
+                check = self.run_tsc_backend_check if project == "server" else self.run_tsc_frontend_check
+                await root.data.materialize()
+                self._base_tsc[key] = await check(root) is None
+        return self._base_tsc[key]
+
+    async def _affected_files(
+        self, node: Node[BaseData], project: str
+    ) -> tuple[set[str], set[str]]:
+        """Files changed along the node's trajectory and their transitive importers."""
+        trajectory = node.get_trajectory()
+        sources = dict(await self._source_tree(trajectory[0], project))
+        changed = set()
+        for n in trajectory:
+            for path, content in n.data.files.items():
+                if not path.startswith(f"{project}/"):
+                    continue
+                changed.add(path)
+                if content is None:
+                    sources.pop(path, None)
+                else:
+                    sources[path] = content
+        graph = ImportGraph(sources, aliases={"@/": "client/src/"})
+        return changed, graph.dependents(changed)
+
+    async def _source_tree(
+        self, root: Node[BaseData], project: str
+    ) -> dict[str, str]:
+        """Sources under <project>/src of the search root, read with a single exec."""
+        key = (root._id, project)
+        if key not in self._source_trees:
+            script = (
+                f"find {project}/src -type f \\( -name '*.ts' -o -name '*.tsx' \\) "
+                "-not -path '*/node_modules/*' | while read -r f; do "
+                "printf '\\n<<<FILE:%s>>>\\n' \"$f\"; cat \"$f\"; done"
+            )
+            workspace = await root.data.materialize()
+            result = await workspace.exec(["sh", "-c", script])
+            parts = re.split(r"\n<<<FILE:(.+?)>>>\n", result.stdout)
+            self._source_trees[key] = dict(zip(parts[1::2], parts[2::2]))
+        return self._source_trees[key]
+
     async def _validate_edit(self, node: Node[BaseData]) -> bool:
         """Validate edit: Full validation including TypeScript, tests, build, and Playwright."""
         await notify_if_callback(
@@ -612,6 +737,7 @@ class TrpcActor(FileOperationsActor):
         )
         return True
 
+    @cached_check("tsc_backend")
     async def run_tsc_backend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for backend."""
         result = await node.data.workspace.exec(
@@ -622,6 +748,7 @@ class TrpcActor(FileOperationsActor):
             return f"TypeScript errors (backend):\n{error_output}"
         return None
 
+    @cached_check("tsc_frontend")
     async def run_tsc_frontend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for frontend."""
         result = await node.data.workspace.exec(
@@ -632,6 +759,7 @@ class TrpcActor(FileOperationsActor):
             return f"TypeScript errors (frontend):\n{error_output}"
         return None
 
+    @cached_check("drizzle")
     async def run_drizzle_check(self, node: Node[BaseData]) -> str | None:
         """Run Drizzle schema validation."""
         result = await drizzle_push(
@@ -642,6 +770,7 @@ class TrpcActor(FileOperationsActor):
             return f"Drizzle errors:\n{error_output}"
         return None
 
+    @cached_check("build")
     async def run_build_check(self, node: Node[BaseData]) -> str | None:
         """Run frontend build check."""
         result = await node.data.workspace.exec(["bun", "run", "build"], cwd="client")
@@ -655,6 +784,7 @@ class TrpcActor(FileOperationsActor):
             return f"Lint errors:\n{error_output}\n"
         return None
 
+    @cached_check("tests")
     async def run_test_check(
         self, node: Node[BaseData], handler_name: str | None = None
     ) -> str | None:
@@ -677,6 +807,41 @@ class TrpcActor(FileOperationsActor):
             return f"Test errors:\n{error_output}"
         return None
 
+    @cached_check("tsc_scoped")
+    async def run_scoped_tsc_check(
+        self, node: Node[BaseData], project: str, roots: list[str]
+    ) -> str | None:
+        """Type-check the given roots and their imports with the project's compiler options."""
+        base_config = "tsconfig.app.json" if project == "client" else "tsconfig.json"
+        config = {
+            "extends": f"./{base_config}",
+            "include": [],
+            "files": [posixpath.relpath(root, project) for root in roots],
+        }
+        workspace = node.data.workspace.clone()
+        workspace.write_file(
+            f"{project}/tsconfig.scoped.json", json.dumps(config), force=True
+        )
+        result = await workspace.exec(
+            ["bun", "run", "tsc", "-p", "tsconfig.scoped.json", "--noEmit"], cwd=project
+        )
+        if result.exit_code != 0:
+            error_output = f"{result.stdout}\n{result.stderr}"
+            return f"TypeScript errors ({project}):\n{error_output}"
+        return None
+
+    @cached_check("tests_scoped")
+    async def run_scoped_test_check(
+        self, node: Node[BaseData], test_files: list[str]
+    ) -> str | None:
+        """Run only the given server test files with real database."""
+        test_cmd = ["bun", "test", *[posixpath.relpath(f, "server") for f in test_files]]
+        result = await node.data.workspace.exec_with_pg(test_cmd, cwd="server")
+        logger.info(f"Scoped test execution result for {len(test_files)} files: {result.exit_code}")
+        if result.exit_code != 0:
+            return f"Test errors:\n{result.stderr}"
+        return None
+
     async def run_playwright_check(
         self, node: Node[BaseData], mode: str = "client"
     ) -> list[str] | None:
@@ -749,16 +914,14 @@ class TrpcActor(FileOperationsActor):
             return False
         return True
 
-    def _create_workspace_with_permissions(
+    async def _create_workspace_with_permissions(
         self,
         files: dict[str, str],
         allowed: list[str],
         protected: list[str] | None = None,
     ) -> Workspace:
         """Create workspace with files and permissions."""
-        workspace = self.workspace.clone()
-        for file_path, content in files.items():
-            workspace.write_file(file_path, content)
+        workspace = await self.workspace.clone().write_files(files)
         return workspace.permissions(allowed=allowed, protected=protected or [])
 
     async def _build_context(
@@ -801,15 +964,11 @@ class TrpcActor(FileOperationsActor):
             case _:
                 raise ValueError(f"Unknown context type: {context_type}")
 
-        # Add relevant files to context
-        for path in relevant_files:
-            try:
-                content = await workspace.read_file(path)
+        # Add relevant files to context, read at once; files that don't exist are skipped
+        for path, content in (await workspace.read_files(relevant_files)).items():
+            if content is not None:
                 context.append(f'\n<file path="{path}">\n{content.strip()}\n</file>\n')
                 logger.debug(f"Added {path} to context")
-            except Exception:
-                # File might not exist, skip it
-                pass
 
         # Add UI components info for frontend/edit contexts
         if context_type in ["frontend", "edit"]:
@@ -842,11 +1001,9 @@ class TrpcActor(FileOperationsActor):
         self.handler_nodes = {}
 
         # Set up workspace with inherited files
-        workspace = self.workspace.clone()
-        for file in self.paths.files_inherit_handlers:
-            if file in draft_files:
-                workspace.write_file(file, draft_files[file])
-                logger.debug(f"Copied inherited file: {file}")
+        inherited = {f: draft_files[f] for f in self.paths.files_inherit_handlers if f in draft_files}
+        workspace = await self.workspace.clone().write_files(inherited)
+        logger.debug(f"Copied inherited files: {list(inherited)}")
 
         # Template will be rendered per handler
 
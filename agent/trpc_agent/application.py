@@ -1,17 +1,20 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass
 from core.statemachine import StateMachine, State, Context
 from core.application import BaseApplicationContext
-from core.dagger_utils import write_files_bulk
+from diff.template_files import diff_with_template
+from core.template_manifest import template_manifests
 from llm.utils import get_vision_llm_client, get_best_coding_llm_client
 from core.actors import BaseData
 from core.base_node import Node
 from core.statemachine import MachineCheckpoint
 from core.workspace import Workspace
+from core.workspace_pool import workspace_pool
 from trpc_agent.actors import TrpcActor
 import dagger
 
@@ -23,6 +26,31 @@ for package in ["urllib3", "httpx", "google_genai.models"]:
     logging.getLogger(package).setLevel(logging.WARNING)
 
 
+TEMPLATE_DIR = "./sam_agent/template"
+BASE_IMAGE = "oven/bun:1.2.5-alpine"
+SETUP_CMD = [
+    # update and install deps needed for uv
+    ["apk", "update"],
+    ["apk", "add", "--no-cache", "curl", "ca-certificates", "supervisor"],
+    # install uv into /usr/local/bin
+    [
+        "sh", "-lc",
+        "curl -LsSf https://astral.sh/uv/install.sh | "
+        "env UV_UNMANAGED_INSTALL=/usr/local/bin sh"
+    ],
+    # verify uv install (optional)
+    ["uv", "--version"],
+    # your existing setup
+    ["bun", "run sync"],
+]
+
+workspace_pool.register(
+    "trpc",
+    TEMPLATE_DIR,
+    lambda client, context: Workspace.base_container(client, BASE_IMAGE, context, SETUP_CMD),
+)
+
+
 class FSMState(str, enum.Enum):
     DATA_MODEL_GENERATION = "data_model_generation"
     REVIEW_DATA_MODEL = "review_data_model"
@@ -146,25 +174,15 @@ class FSMApplication:
         llm = get_best_coding_llm_client()
         vlm = get_vision_llm_client()
 
+        template, context = await template_manifests.snapshot(client, TEMPLATE_DIR)
         workspace = await Workspace.create(
             client=client,
-            base_image="oven/bun:1.2.5-alpine",
-            context=client.host().directory("./sam_agent/template"),
-            setup_cmd=[
-                # update and install deps needed for uv
-                ["apk", "update"],
-                ["apk", "add", "--no-cache", "curl", "ca-certificates", "supervisor"],
-                # install uv into /usr/local/bin
-                [
-                    "sh", "-lc",
-                    "curl -LsSf https://astral.sh/uv/install.sh | "
-                    "env UV_UNMANAGED_INSTALL=/usr/local/bin sh"
-                ],
-                # verify uv install (optional)
-                ["uv", "--version"],
-                # your existing setup
-                ["bun", "run sync"],
-            ],
+            base_image=BASE_IMAGE,
+            context=context,
+            context_key=template.digest,
+            context_files=template.files,
+            setup_cmd=SETUP_CMD,
+            base=await workspace_pool.acquire(client, "trpc"),
         )
 
 
@@ -177,6 +195,9 @@ class FSMApplication:
             workspace=workspace.clone(),
             beam_width=settings.get("beam_width", 1) if settings else 1,
             max_depth=settings.get("max_depth", 50) if settings else 50,
+            eval_concurrency=settings.get("eval_concurrency", 1) if settings else 1,
+            pipelined=settings.get("pipelined_search", False) if settings else False,
+            incremental_checks=settings.get("incremental_checks", False) if settings else False,
             event_callback=event_callback,
         )
 
@@ -186,6 +207,9 @@ class FSMApplication:
             workspace=workspace.clone(),
             beam_width=settings.get("beam_width", 1) if settings else 1,
             max_depth=settings.get("max_depth", 50) if settings else 50,
+            eval_concurrency=settings.get("eval_concurrency", 1) if settings else 1,
+            pipelined=settings.get("pipelined_search", False) if settings else False,
+            incremental_checks=settings.get("incremental_checks", False) if settings else False,
             event_callback=event_callback,
         )
 
@@ -383,48 +407,24 @@ class FSMApplication:
         logger.info(
             f"SERVER get_diff_with: Received snapshot with {len(snapshot)} files."
         )
-
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
-
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory("./trpc_agent/template")
-        start = start.with_directory(".", template_dir)
-
-        # Add FSM context files on top
-        start = await write_files_bulk(start, self.fsm.context.files, self.client)
 
-        logger.info(
-            "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
-        )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        # Same as committing the snapshot, copying the template and FSM context files over it and
+        # running `git add . && git diff HEAD`, without a git container
+        diff = await anyio.to_thread.run_sync(
+            diff_with_template, snapshot, self.template_path(), self.fsm.context.files
         )
         logger.info(
-            f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"
+            f"SERVER get_diff_with: Diff succeeded. Diff length: {len(diff)}"
         )
         if not diff:
             logger.warning(
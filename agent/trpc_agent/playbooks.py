@@ -8,6 +8,8 @@ Use the following tools to manage files:
    - Input: path (string)
    - Returns: File content
    - Use this to examine existing code before making changes
+   - To read several files, call **read_files** once with paths (list of strings) instead of read_file per file
+   - **read_file_lines** reads lines start to end (integers, 1-based) of a long file
 
 2. **write_file** - Create a new file or completely replace an existing file's content
    - Input: path (string), content (string)
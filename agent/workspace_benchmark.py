@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Workspace file write benchmark.
+
+Seeds a fresh workspace with N files, once as a chain of with_new_file calls
+(Workspace.write_file) and once as a single directory layer
+(Workspace.write_files), and times the first exec on the result, which is where
+the engine resolves the pending writes.
+
+Usage:
+  uv run python workspace_benchmark.py --sizes=10,100,500 --repeat=3
+"""
+
+import os
+import time
+import anyio
+import dagger
+import fire
+from core.workspace import Workspace
+
+
+def _files(n: int) -> dict[str, str]:
+    return {f"src/dir_{i % 10}/file_{i}.ts": f"export const value{i} = {i};\n" * 20 for i in range(n)}
+
+
+async def _chained(workspace: Workspace, files: dict[str, str]) -> Workspace:
+    for path, content in files.items():
+        workspace.write_file(path, content)
+    return workspace
+
+
+async def _bulk(workspace: Workspace, files: dict[str, str]) -> Workspace:
+    return await workspace.write_files(files)
+
+
+async def _measure(client: dagger.Client, n: int, repeat: int) -> dict[str, float]:
+    timings: dict[str, float] = {}
+    for name, seed in (("write_file", _chained), ("write_files", _bulk)):
+        best = float("inf")
+        for attempt in range(repeat):
+            # unique contents per run so the engine cache doesn't serve earlier results
+            files = {p: f"// {name} {attempt} {time.time_ns()}\n{c}" for p, c in _files(n).items()}
+            workspace = await Workspace.create(client)
+            start = time.perf_counter()
+            workspace = await seed(workspace, files)
+            await workspace.exec(["ls", "-R", "src"])
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+    return timings
+
+
+async def _run(sizes: tuple[int, ...], repeat: int):
+    async with dagger.Connection(dagger.Config(log_output=open(os.devnull, "w"))) as client:
+        print(f"{'files':>6} {'write_file (s)':>15} {'write_files (s)':>16} {'speedup':>8}")
+        for n in sizes:
+            t = await _measure(client, n, repeat)
+            print(f"{n:>6} {t['write_file']:>15.2f} {t['write_files']:>16.2f} {t['write_file'] / t['write_files']:>7.1f}x")
+
+
+def main(sizes: str | tuple[int, ...] = (10, 100, 500), repeat: int = 3) -> None:
+    if isinstance(sizes, str):
+        sizes = tuple(int(s) for s in sizes.split(","))
+    anyio.run(_run, tuple(sizes), repeat)
+
+
+if __name__ == "__main__":
+    fire.Fire(main)